@@ -1,23 +1,52 @@
 from .strategy import Strategy, BenchMarkStrategy
-from .utils import daterange, is_weekday
-import seaborn as sns
-import matplotlib.pyplot as plt
-from datetime import timedelta, date, datetime
+from .stock import Account
+from .market_snapshot import MarketSnapshot
+from .utils import DateLike, from_day_ordinal, EPOCH
+from .read_write import get_trading_calendar
+from .run_log import start_logging, stop_logging
+from datetime import timedelta
+from typing import Dict, List, Union
+import pandas as pd
 
 
 
+def backtest_days(start_date: DateLike, end_date: DateLike) -> List[int]:
+    """
+    the trading days from start_date to end_date, end_date excluded,
+    as day ordinals. These are the weekdays if the data source has 
+    no calendar
+    """
+    calendar = get_trading_calendar(fallback='weekdays')
+    return calendar.trading_days(start_date, end_date,
+                                 include_end=False).tolist()
+
+
+def play_day(strategies: List[Strategy], day: DateLike) -> List[Account]:
+    """
+    plays the strategies on one day, after one read of the prices of
+    all their symbols. Returns their accounts
+    """
+    symbols = [x for strategy in strategies for x in strategy.snapshot_symbols()]
+    snapshot = MarketSnapshot.build(symbols, day)
+    return [strategy.play(day, snapshot) for strategy in strategies]
+
+
 class BackTest(object):
     """
     This class performs a backtest, given a strategy, date etc. and returns 
-    metrics corresponding to the backtest
+    metrics corresponding to the backtest.
+    If log_filename is given, the transactions and daily valuations of the
+    run are logged there as JSON lines
     """
 
     def __init__(self, this_strategy: Strategy, 
-                 start_date: str, end_date: str, verbose: bool = True):
+                 start_date: str, end_date: str, verbose: bool = True,
+                 log_filename: str = None):
         self.strategy = this_strategy
         self.start_date = start_date
         self.end_date = end_date
         self.verbose = verbose
+        self.log_filename = log_filename
 
         self.benchmark_strategy = BenchMarkStrategy(
             universe=this_strategy.universe, start_str=this_strategy.start_str,
@@ -25,9 +54,12 @@ class BackTest(object):
             verbose=self.verbose
         )
 
+    def _trading_days(self):
+        return backtest_days(self.start_date, self.end_date)
+
     def play_backtest(self, visualize: bool = True):
         """
-        Run the backtest every day
+        Run the backtest every trading day
         """
         date_list = []
         total_value = []
@@ -37,22 +69,33 @@ class BackTest(object):
         benchmark_profit = []
 
 
-        for d in daterange(start_date=self.start_date, end_date=self.end_date):
-            if is_weekday(d):
-                print(f"Executing {d}")
+        if self.log_filename is not None:
+            start_logging(self.log_filename)
+        try:
+            # the days stay day ordinals through the strategies, they are
+            # only formatted for printing and plotting
+            for d in self._trading_days():
+                print(f"Executing {from_day_ordinal(d)}")
                 
-                account = self.strategy.play(d)
-                benchmark_account = self.benchmark_strategy.play(d)
+                account, benchmark_account = play_day(
+                    [self.strategy, self.benchmark_strategy], d)
 
-                date_list.append(datetime.strptime(d, '%Y-%m-%d'))
+                date_list.append(EPOCH + timedelta(days=d))
 
                 total_value.append(account.current_valuation)
                 benchmark_value.append(benchmark_account.current_valuation)
 
                 total_profit.append(account.total_profit)
                 benchmark_profit.append(benchmark_account.total_profit)
+        finally:
+            if self.log_filename is not None:
+                stop_logging()
         
         if visualize:
+            # plotting libraries are only loaded when plotting
+            import seaborn as sns
+            import matplotlib.pyplot as plt
+
             sns.set()
             fig1, ax1 = plt.subplots()
             ax1.plot(date_list, total_value, 'bo')
@@ -66,4 +109,98 @@ class BackTest(object):
             ax2.plot(date_list, benchmark_profit, 'ko-')
             ax2.set_ylabel('Total Profit')
             labels = ax2.get_xticklabels()
-            plt.setp(labels, rotation=45, horizontalalignment='right')
\ No newline at end of file
+            plt.setp(labels, rotation=45, horizontalalignment='right')
+
+
+class MultiBackTest(object):
+    """
+    Steps many strategies through the same trading days. The prices of
+    each day are read once, for the symbols of all the strategies, and
+    shared by all of them, so comparing variants of a strategy costs
+    about one pass over the data.
+    strategies is a list, or a dict of name -> strategy. With
+    with_benchmark, a BenchMarkStrategy named 'benchmark' is added, with
+    the universe and cash of the first strategy
+    """
+    def __init__(self, strategies: Union[List[Strategy], Dict[str, Strategy]],
+                 start_date: str, end_date: str, verbose: bool = True,
+                 log_filename: str = None, with_benchmark: bool = True):
+        if not isinstance(strategies, dict):
+            strategies = self._name_strategies(strategies)
+        if len(strategies) == 0:
+            raise ValueError('Need at least one strategy')
+        self.strategies = dict(strategies)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.verbose = verbose
+        self.log_filename = log_filename
+
+        if with_benchmark:
+            if 'benchmark' in self.strategies:
+                raise ValueError("'benchmark' is the name of the benchmark strategy")
+            first = next(iter(self.strategies.values()))
+            self.strategies['benchmark'] = BenchMarkStrategy(
+                universe=first.universe, start_str=first.start_str,
+                end_str=first.end_str, cash=first.init_cash,
+                verbose=self.verbose)
+        self.results = None
+
+    @staticmethod
+    def _name_strategies(strategies: List[Strategy]) -> Dict[str, Strategy]:
+        """
+        names the strategies by their class, numbered if a class repeats
+        """
+        class_names = [type(x).__name__ for x in strategies]
+        named = {}
+        for i, (class_name, strategy) in enumerate(zip(class_names, strategies)):
+            name = class_name
+            if class_names.count(class_name) > 1:
+                name = f'{class_name}_{class_names[:i].count(class_name)}'
+            named[name] = strategy
+        return named
+
+    def play_backtest(self) -> pd.DataFrame:
+        """
+        Run the backtest every trading day. Returns one row per day and
+        strategy, indexed by date and strategy name
+        """
+        names = list(self.strategies)
+        strategies = list(self.strategies.values())
+        rows = []
+
+        if self.log_filename is not None:
+            start_logging(self.log_filename)
+        try:
+            for d in backtest_days(self.start_date, self.end_date):
+                if self.verbose:
+                    print(f"Executing {from_day_ordinal(d)}")
+                this_date = EPOCH + timedelta(days=d)
+                for name, account in zip(names, play_day(strategies, d)):
+                    rows.append({
+                        'date': this_date,
+                        'strategy': name,
+                        'current_valuation': account.current_valuation,
+                        'total_profit': account.total_profit,
+                        'realized_profit': account.realized_profit,
+                        'cash_in_hand': account.cash_in_hand,
+                        'num_stocks_held': len(account.stocks_held),
+                    })
+        finally:
+            if self.log_filename is not None:
+                stop_logging()
+
+        self.results = pd.DataFrame(rows, columns=[
+            'date', 'strategy', 'current_valuation', 'total_profit',
+            'realized_profit', 'cash_in_hand', 'num_stocks_held'])
+        self.results['date'] = pd.to_datetime(self.results['date'])
+        self.results = self.results.set_index(['date', 'strategy'])
+        return self.results
+
+    def get_valuations(self) -> pd.DataFrame:
+        """
+        the valuation of every strategy, one column per strategy
+        """
+        if self.results is None:
+            raise ValueError('Call play_backtest first')
+        return self.results['current_valuation'].unstack('strategy')[
+            list(self.strategies)]
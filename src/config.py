@@ -1,3 +1,10 @@
+import os
+import json
+from typing import Any, Dict
+
+from .read_write import valid_symbols
+
+
 class Config(object):
     """
     Stores the configuration. This includes all the available ticker 
@@ -74,7 +81,7 @@ class Config(object):
             'VRSN', 'VZ', 'VRTX', 'VIAB', 'V', 'VNO', 'VMC', 'WMT', 'WBA', 'DIS', 'WM', 'WAT', 'ANTM', 'WFC', 'WDC', 'WU', 'WY', 'WHR', 'WFM', 'WMB',  
             'WEC', 'WYN', 'WYNN', 'XEL', 'XRX', 'XLNX', 'XL', 'XYL', 'YHOO', 'YUM', 'ZBH', 'ZION', 'ZTS']
 
-        valid_sp500 = [x for x in all_sp_500 if check_valid_symbol(x)]
+        valid_sp500 = valid_symbols(all_sp_500)
 
         self.config = {'sp500_stocks': valid_sp500}
 
@@ -0,0 +1,198 @@
+"""
+Bulk download of price data.
+Symbols are fetched concurrently by a bounded pool of threads, with a
+timeout on every request, retries with exponential backoff, and a rate
+limit shared by all the threads. The source of the data is pluggable:
+YahooSource for the real thing, HttpCsvSource for any server that
+serves csv files, e.g. a local stub in tests.
+"""
+import io
+import time
+import random
+import threading
+import urllib.request
+import urllib.parse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from .utils import date_n_day_from
+
+
+class PriceSource(object):
+    """
+    Abstract source of prices. fetch() returns the prices of a symbol
+    in the format of pdr.get_data_yahoo: indexed by date, with columns
+    Open, High, Low, Close, Adj Close and Volume. It raises on failure
+    """
+    def fetch(self, symbol: str, start_date: str, end_date: str,
+              timeout: float = None) -> pd.DataFrame:
+        raise NotImplementedError("Subclasses should implement")
+
+
+class YahooSource(PriceSource):
+    """
+    Fetches from yahoo through pandas_datareader. The timeout is
+    enforced by the downloader, the library has no timeout of its own
+    """
+    def fetch(self, symbol: str, start_date: str, end_date: str,
+              timeout: float = None) -> pd.DataFrame:
+        from pandas_datareader import data as pdr
+        import yfinance as yf
+        yf.pdr_override()
+
+        # the end date is exclusive for yahoo
+        return pdr.get_data_yahoo(
+            symbol, start_date, date_n_day_from(end_date, 1))
+
+
+class HttpCsvSource(PriceSource):
+    """
+    Fetches {base_url}/{symbol}.csv?start=...&end=..., which should return
+    a csv with a Date column and the price columns, as yahoo used to
+    """
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    def fetch(self, symbol: str, start_date: str, end_date: str,
+              timeout: float = None) -> pd.DataFrame:
+        query = urllib.parse.urlencode({'start': start_date, 'end': end_date})
+        url = f'{self.base_url}/{urllib.parse.quote(symbol)}.csv?{query}'
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            text = response.read().decode('utf-8')
+
+        return pd.read_csv(io.StringIO(text), index_col='Date',
+                           parse_dates=True)
+
+
+class RateLimiter(object):
+    """
+    Lets at most rate_per_second calls through acquire() per second,
+    across all threads
+    """
+    def __init__(self, rate_per_second: float):
+        self.interval = 1. / rate_per_second if rate_per_second else 0.
+        self._lock = threading.Lock()
+        self._next_time = 0.
+
+    def acquire(self):
+        if self.interval == 0.:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_time = max(0., self._next_time - now)
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait_time > 0.:
+            time.sleep(wait_time)
+
+
+class DownloadReport(object):
+    """
+    What happened to each symbol of a bulk download
+    """
+    def __init__(self):
+        self.succeeded = []
+        # symbol -> repr of the last error
+        self.failed = {}
+        # symbol -> number of requests made
+        self.attempts = {}
+        self.elapsed_seconds = 0.
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = [{'symbol': x, 'status': 'ok', 'attempts': self.attempts[x],
+                 'error': None} for x in self.succeeded]
+        rows += [{'symbol': k, 'status': 'failed', 'attempts': self.attempts[k],
+                  'error': v} for k, v in self.failed.items()]
+        return pd.DataFrame(rows, columns=['symbol', 'status', 'attempts', 'error'])
+
+    def __str__(self):
+        return ','.join([
+            'succeeded: ', str(len(self.succeeded)),
+            'failed: ', ','.join(self.failed.keys()),
+            'elapsed_seconds: ', f'{self.elapsed_seconds:.2f}'
+        ])
+
+
+class BulkDownloader(object):
+    """
+    Downloads many symbols at once.
+    Every request waits for the rate limiter, and gives up after timeout
+    seconds. A failed request is retried up to max_retries times, waiting
+    backoff * 2**attempt seconds (with some jitter) in between
+    """
+    def __init__(self, source: PriceSource = None, max_workers: int = 8,
+                 timeout: float = 30., max_retries: int = 3,
+                 backoff: float = 1., rate_per_second: float = 5.):
+        self.source = source if source is not None else YahooSource()
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(rate_per_second)
+
+    def _fetch_once(self, symbol: str, start_date: str,
+                    end_date: str) -> pd.DataFrame:
+        """
+        one request, run in its own daemon thread so that a hung request
+        can be abandoned after the timeout
+        """
+        result = {}
+
+        def target():
+            try:
+                result['df'] = self.source.fetch(
+                    symbol, start_date, end_date, timeout=self.timeout)
+            except BaseException as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise TimeoutError(f'{symbol} timed out after {self.timeout} seconds')
+        if 'error' in result:
+            raise result['error']
+        return result['df']
+
+    def _fetch_symbol(self, symbol: str, start_date: str,
+                      end_date: str) -> Tuple[pd.DataFrame, int, Any]:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2 ** (attempt - 1) *
+                           (1. + 0.1 * random.random()))
+            self.rate_limiter.acquire()
+            try:
+                df = self._fetch_once(symbol, start_date, end_date)
+                return df, attempt + 1, None
+            except Exception as e:
+                last_error = e
+        return None, self.max_retries + 1, last_error
+
+    def download(self, symbol_list: List[str], start_date: str,
+                 end_date: str) -> Tuple[Dict[str, pd.DataFrame], DownloadReport]:
+        """
+        returns the prices of every symbol that could be fetched,
+        and the report of the download
+        """
+        report = DownloadReport()
+        results = {}
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {
+                symbol: pool.submit(
+                    self._fetch_symbol, symbol, start_date, end_date)
+                for symbol in symbol_list
+            }
+            for symbol, future in futures.items():
+                df, attempts, error = future.result()
+                report.attempts[symbol] = attempts
+                if error is None:
+                    results[symbol] = df
+                    report.succeeded.append(symbol)
+                else:
+                    report.failed[symbol] = repr(error)
+
+        report.elapsed_seconds = time.perf_counter() - start_time
+        return results, report
@@ -2,27 +2,27 @@
 Declares factors. A factor is a class 
 that takes a Stock and returns a float
 """
-import statsmodels.api as sm
-from statsmodels.sandbox.regression.predstd import wls_prediction_std
-import matplotlib.pyplot as plt
-import seaborn as sns
-from typing import List
+from typing import Dict, List
 from datetime import timedelta, date, datetime
 import numpy as np
 import pandas as pd
 pd.options.mode.chained_assignment = None 
 
 from .stock import Stock
-from .utils import date_n_day_from
+from .read_write import get_panel, get_trading_calendar
+from .utils import DateLike, date_n_day_from, to_datetime64
 
 class Factor(object):
     """
-    Abstract class that defines a factor
+    Abstract class that defines a factor.
+    If trading_days is True, the look back windows count trading days
+    of the calendar instead of calendar days
     """
-    def __init__(self):
+    def __init__(self, trading_days: bool = False):
         self.value = np.nan
+        self.trading_days = trading_days
     
-    def __call__(self, stock: Stock, end_date: str, **kwargs):
+    def __call__(self, stock: Stock, end_date: DateLike, **kwargs):
         self.stock = stock
         self.end_date = end_date
         
@@ -31,6 +31,66 @@ class Factor(object):
     
     def _calc_factor(self, **kwargs):
         raise NotImplementedError("Subclasses should implement")
+
+    def _window_start(self, end_date: DateLike, num_days: int) -> DateLike:
+        """
+        the first day of a window of num_days days ending on end_date
+        """
+        if self.trading_days:
+            return get_trading_calendar(fallback='weekdays').offset(end_date, -num_days)
+        return date_n_day_from(date=end_date, delta=(-1)*num_days)
+
+    def evaluate_panel(self, symbols: List[str], end_date: DateLike) -> Dict[str, float]:
+        """
+        returns the factor for every symbol. This evaluates one stock at 
+        a time, subclasses override it with a single panel read
+        """
+        return {x: self(Stock(x), end_date) for x in symbols}
+
+
+def _first_last_valid(prices: np.ndarray):
+    """
+    returns the first and the last non NaN value of every column
+    of a date x symbol matrix, NaN for empty columns
+    """
+    num_cols = prices.shape[1]
+    first = np.full(num_cols, np.nan)
+    last = np.full(num_cols, np.nan)
+    if prices.shape[0] == 0:
+        return first, last
+
+    valid = ~np.isnan(prices)
+    has_data = valid.any(axis=0)
+    cols = np.arange(num_cols)
+    first_idx = valid.argmax(axis=0)
+    last_idx = prices.shape[0] - 1 - valid[::-1].argmax(axis=0)
+    first[has_data] = prices[first_idx, cols][has_data]
+    last[has_data] = prices[last_idx, cols][has_data]
+    return first, last
+
+
+def linreg_slopes(prices: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of the slope in linreg_stock, for every column of a
+    date x symbol matrix. Each column is regressed on the position of its 
+    own non NaN rows, after dividing by its first price. The mean of the
+    95% confidence interval of the slope is the slope itself.
+    Columns with less than 3 prices get 0, as in LinRegFactor
+    """
+    valid = ~np.isnan(prices)
+    num = valid.sum(axis=0)
+    first, _ = _first_last_valid(prices)
+
+    x = np.where(valid, np.cumsum(valid, axis=0) - 1., 0.)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.where(valid, prices / first, 0.)
+        x_mean = x.sum(axis=0) / num
+        y_mean = y.sum(axis=0) / num
+        sxy = (valid * (x - x_mean) * (y - y_mean)).sum(axis=0)
+        sxx = (valid * (x - x_mean) ** 2).sum(axis=0)
+        slopes = sxy / sxx
+
+    return np.where(num >= 3, slopes, 0.)
         
         
 def linreg_stock(stock_ticker='AAPL', start_date = '2019-12-01',
@@ -40,6 +100,8 @@ def linreg_stock(stock_ticker='AAPL', start_date = '2019-12-01',
     stock price. The function returns the 95% confidence interval
     of the slope beta
     """
+    # statsmodels is slow to import, only load it when it is needed
+    import statsmodels.api as sm
     this_stock = Stock(stock_ticker)
     panel_data = this_stock.get_price_history(
         start_date=start_date, end_date=end_date)
@@ -60,6 +122,9 @@ def linreg_stock(stock_ticker='AAPL', start_date = '2019-12-01',
     beta_upper = A[1]['x_val']
 
     if visualize:
+        from statsmodels.sandbox.regression.predstd import wls_prediction_std
+        import matplotlib.pyplot as plt
+
         prstd, iv_l, iv_u = wls_prediction_std(results)
 
         plt.plot(panel_data['x_val'], y, 'ro')
@@ -74,21 +139,20 @@ class LinRegFactor(Factor):
     """
     This returns the mean of the slope of the linear regression
     """
-    def __init__(self, num_days: int = 30):
-        Factor.__init__(self)
+    def __init__(self, num_days: int = 30, trading_days: bool = False):
+        Factor.__init__(self, trading_days=trading_days)
         self.num_days = num_days
     
     def _calc_factor(self):
         """
         overrides the parent class.
         Args:
-            end_date: str the end date
+            end_date: DateLike the end date
             num_days: int number of days before to start
         """
         stock_symbol = self.stock.get_symbol()
         
-        start_date = date_n_day_from(date=self.end_date, 
-                                     delta=(-1)* self.num_days)
+        start_date = self._window_start(self.end_date, self.num_days)
         beta_list = linreg_stock(
             stock_ticker=stock_symbol, start_date=start_date, 
             end_date=self.end_date, visualize=False)
@@ -98,58 +162,86 @@ class LinRegFactor(Factor):
             beta_mean = 0.
             
         self.value = beta_mean
+
+    def evaluate_panel(self, symbols: List[str], end_date: DateLike) -> Dict[str, float]:
+        start_date = self._window_start(end_date, self.num_days)
+        prices = get_panel(symbols, start_date, end_date, as_array=True)
+        return dict(zip(symbols, linreg_slopes(prices)))
         
 class MovingAverageFactor(Factor):
-    def __init__(self, short_term : int = 20, long_term : int = 100):
-        Factor.__init__(self)
+    def __init__(self, short_term : int = 20, long_term : int = 100,
+                 trading_days: bool = False):
+        Factor.__init__(self, trading_days=trading_days)
         
         self.short_term = short_term
         self.long_term = long_term
     
     def _calc_factor(self):
         
-        short_start_date = date_n_day_from(
-            date=self.end_date, delta=(-1)*self.short_term)
-        long_start_date = date_n_day_from(
-            date=self.end_date, delta=(-1)*self.long_term)
+        short_start_date = self._window_start(self.end_date, self.short_term)
+        long_start_date = self._window_start(self.end_date, self.long_term)
         
         short_data = self.stock.get_price_history(
-            start_date=short_start_date, end_date=self.end_date
+            start_date=short_start_date, end_date=self.end_date,
+            as_array=True
         )
         
         long_data = self.stock.get_price_history(
-            start_date=long_start_date, end_date=self.end_date
+            start_date=long_start_date, end_date=self.end_date,
+            as_array=True
         )
         
-        short_ma = np.mean(short_data['Open'].values)
-        long_ma = np.mean(long_data['Open'].values)
+        short_ma = np.mean(short_data)
+        long_ma = np.mean(long_data)
         
         self.value = short_ma/long_ma
 
+    def evaluate_panel(self, symbols: List[str], end_date: DateLike) -> Dict[str, float]:
+        short_start_date = self._window_start(end_date, self.short_term)
+        long_start_date = self._window_start(end_date, self.long_term)
+
+        panel = get_panel(symbols, long_start_date, end_date)
+        long_prices = panel.values
+        short_prices = panel.loc[to_datetime64(short_start_date):].values
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            short_ma = (np.nansum(short_prices, axis=0) /
+                        (~np.isnan(short_prices)).sum(axis=0))
+            long_ma = (np.nansum(long_prices, axis=0) /
+                       (~np.isnan(long_prices)).sum(axis=0))
+            values = short_ma/long_ma
+
+        return dict(zip(symbols, values))
+
 class PercReturnFactor(Factor):
     """
     Percentage Return in N days
     """
-    def __init__(self,n_day: int = 7):
-        Factor.__init__(self)
+    def __init__(self,n_day: int = 7, trading_days: bool = False):
+        Factor.__init__(self, trading_days=trading_days)
         self.n_day = n_day
     
     def _calc_factor(self):
         
-        start_date = date_n_day_from(
-            date=self.end_date, delta=(-1)*self.n_day
-        )
+        start_date = self._window_start(self.end_date, self.n_day)
         
         all_data = self.stock.get_price_history(
-            start_date=start_date, end_date=self.end_date
+            start_date=start_date, end_date=self.end_date, as_array=True
         )
         
         df_size = all_data.shape[0]
         
-        n_day_return = all_data['Open'].values[df_size - 1]/all_data['Open'].values[0]
+        n_day_return = all_data[df_size - 1]/all_data[0]
         
         self.value = n_day_return
 
+    def evaluate_panel(self, symbols: List[str], end_date: DateLike) -> Dict[str, float]:
+        start_date = self._window_start(end_date, self.n_day)
+        prices = get_panel(symbols, start_date, end_date, as_array=True)
+        first, last = _first_last_valid(prices)
+
+        return dict(zip(symbols, last/first))
+
 
         
     
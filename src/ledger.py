@@ -0,0 +1,124 @@
+"""
+Array backed book of positions.
+Every symbol gets an id the first time it is traded, and the quantities,
+cost basis, sale proceeds and last prices are numpy arrays indexed by
+that id. Marking the book to market is one dot product, however many
+symbols it holds.
+"""
+import numpy as np
+import pandas as pd
+from typing import List
+
+
+class PositionLedger(object):
+    """
+    quantity: number of shares held
+    cost_basis: total amount paid to buy the symbol, over time
+    proceeds: total amount made selling the symbol, over time
+    price: last price the symbol was marked at
+    """
+    def __init__(self, capacity: int = 64):
+        self.symbols = []
+        self.symbol_index = {}
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.cost_basis = np.zeros(capacity, dtype=np.float64)
+        self.proceeds = np.zeros(capacity, dtype=np.float64)
+        self.price = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def _grow(self):
+        capacity = 2 * len(self.quantity)
+        for name in ['quantity', 'cost_basis', 'proceeds', 'price']:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def get_id(self, symbol: str) -> int:
+        """
+        returns the id of a symbol, adding it to the ledger if needed
+        """
+        symbol_id = self.symbol_index.get(symbol)
+        if symbol_id is None:
+            if len(self.symbols) == len(self.quantity):
+                self._grow()
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_index[symbol] = symbol_id
+        return symbol_id
+
+    def record(self, symbol: str, num: int, price: float, buy_or_sell: str) -> int:
+        """
+        books a buy or a sell of num shares at price, returns the id
+        """
+        symbol_id = self.get_id(symbol)
+        if buy_or_sell == 'buy':
+            self.quantity[symbol_id] += num
+            self.cost_basis[symbol_id] += num * price
+        elif buy_or_sell == 'sell':
+            if num > self.quantity[symbol_id]:
+                raise ValueError(
+                    f'Cannot sell {num} of {symbol}, '
+                    f'only {self.quantity[symbol_id]} are held')
+            self.quantity[symbol_id] -= num
+            self.proceeds[symbol_id] += num * price
+        else:
+            raise ValueError(f'Should be buy or sell, it is {buy_or_sell}')
+        self.price[symbol_id] = price
+        return symbol_id
+
+    def set_position(self, symbol: str, quantity: int, cost_basis: float,
+                     proceeds: float, price: float = 0.):
+        """
+        overwrites the position of a symbol, e.g. to load existing holdings
+        """
+        symbol_id = self.get_id(symbol)
+        self.quantity[symbol_id] = quantity
+        self.cost_basis[symbol_id] = cost_basis
+        self.proceeds[symbol_id] = proceeds
+        self.price[symbol_id] = price
+
+    def get_quantity(self, symbol: str) -> int:
+        symbol_id = self.symbol_index.get(symbol)
+        return 0 if symbol_id is None else int(self.quantity[symbol_id])
+
+    def held_ids(self) -> np.ndarray:
+        return np.flatnonzero(self.quantity[:len(self.symbols)] > 0)
+
+    def held_symbols(self) -> List[str]:
+        return [self.symbols[x] for x in self.held_ids()]
+
+    def mark_to_market(self, prices: np.ndarray, ids: np.ndarray = None) -> float:
+        """
+        updates the last price of the symbols ids (all of them if None),
+        keeping the old price where the new one is NaN. Returns the
+        market value of the book
+        """
+        if ids is None:
+            ids = np.arange(len(self.symbols))
+        prices = np.asarray(prices, dtype=np.float64)
+        has_price = ~np.isnan(prices)
+        self.price[ids[has_price]] = prices[has_price]
+        return self.market_value()
+
+    def market_value(self) -> float:
+        num_symbols = len(self.symbols)
+        return float(np.dot(self.quantity[:num_symbols],
+                            self.price[:num_symbols]))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        one row per symbol ever traded
+        """
+        num_symbols = len(self.symbols)
+        quantity = self.quantity[:num_symbols]
+        price = self.price[:num_symbols]
+        return pd.DataFrame({
+            'quantity': quantity,
+            'cost_basis': self.cost_basis[:num_symbols],
+            'proceeds': self.proceeds[:num_symbols],
+            'price': price,
+            'market_value': quantity * price
+        }, index=pd.Index(self.symbols, name='symbol'))
@@ -1,7 +1,3 @@
-import statsmodels.api as sm
-from statsmodels.sandbox.regression.predstd import wls_prediction_std
-import matplotlib.pyplot as plt
-import seaborn as sns
 from typing import List
 from datetime import timedelta, date, datetime
 import numpy as np
@@ -11,8 +7,10 @@ import pandas as pd
 from .stock import Stock, Holding, Account
 from .strategy import Strategy, StockChoice
 from .stock import Universe
-from .utils import date_n_day_from
+from .utils import DateLike, to_day_ordinal
 from .factor import LinRegFactor
+from .read_write import get_trading_calendar
+from .market_snapshot import MarketSnapshot
 
 
 
@@ -24,15 +22,15 @@ class LinRegStrategy(Strategy):
         
         self.buy_flag = False
         self.sell_flag = False
+        self.start_day = to_day_ordinal(start_str)
         
-     def _choose_stocks(self, date: str) -> List[StockChoice]:
+     def _choose_stocks(self, date: DateLike,
+                        snapshot: MarketSnapshot) -> List[StockChoice]:
         
-        # rebalance every N days
+        # rebalance every N trading days
         N_days = 3
 
-        start_datetime = datetime.strptime(self.start_str, '%Y-%m-%d')
-        now_datetime = datetime.strptime(date, '%Y-%m-%d')
-        day_diff = int((now_datetime - start_datetime).days)
+        day_diff = get_trading_calendar(fallback='weekdays').distance(self.start_day, date)
 
         if day_diff % N_days ==0 and self.sell_flag == False:
             self.sell_flag = True
@@ -47,14 +45,8 @@ class LinRegStrategy(Strategy):
             all_stocks = self.universe.get_universe()
 
             
-            symbol_dict = {}
-            for stock_symbol in all_stocks:
-                beta_mean = linreg(
-                    stock=Stock(stock_symbol), 
-                    end_date=date
-                )
-                
-                symbol_dict[stock_symbol] = beta_mean
+            # one panel read for the whole universe
+            symbol_dict = linreg.evaluate_panel(all_stocks, date)
             
             min_beta = min(symbol_dict.values())
             symbol_dict_pos = {k: (v - min_beta) for k, v in symbol_dict.items()}
@@ -74,8 +66,7 @@ class LinRegStrategy(Strategy):
                     max_stock = k
                     beta_now = v
 
-            this_stock = Stock(max_stock)
-            stock_price = this_stock.get_price(date)
+            stock_price = snapshot.get_price(max_stock)
             num_stocks = int(np.floor(cash_in_hand/stock_price))
             stock_choice = StockChoice(symbol=max_stock, num=num_stocks, 
                                            reco='buy')
@@ -97,7 +88,8 @@ class LinRegStrategy(Strategy):
             #TODO: this should bea get_stocks function in holding
             stocks_held = self.holding.account.stocks_held
             for held_stock in stocks_held:
-                current_val = held_stock.get_valuation(date)
+                # valued on this date by get_holding_info above
+                current_val = held_stock.current_valuation
                 total_buy_cost = held_stock.get_total_buy_cost()
                 
                 if current_val/total_buy_cost > 1.05:
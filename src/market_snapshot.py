@@ -0,0 +1,87 @@
+"""
+The prices of a whole universe on one day.
+The backtest builds one snapshot per trading day, with a single bulk read,
+and hands it to the strategies. The prices are a read only array indexed
+by the position of the symbol, so every price asked for that day is one
+dictionary lookup and one index, and never goes back to the store.
+"""
+import numpy as np
+from typing import List, Iterable
+
+from .read_write import get_prices
+from .utils import DateLike, to_day_ordinal, to_date_str
+
+# non strict prices can be this many days older than the day asked for
+MAX_STALENESS_DAYS = 7
+
+
+class MarketSnapshot(object):
+    """
+    Immutable: the symbols and prices can not be changed once built.
+    A symbol with no price within max_staleness days is NaN
+    """
+    __slots__ = ('_day', '_symbols', '_index', '_prices')
+
+    def __init__(self, day: DateLike, symbols: Iterable[str], prices: np.ndarray):
+        symbols = tuple(symbols)
+        prices = np.array(prices, dtype=np.float64)
+        if prices.shape != (len(symbols),):
+            raise ValueError(
+                f'Got {prices.shape} prices for {len(symbols)} symbols')
+        prices.setflags(write=False)
+        object.__setattr__(self, '_day', to_day_ordinal(day))
+        object.__setattr__(self, '_symbols', symbols)
+        object.__setattr__(self, '_index',
+                           {x: i for i, x in enumerate(symbols)})
+        object.__setattr__(self, '_prices', prices)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('MarketSnapshot is immutable')
+
+    @classmethod
+    def build(cls, symbols: Iterable[str], date: DateLike,
+              max_staleness: int = MAX_STALENESS_DAYS) -> 'MarketSnapshot':
+        """
+        reads the as of prices of all the symbols on date at once
+        """
+        symbols = list(dict.fromkeys(symbols))
+        prices = get_prices(symbols, date, max_staleness=max_staleness)
+        return cls(date, symbols, prices)
+
+    @property
+    def day(self) -> int:
+        return self._day
+
+    @property
+    def date(self) -> str:
+        return to_date_str(self._day)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self._symbols)
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self._prices
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def is_for(self, date: DateLike) -> bool:
+        return to_day_ordinal(date) == self._day
+
+    def get_price(self, symbol: str) -> float:
+        """
+        NaN if the symbol is not in the snapshot or has no price
+        """
+        i = self._index.get(symbol)
+        return np.nan if i is None else float(self._prices[i])
+
+    def has_price(self, symbol: str) -> bool:
+        return not np.isnan(self.get_price(symbol))
+
+    def get_prices(self, symbols: List[str]) -> np.ndarray:
+        return np.array([self.get_price(x) for x in symbols], dtype=np.float64)
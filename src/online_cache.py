@@ -0,0 +1,173 @@
+"""
+Persistent cache for the prices fetched online.
+For every symbol the cache keeps the rows fetched so far and the date
+ranges they cover. A query only fetches the gaps between the covered
+ranges, and overlapping or adjacent ranges are merged into one.
+Every fetch is widened to a block of prefetch_days, so a backtest stepping
+through the days one at a time makes one call per block, and none at all
+once the cache is warm.
+"""
+import os
+import pickle
+import threading
+import pandas as pd
+from datetime import date
+from typing import Callable, Dict, List, Tuple
+
+from .price_store import DATA_FOLDER
+from .run_log import get_logger
+from .utils import to_day_ordinal, from_day_ordinal
+
+ONLINE_CACHE_FOLDER = os.path.join(DATA_FOLDER, 'online_cache')
+
+log = get_logger('online_cache')
+
+
+class FetchError(Exception):
+    """
+    the prices of a symbol could not be fetched online
+    """
+
+
+def missing_ranges(ranges: List[Tuple[int, int]], start_day: int,
+                   end_day: int) -> List[Tuple[int, int]]:
+    """
+    returns the parts of [start_day, end_day] not covered by the ranges.
+    ranges are sorted, non overlapping and both ends inclusive
+    """
+    gaps = []
+    current = start_day
+    for range_start, range_end in ranges:
+        if range_end < current:
+            continue
+        if range_start > end_day:
+            break
+        if range_start > current:
+            gaps.append((current, range_start - 1))
+        current = max(current, range_end + 1)
+    if current <= end_day:
+        gaps.append((current, end_day))
+    return gaps
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    sorts the ranges and merges the ones that overlap or touch
+    """
+    merged = []
+    for range_start, range_end in sorted(ranges):
+        if merged and range_start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+        else:
+            merged.append((range_start, range_end))
+    return merged
+
+
+class OnlineCache(object):
+    """
+    fetch_data(symbol, start_date, end_date) returns the prices of a symbol
+    indexed by date, like pdr.get_data_yahoo, and raises if the fetch fails,
+    which get_data raises again as FetchError. Only days before today count
+    as covered, the prices of today may still change. When the cache can not
+    be written, the fetched prices are still returned
+    """
+    def __init__(self, cache_folder: str = ONLINE_CACHE_FOLDER,
+                 fetch_data: Callable[[str, str, str], pd.DataFrame] = None,
+                 prefetch_days: int = 365):
+        self.cache_folder = cache_folder
+        if fetch_data is None:
+            from .downloader import YahooSource
+            fetch_data = YahooSource().fetch
+        self.fetch_data = fetch_data
+        self.prefetch_days = prefetch_days
+        self.num_fetches = 0
+
+        self._lock = threading.Lock()
+        # symbol -> {'ranges': [(start_day, end_day)], 'data': DataFrame}
+        self._entries = {}
+
+    def _filename(self, symbol: str) -> str:
+        return os.path.join(self.cache_folder, f'{symbol}.pkl')
+
+    def _get_entry(self, symbol: str) -> Dict:
+        if symbol not in self._entries:
+            filename = self._filename(symbol)
+            if os.path.exists(filename):
+                with open(filename, 'rb') as readfile:
+                    self._entries[symbol] = pickle.load(readfile)
+            else:
+                self._entries[symbol] = {'ranges': [], 'data': None}
+        return self._entries[symbol]
+
+    def _save_entry(self, symbol: str, entry: Dict):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        filename = self._filename(symbol)
+        with open(filename + '.tmp', 'wb') as outfile:
+            pickle.dump(entry, outfile)
+        os.replace(filename + '.tmp', filename)
+
+    def get_ranges(self, symbol: str) -> List[Tuple[str, str]]:
+        """
+        returns the date ranges covered for a symbol
+        """
+        with self._lock:
+            entry = self._get_entry(symbol)
+            return [(from_day_ordinal(a), from_day_ordinal(b))
+                    for a, b in entry['ranges']]
+
+    def get_data(self, symbol: str, start_date: str,
+                 end_date: str) -> pd.DataFrame:
+        """
+        returns the prices between start_date and end_date, both inclusive,
+        fetching only the days that are not cached yet
+        """
+        start_day = to_day_ordinal(start_date)
+        end_day = to_day_ordinal(end_date)
+        last_complete_day = to_day_ordinal(date.today().isoformat()) - 1
+
+        with self._lock:
+            entry = self._get_entry(symbol)
+            gaps = missing_ranges(entry['ranges'], start_day, end_day)
+            if len(gaps) > 0:
+                self._fill_gaps(symbol, entry, gaps, last_complete_day)
+
+            data = entry['data']
+            if data is None:
+                return pd.DataFrame(
+                    columns=['High','Low','Open','Close', 'Volume', 'Adj Close'])
+            return data.loc[pd.Timestamp(start_date):pd.Timestamp(end_date)]
+
+    def _fill_gaps(self, symbol: str, entry: Dict,
+                   gaps: List[Tuple[int, int]], last_complete_day: int):
+        ranges = entry['ranges']
+        df_list = [] if entry['data'] is None else [entry['data']]
+        for gap_start, gap_end in gaps:
+            # widen the fetch to a whole block, up to the next covered day
+            next_covered = [a for a, _ in ranges if a > gap_end]
+            fetch_end = max(gap_end, gap_start + self.prefetch_days - 1)
+            if next_covered:
+                fetch_end = min(fetch_end, next_covered[0] - 1)
+            fetch_end = max(gap_end, min(fetch_end, last_complete_day))
+
+            try:
+                df = self.fetch_data(symbol, from_day_ordinal(gap_start),
+                                     from_day_ordinal(fetch_end))
+            except Exception as e:
+                raise FetchError(f'Could not fetch {symbol}: {e!r}') from e
+            self.num_fetches += 1
+            df_list.append(df)
+
+            covered_end = min(fetch_end, last_complete_day)
+            if covered_end >= gap_start:
+                ranges = merge_ranges(ranges + [(gap_start, covered_end)])
+
+        data = pd.concat(df_list)
+        data.index = pd.to_datetime(data.index)
+        data = data[~data.index.duplicated(keep='last')].sort_index()
+
+        entry['ranges'] = ranges
+        entry['data'] = data
+        try:
+            self._save_entry(symbol, entry)
+        except OSError as e:
+            log.warning('Could not save the online cache of %s: %r', symbol, e)
@@ -0,0 +1,137 @@
+"""
+Partitioned columnar copy of the offline price data.
+The data is written as parquet, with one partition per symbol and year,
+so that a query only reads the files and columns it needs.
+Needs pyarrow.
+"""
+import os
+import glob
+import time
+import pandas as pd
+from datetime import datetime
+from typing import List
+
+from .price_store import PriceStore, DATA_FOLDER, OFFLINE_FILENAME
+from .utils import DateLike, to_date_str
+
+PARQUET_FOLDER = os.path.join(DATA_FOLDER, 'offline_price_data')
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+def convert_csv_to_parquet(csv_filename: str = OFFLINE_FILENAME,
+                           parquet_folder: str = PARQUET_FOLDER):
+    """
+    converts the offline csv to parquet, partitioned by symbol and year.
+    The files are written as parquet_folder/symbol=X/year=Y/*.parquet
+    """
+    all_df = pd.read_csv(csv_filename)
+    all_df['date'] = pd.to_datetime(all_df['date'])
+    all_df['year'] = all_df['date'].dt.year
+    all_df = all_df.sort_values(['symbol', 'date'], kind='mergesort')
+
+    all_df.to_parquet(parquet_folder, engine='pyarrow',
+                      partition_cols=['symbol', 'year'], index=False)
+
+
+class ParquetStore(object):
+    """
+    Reads the partitioned parquet data.
+    Has the same get_data() interface as PriceStore, but nothing is held
+    in memory: each query only reads the partitions of the symbol for the
+    years asked for
+    """
+    def __init__(self, parquet_folder: str = PARQUET_FOLDER):
+        self.parquet_folder = parquet_folder
+
+    def _partition_files(self, symbol: str, start_year: int,
+                         end_year: int) -> List[str]:
+        symbol_folder = os.path.join(self.parquet_folder, f'symbol={symbol}')
+        files = []
+        for year in range(start_year, end_year + 1):
+            files.extend(sorted(glob.glob(
+                os.path.join(symbol_folder, f'year={year}', '*.parquet'))))
+        return files
+
+    def get_data(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                 columns: List[str] = None) -> pd.DataFrame:
+        """
+        returns the rows of a symbol between start_date and end_date,
+        both inclusive. If columns is given, only those price columns
+        are read
+        """
+        start_date_dt = datetime.strptime(to_date_str(start_date), '%Y-%m-%d')
+        end_date_dt = datetime.strptime(to_date_str(end_date), '%Y-%m-%d')
+
+        if columns is None:
+            columns = PRICE_COLUMNS
+        read_columns = [x for x in columns if x not in ('symbol', 'date')] + ['date']
+
+        files = self._partition_files(
+            symbol, start_date_dt.year, end_date_dt.year)
+        if len(files) == 0:
+            panel_data = pd.DataFrame(columns=read_columns + ['symbol'])
+            panel_data['date'] = pd.to_datetime(panel_data['date'])
+            return panel_data
+
+        panel_data = pd.concat(
+            [pd.read_parquet(x, engine='pyarrow', columns=read_columns)
+             for x in files],
+            ignore_index=True
+        )
+        panel_data['symbol'] = symbol
+
+        panel_data = panel_data[
+            (panel_data['date'] >= start_date_dt) &
+            (panel_data['date'] <= end_date_dt)
+        ]
+
+        return panel_data
+
+
+def _folder_size(folder: str) -> int:
+    total = 0
+    for root, _, files in os.walk(folder):
+        total += sum(os.path.getsize(os.path.join(root, x)) for x in files)
+    return total
+
+
+def benchmark_price_formats(csv_filename: str = OFFLINE_FILENAME,
+                            parquet_folder: str = PARQUET_FOLDER,
+                            symbol: str = 'AAPL',
+                            start_date: str = '2019-12-02',
+                            end_date: str = '2019-12-06') -> pd.DataFrame:
+    """
+    compares the csv and the parquet copy of the data.
+    For each format, reports the size on disk, the time to read all the
+    rows into a DataFrame (the same pandas read, nothing else), and the
+    time for a cold ReadData backend to answer one query for a single
+    symbol. Partitioning makes many small files, so on small datasets
+    the parquet copy can be the larger one
+    """
+    results = []
+    formats = [
+        ('csv', os.path.getsize(csv_filename),
+         lambda: pd.read_csv(csv_filename),
+         lambda: PriceStore(csv_filename).get_data(symbol, start_date, end_date)),
+        ('parquet', _folder_size(parquet_folder),
+         lambda: pd.read_parquet(parquet_folder, engine='pyarrow'),
+         lambda: ParquetStore(parquet_folder).get_data(symbol, start_date, end_date)),
+    ]
+    for name, disk_bytes, read_all, query in formats:
+        start_time = time.perf_counter()
+        read_all()
+        read_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        query()
+        query_seconds = time.perf_counter() - start_time
+
+        results.append({
+            'format': name,
+            'disk_bytes': disk_bytes,
+            'cold_read_seconds': read_seconds,
+            'symbol_query_seconds': query_seconds
+        })
+
+    return pd.DataFrame(results).set_index('format')
@@ -0,0 +1,173 @@
+"""
+Dense, memory-mapped copy of the offline price data.
+The prices are stored as one float64 array of shape
+(symbol, trading day, field), with NaN where a symbol has no data.
+The file is opened with np.memmap, so any number of processes and
+notebooks can share it through the page cache, without each holding
+its own copy.
+"""
+import os
+import json
+import numpy as np
+import pandas as pd
+from typing import List, Union
+
+from .price_store import PriceStore, AsOfSeries, DATA_FOLDER, make_panel
+from .utils import DateLike, to_datetime64
+
+CUBE_FOLDER = os.path.join(DATA_FOLDER, 'price_cube')
+
+CUBE_FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+_DATA_FILE = 'prices.dat'
+_DATES_FILE = 'dates.npy'
+_INDEX_FILE = 'index.json'
+
+
+def build_price_cube(cube_folder: str = CUBE_FOLDER,
+                     price_store: PriceStore = None,
+                     symbols: List[str] = None):
+    """
+    writes the cube from the data in a PriceStore.
+    The rows are the symbols, the columns are all the dates present
+    in the data, and the last axis is CUBE_FIELDS
+    """
+    if price_store is None:
+        price_store = PriceStore.instance()
+    all_df = price_store.get_all_data()
+    if symbols is not None:
+        all_df = all_df[all_df['symbol'].isin(symbols)]
+
+    symbol_list = sorted(all_df['symbol'].unique())
+    dates = np.unique(all_df['date'].values.astype('datetime64[D]'))
+
+    row = pd.Index(symbol_list).get_indexer(all_df['symbol'])
+    col = np.searchsorted(dates, all_df['date'].values.astype('datetime64[D]'))
+
+    os.makedirs(cube_folder, exist_ok=True)
+    shape = (len(symbol_list), len(dates), len(CUBE_FIELDS))
+    cube = np.memmap(os.path.join(cube_folder, _DATA_FILE), dtype=np.float64,
+                     mode='w+', shape=shape)
+    cube[:] = np.nan
+    for k, field in enumerate(CUBE_FIELDS):
+        cube[row, col, k] = all_df[field].values
+    cube.flush()
+    del cube
+
+    np.save(os.path.join(cube_folder, _DATES_FILE), dates)
+    with open(os.path.join(cube_folder, _INDEX_FILE), 'w') as outfile:
+        json.dump({'symbols': symbol_list, 'fields': CUBE_FIELDS,
+                   'shape': list(shape)}, outfile)
+
+
+class PriceCube(object):
+    """
+    Read only view of a cube written by build_price_cube.
+    The lookups return views into the memory map wherever possible,
+    nothing is copied into a DataFrame unless get_data() is called
+    """
+    def __init__(self, cube_folder: str = CUBE_FOLDER):
+        self.cube_folder = cube_folder
+        with open(os.path.join(cube_folder, _INDEX_FILE), 'r') as readfile:
+            index = json.load(readfile)
+
+        self.symbols = index['symbols']
+        self.fields = index['fields']
+        self.symbol_index = {x: i for i, x in enumerate(self.symbols)}
+        self.field_index = {x: i for i, x in enumerate(self.fields)}
+        self.dates = np.load(os.path.join(cube_folder, _DATES_FILE))
+        self.data = np.memmap(os.path.join(cube_folder, _DATA_FILE),
+                              dtype=np.float64, mode='r',
+                              shape=tuple(index['shape']))
+        # (symbol, field) -> AsOfSeries
+        self._asof = {}
+
+    def get_trading_days(self) -> np.ndarray:
+        return self.dates.astype(np.int64)
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol in self.symbol_index
+
+    def _date_slice(self, start_date: DateLike, end_date: DateLike) -> slice:
+        start = np.searchsorted(
+            self.dates, to_datetime64(start_date), side='left')
+        stop = np.searchsorted(
+            self.dates, to_datetime64(end_date), side='right')
+        return slice(start, stop)
+
+    def get_array(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                  field: str = 'Open') -> np.ndarray:
+        """
+        returns the prices of one field between start_date and end_date,
+        both inclusive, as a view into the cube. Days on which the
+        symbol has no data are NaN
+        """
+        if symbol not in self.symbol_index:
+            return np.empty(0)
+        return self.data[self.symbol_index[symbol],
+                         self._date_slice(start_date, end_date),
+                         self.field_index[field]]
+
+    def get_asof_series(self, symbol: str, field: str = 'Open') -> AsOfSeries:
+        """
+        returns the forward filled prices of a symbol, built once
+        """
+        key = (symbol, field)
+        if key not in self._asof:
+            if symbol in self.symbol_index:
+                self._asof[key] = AsOfSeries(
+                    self.dates.astype(np.int64),
+                    self.data[self.symbol_index[symbol], :,
+                              self.field_index[field]])
+            else:
+                self._asof[key] = AsOfSeries(np.empty(0), np.empty(0))
+        return self._asof[key]
+
+    def get_panel(self, symbols: List[str], start_date: DateLike, end_date: DateLike,
+                  fields: Union[str, List[str]] = 'Open',
+                  as_array: bool = False) -> Union[pd.DataFrame, np.ndarray]:
+        """
+        Same interface as PriceStore.get_panel, read straight from the cube
+        """
+        field_list = [fields] if isinstance(fields, str) else list(fields)
+        date_slice = self._date_slice(start_date, end_date)
+        dates = self.dates[date_slice]
+
+        values = np.full((len(field_list), len(dates), len(symbols)), np.nan)
+        known = [j for j, x in enumerate(symbols) if x in self.symbol_index]
+        rows = [self.symbol_index[symbols[j]] for j in known]
+        for k, field in enumerate(field_list):
+            values[k][:, known] = self.data[
+                rows, date_slice, self.field_index[field]].T
+
+        has_data = ~np.all(np.isnan(values), axis=(0, 2))
+        panel_days = dates[has_data].astype(np.int64)
+        return make_panel(values[:, has_data, :], panel_days, symbols,
+                          fields, as_array)
+
+    def get_dates(self, start_date: DateLike, end_date: DateLike) -> np.ndarray:
+        return self.dates[self._date_slice(start_date, end_date)]
+
+    def get_data(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                 columns: List[str] = None) -> pd.DataFrame:
+        """
+        Same interface as PriceStore.get_data, so that the cube can back
+        ReadData. Builds a DataFrame, prefer get_array() in hot code
+        """
+        if columns is None:
+            columns = self.fields
+        columns = [x for x in columns if x not in ('symbol', 'date')]
+        date_slice = self._date_slice(start_date, end_date)
+        if symbol not in self.symbol_index:
+            panel_data = pd.DataFrame(columns=columns + ['symbol', 'date'])
+            panel_data['date'] = pd.to_datetime(panel_data['date'])
+            return panel_data
+
+        values = self.data[self.symbol_index[symbol], date_slice, :]
+        panel_data = pd.DataFrame(
+            {x: values[:, self.field_index[x]] for x in columns})
+        panel_data['symbol'] = symbol
+        panel_data['date'] = pd.to_datetime(self.dates[date_slice])
+        has_data = ~np.isnan(values[:, self.field_index['Open']])
+
+        return panel_data[has_data]
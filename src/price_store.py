@@ -0,0 +1,470 @@
+"""
+In-memory store for the offline price data.
+The csv is read once per process, and every ReadData is served
+from memory instead of re-reading the file on each call.
+"""
+import os
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple, Union
+
+from .utils import DateLike, to_day_ordinal
+
+# the folder with the data files can be set with TRADING_IDEAS_DATA
+DATA_FOLDER = os.environ.get(
+    'TRADING_IDEAS_DATA', '/home/souravc83/trading_ideas/src/data')
+OFFLINE_FILENAME = os.path.join(DATA_FOLDER, 'offline_price_data.csv')
+
+# 'standard' keeps the csv dtypes. 'compact' stores prices as float32,
+# volume as int32 (int64 if needed), symbols as categorical and dates as
+# int32 day ordinals only. Lookups still return float64 prices, which
+# agree with the standard profile to a relative tolerance of 1e-6
+LOAD_PROFILES = ['standard', 'compact']
+COMPACT_RTOL = 1e-6
+
+# the dtypes the compact profile reads the csv with, so the float64 frame
+# is never built. Columns missing from the csv are ignored
+COMPACT_CSV_DTYPES = {
+    'High': np.float32, 'Low': np.float32, 'Open': np.float32,
+    'Close': np.float32, 'Adj Close': np.float32, 'Volume': np.int64,
+    'symbol': 'category',
+}
+
+
+def _with_keys(columns: List[str]) -> List[str]:
+    """
+    adds the symbol and date columns to a list of price columns
+    """
+    return [x for x in columns if x not in ('symbol', 'date')] + ['symbol', 'date']
+
+
+def make_panel(values: np.ndarray, panel_days: np.ndarray, symbols: List[str],
+               fields: Union[str, List[str]],
+               as_array: bool) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    shapes the (field, date, symbol) values of a panel query for the caller
+    """
+    if as_array:
+        return values[0] if isinstance(fields, str) else values
+
+    index = pd.DatetimeIndex(
+        np.asarray(panel_days, dtype=np.int64).astype('datetime64[D]'),
+        name='date')
+    if isinstance(fields, str):
+        return pd.DataFrame(values[0], index=index, columns=list(symbols))
+
+    columns = pd.MultiIndex.from_product([list(fields), list(symbols)])
+    return pd.DataFrame(
+        values.transpose(1, 0, 2).reshape(len(panel_days), -1),
+        index=index, columns=columns)
+
+
+def _make_coverage(window_df: pd.DataFrame, num_trading_days: int,
+                   symbols: List[str] = None) -> pd.DataFrame:
+    """
+    builds the coverage table from the (symbol, day) pairs in a window
+    """
+    coverage = window_df.groupby('symbol', observed=True)['day'].agg(
+        ['min', 'max', 'count'])
+    coverage.index = coverage.index.astype(object)
+    if symbols is not None:
+        coverage = coverage.reindex(symbols)
+    coverage.index.name = 'symbol'
+
+    num_rows = coverage['count'].fillna(0).astype(int)
+    return pd.DataFrame({
+        'first_date': pd.to_datetime(coverage['min'], unit='D'),
+        'last_date': pd.to_datetime(coverage['max'], unit='D'),
+        'num_rows': num_rows,
+        'missing_days': num_trading_days - num_rows
+    }, index=coverage.index)
+
+
+def _compact_frame(all_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    converts the columns of the sorted data to the compact dtypes.
+    The date column is dropped, the day ordinals replace it
+    """
+    compact_df = pd.DataFrame(index=all_df.index)
+    for column in all_df.columns:
+        values = all_df[column]
+        if column == 'date':
+            continue
+        elif column == 'symbol':
+            compact_df[column] = values.astype('category')
+        elif column == 'Volume':
+            if values.notna().all() and (values % 1 == 0).all():
+                int_type = np.int32
+                if len(values) and values.abs().max() > np.iinfo(np.int32).max:
+                    int_type = np.int64
+                compact_df[column] = values.astype(int_type)
+            else:
+                compact_df[column] = values.astype(np.float32)
+        elif pd.api.types.is_float_dtype(values):
+            compact_df[column] = values.astype(np.float32)
+        else:
+            compact_df[column] = values
+    return compact_df
+
+
+class AsOfSeries(object):
+    """
+    Forward filled prices of one symbol, indexed by day ordinal.
+    For every calendar day from the first to the last day with data,
+    it keeps the row of the last price on or before that day, so the
+    price as of any day is a single array index. Days after the last
+    price (e.g. a delisted symbol) get the last price
+    """
+    def __init__(self, days: np.ndarray, values: np.ndarray):
+        has_value = ~np.isnan(values)
+        self.days = np.asarray(days, dtype=np.int64)[has_value]
+        self.values = np.asarray(values, dtype=np.float64)[has_value]
+        if len(self.days) == 0:
+            self.first_day = 0
+            self._last_row = np.empty(0, dtype=np.int32)
+            return
+        self.first_day = int(self.days[0])
+        all_days = np.arange(self.first_day, int(self.days[-1]) + 1)
+        self._last_row = (np.searchsorted(self.days, all_days, side='right')
+                          - 1).astype(np.int32)
+
+    def lookup(self, day: int, max_staleness: int = None) -> float:
+        """
+        the last price on or before day, NaN if there is none or if it is
+        more than max_staleness days older than day
+        """
+        offset = day - self.first_day
+        if offset < 0 or len(self.days) == 0:
+            return np.nan
+        if offset < len(self._last_row):
+            row = self._last_row[offset]
+        else:
+            row = len(self.days) - 1
+        if max_staleness is not None and day - self.days[row] > max_staleness:
+            return np.nan
+        return self.values[row]
+
+
+class PriceStore(object):
+    """
+    Holds the whole offline dataset, sorted by symbol and date.
+    Use PriceStore.instance() to get the store shared by the process.
+    The data is loaded lazily on the first query, and can be refreshed
+    with reload() or dropped with invalidate()
+
+    Each symbol owns a contiguous block of rows, and its dates are kept
+    as a sorted int64 array of day ordinals, so date ranges are found 
+    with a binary search instead of a scan over the table
+
+    profile is one of LOAD_PROFILES. If memory_budget (bytes) is given,
+    loading data that takes more memory raises a MemoryError
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, filename: str = OFFLINE_FILENAME,
+                 profile: str = 'standard', memory_budget: int = None):
+        if profile not in LOAD_PROFILES:
+            raise ValueError(f'profile should be one of {LOAD_PROFILES}, got {profile}')
+        self.filename = filename
+        self.profile = profile
+        self.memory_budget = memory_budget
+        self._load_lock = threading.Lock()
+        self._all_df = None
+        # symbol -> (first row, last row + 1) in the sorted dataframe
+        self._bounds = {}
+        # day ordinal of every row, sorted within each symbol
+        self._days = None
+        # column name -> numpy array, for the numeric columns
+        self._arrays = {}
+        # goes up every time the data in memory changes
+        self.version = 0
+        # (symbol, field) -> AsOfSeries, built on the first as of lookup
+        self._asof = {}
+
+    @classmethod
+    def instance(cls) -> 'PriceStore':
+        """
+        returns the process wide store, creating it if needed
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def set_instance(cls, store: 'PriceStore'):
+        """
+        replaces the process wide store, e.g. to point to another file
+        """
+        with cls._instance_lock:
+            cls._instance = store
+
+    def is_loaded(self) -> bool:
+        return self._all_df is not None
+
+    def load(self):
+        """
+        reads the csv, if it has not been read yet
+        """
+        if self._all_df is not None:
+            return
+        with self._load_lock:
+            if self._all_df is None:
+                self._set_data(self._read_csv())
+
+    def reload(self):
+        """
+        throws away the data in memory and reads the csv again
+        """
+        with self._load_lock:
+            self._set_data(self._read_csv())
+
+    def _read_csv(self) -> pd.DataFrame:
+        """
+        reads the csv. The compact profile reads it with the compact dtypes
+        and checks the budget before the frame is sorted
+        """
+        if self.profile == 'standard':
+            return pd.read_csv(self.filename)
+
+        try:
+            # pandas warns about the NaN cast before raising
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                all_df = pd.read_csv(self.filename, dtype=COMPACT_CSV_DTYPES,
+                                     parse_dates=['date'])
+        except ValueError:
+            # a volume that is missing or not whole
+            all_df = pd.read_csv(
+                self.filename, dtype={**COMPACT_CSV_DTYPES, 'Volume': np.float64},
+                parse_dates=['date'])
+        self._check_budget(_memory_usage(all_df, np.empty(0, dtype=np.int32)))
+        return all_df
+
+    def _check_budget(self, usage: Dict[str, int]):
+        if self.memory_budget is not None and usage['total'] > self.memory_budget:
+            raise MemoryError(
+                f'{self.filename} takes {usage["total"]} bytes with the '
+                f'{self.profile} profile, the budget is {self.memory_budget}. '
+                f'Bytes per column: {usage}')
+
+    def invalidate(self):
+        """
+        drops the data in memory. The next query reads the csv again
+        """
+        with self._load_lock:
+            self._all_df = None
+            self._bounds = {}
+            self._days = None
+            self._arrays = {}
+            self._asof = {}
+            self.version += 1
+
+    def _set_data(self, all_df: pd.DataFrame):
+        all_df['date'] = pd.to_datetime(all_df['date'])
+        all_df = all_df.sort_values(
+            ['symbol', 'date'], kind='mergesort').reset_index(drop=True)
+
+        symbols = all_df['symbol'].values
+        starts = np.flatnonzero(
+            np.r_[True, symbols[1:] != symbols[:-1]]) if len(symbols) else []
+        stops = list(starts[1:]) + [len(symbols)]
+        bounds = {
+            symbols[start]: (start, stop) for start, stop in zip(starts, stops)
+        }
+        days = all_df['date'].values.astype('datetime64[D]').astype(np.int64)
+        if self.profile == 'compact':
+            all_df = _compact_frame(all_df)
+            days = days.astype(np.int32)
+        arrays = {
+            x: all_df[x].values for x in all_df.columns
+            if x not in ('symbol', 'date')
+        }
+
+        self._check_budget(_memory_usage(all_df, days))
+
+        self._bounds = bounds
+        self._days = days
+        self._arrays = arrays
+        self._all_df = all_df
+        self._asof = {}
+        self.version += 1
+
+    def get_all_data(self) -> pd.DataFrame:
+        """
+        returns all the data. With the compact profile this is a new
+        frame with the standard dtypes
+        """
+        self.load()
+        return self._get_rows(0, len(self._days))
+
+    def _get_rows(self, first: int, last: int) -> pd.DataFrame:
+        panel_data = self._all_df.iloc[first:last]
+        if self.profile == 'standard':
+            return panel_data
+
+        standard_df = pd.DataFrame(index=panel_data.index)
+        for column in panel_data.columns:
+            if column == 'symbol':
+                standard_df[column] = panel_data[column].astype(object)
+            elif pd.api.types.is_float_dtype(panel_data[column]):
+                standard_df[column] = panel_data[column].astype(np.float64)
+            else:
+                standard_df[column] = panel_data[column]
+        standard_df['date'] = pd.to_datetime(
+            self._days[first:last].astype(np.int64), unit='D')
+        return standard_df
+
+    def get_symbols(self) -> List[str]:
+        self.load()
+        return list(self._bounds.keys())
+
+    def get_trading_days(self) -> np.ndarray:
+        """
+        returns the sorted day ordinals on which any symbol has data
+        """
+        self.load()
+        return np.unique(self._days).astype(np.int64)
+
+    def has_symbol(self, symbol: str) -> bool:
+        self.load()
+        return symbol in self._bounds
+
+    def _get_bounds(self, symbol: str) -> Tuple[int, int]:
+        self.load()
+        return self._bounds.get(symbol, (0, 0))
+
+    def get_symbol_data(self, symbol: str) -> pd.DataFrame:
+        """
+        returns all the rows of a symbol, sorted by date
+        """
+        start, stop = self._get_bounds(symbol)
+        return self._get_rows(start, stop)
+
+    def get_row_range(self, symbol: str, start_day: int,
+                      end_day: int) -> Tuple[int, int]:
+        """
+        returns the rows (first, last + 1) of a symbol between two
+        day ordinals, both inclusive. Two binary searches over the dates
+        of the symbol, so the cost does not depend on the size of the table
+        """
+        start, stop = self._get_bounds(symbol)
+        days = self._days[start:stop]
+        first = start + int(np.searchsorted(days, start_day, side='left'))
+        last = start + int(np.searchsorted(days, end_day, side='right'))
+        return first, max(first, last)
+
+    def get_array(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                  field: str = 'Open') -> np.ndarray:
+        """
+        returns one column of a symbol between start_date and end_date,
+        both inclusive, as a view into the data
+        """
+        first, last = self.get_row_range(
+            symbol, to_day_ordinal(start_date), to_day_ordinal(end_date))
+        prices = self._arrays[field][first:last]
+        if prices.dtype != np.float64:
+            prices = prices.astype(np.float64)
+        return prices
+
+    def get_asof_series(self, symbol: str, field: str = 'Open') -> AsOfSeries:
+        """
+        returns the forward filled prices of a symbol, built once
+        """
+        self.load()
+        key = (symbol, field)
+        if key not in self._asof:
+            first, last = self._get_bounds(symbol)
+            self._asof[key] = AsOfSeries(self._days[first:last],
+                                         self._arrays[field][first:last])
+        return self._asof[key]
+
+    def get_panel(self, symbols: List[str], start_date: DateLike, end_date: DateLike,
+                  fields: Union[str, List[str]] = 'Open',
+                  as_array: bool = False) -> Union[pd.DataFrame, np.ndarray]:
+        """
+        returns a date x symbol matrix of one field for many symbols,
+        between start_date and end_date, both inclusive. The dates are the
+        ones on which at least one of the symbols has data, missing values
+        are NaN. With a list of fields, the columns are (field, symbol).
+        With as_array, returns the numpy values, of shape (date, symbol) or
+        (field, date, symbol)
+        """
+        self.load()
+        start_day = to_day_ordinal(start_date)
+        end_day = to_day_ordinal(end_date)
+        field_list = [fields] if isinstance(fields, str) else list(fields)
+
+        row_list = []
+        col_list = []
+        for j, symbol in enumerate(symbols):
+            first, last = self.get_row_range(symbol, start_day, end_day)
+            row_list.append(np.arange(first, last))
+            col_list.append(np.full(last - first, j))
+        rows = np.concatenate(row_list) if row_list else np.empty(0, dtype=int)
+        cols = np.concatenate(col_list) if col_list else np.empty(0, dtype=int)
+
+        days = self._days[rows]
+        panel_days = np.unique(days)
+        date_pos = np.searchsorted(panel_days, days)
+
+        values = np.full((len(field_list), len(panel_days), len(symbols)), np.nan)
+        for k, field in enumerate(field_list):
+            values[k, date_pos, cols] = self._arrays[field][rows]
+
+        return make_panel(values, panel_days, symbols, fields, as_array)
+
+    def coverage_table(self, start_date: DateLike, end_date: DateLike,
+                       symbols: List[str] = None) -> pd.DataFrame:
+        """
+        returns, for every symbol, the first and last date with data between
+        start_date and end_date, the number of rows, and the number of 
+        trading days in the window (days on which any symbol has data) 
+        that the symbol misses. Computed with one groupby over the window
+        """
+        self.load()
+        in_window = ((self._days >= to_day_ordinal(start_date)) &
+                     (self._days <= to_day_ordinal(end_date)))
+        window_df = pd.DataFrame({
+            'symbol': self._all_df['symbol'].values[in_window],
+            'day': self._days[in_window]
+        })
+        num_trading_days = len(np.unique(window_df['day'].values))
+        return _make_coverage(window_df, num_trading_days, symbols)
+
+    def get_data(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                 columns: List[str] = None) -> pd.DataFrame:
+        """
+        returns the rows of a symbol between start_date and end_date,
+        both inclusive. If columns is given, only those price columns
+        are returned along with symbol and date
+        """
+        first, last = self.get_row_range(
+            symbol, to_day_ordinal(start_date), to_day_ordinal(end_date))
+
+        panel_data = self._get_rows(first, last)
+        if columns is not None:
+            panel_data = panel_data[_with_keys(columns)]
+
+        return panel_data
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        returns the bytes used by each column of the data in memory,
+        and the total under 'total'
+        """
+        if self._all_df is None:
+            return {'total': 0}
+        return _memory_usage(self._all_df, self._days)
+
+
+def _memory_usage(all_df: pd.DataFrame, days: np.ndarray) -> Dict[str, int]:
+    usage = all_df.memory_usage(index=True, deep=True)
+    usage_dict = {str(k): int(v) for k, v in usage.items()}
+    usage_dict['date_index'] = int(days.nbytes)
+    usage_dict['total'] = int(usage.sum()) + usage_dict['date_index']
+    return usage_dict
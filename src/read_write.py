@@ -1,12 +1,166 @@
-from pandas_datareader import data as pdr
-import yfinance as yf
+import os
+import json
+import shutil
 import numpy as np
 import pandas as pd
 from datetime import datetime
+from typing import Any, Callable, Dict, List, Union
 
-from .utils import date_n_day_from
+from .utils import DateLike, date_n_day_from, to_date_str, to_day_ordinal
+from .online_cache import FetchError
+from .price_store import (PriceStore, DATA_FOLDER, OFFLINE_FILENAME, make_panel,
+                          _make_coverage)
+
+# where ReadData finds the offline data. Change it with set_data_source(),
+# or pick it for a whole run with the TRADING_IDEAS_BACKEND and
+# TRADING_IDEAS_DATA_PATH environment variables
+DATA_BACKENDS = ['csv', 'parquet', 'cube', 'sqlite']
+_data_source = {'backend': 'csv', 'path': OFFLINE_FILENAME}
+_offline_store = None
+
+
+def set_data_source(backend: str = 'csv', path: str = None,
+                    profile: str = 'standard', memory_budget: int = None):
+    """
+    Chooses where ReadData reads the offline data from.
+    backend is 'csv' (the flat csv, held in memory by PriceStore),
+    'parquet' (the partitioned copy made by convert_csv_to_parquet)
+    'cube' (the memory-mapped array made by build_price_cube)
+    or 'sqlite' (the indexed database filled by SqliteStore.load_csv).
+    path defaults to the standard location of each backend in DATA_FOLDER.
+    profile and memory_budget set how the csv is held in memory, 
+    see PriceStore
+    """
+    global _offline_store
+    if backend not in DATA_BACKENDS:
+        raise ValueError(f'backend should be one of {DATA_BACKENDS}, got {backend}')
+
+    if backend == 'csv':
+        path = path if path is not None else OFFLINE_FILENAME
+        price_store = PriceStore.instance()
+        if (price_store.filename != path or price_store.profile != profile or
+                price_store.memory_budget != memory_budget):
+            PriceStore.set_instance(PriceStore(path, profile, memory_budget))
+        _offline_store = None
+    elif backend == 'parquet':
+        from .parquet_store import ParquetStore, PARQUET_FOLDER
+        path = path if path is not None else PARQUET_FOLDER
+        _offline_store = ParquetStore(path)
+    elif backend == 'cube':
+        from .price_cube import PriceCube, CUBE_FOLDER
+        path = path if path is not None else CUBE_FOLDER
+        _offline_store = PriceCube(path)
+    else:
+        from .sqlite_store import SqliteStore, SQLITE_FILENAME
+        path = path if path is not None else SQLITE_FILENAME
+        _offline_store = SqliteStore(path)
+
+    _data_source['backend'] = backend
+    _data_source['path'] = path
+
+
+def get_data_source() -> Dict[str, str]:
+    return dict(_data_source)
+
+
+def get_offline_store():
+    """
+    returns the store that serves the offline data for the chosen backend
+    """
+    if _offline_store is None:
+        return PriceStore.instance()
+    return _offline_store
+
+
+# online fetches go through a persistent cache, see set_online_cache()
+_online_cache = None
+_use_online_cache = True
+
+
+def set_online_cache(online_cache=None, enabled: bool = True):
+    """
+    Sets the OnlineCache used by ReadData in online mode.
+    With online_cache None, a cache in the default folder is made on 
+    first use. With enabled False, every online call goes to the network
+    """
+    global _online_cache, _use_online_cache
+    _online_cache = online_cache
+    _use_online_cache = enabled
+
+
+def get_online_cache():
+    global _online_cache
+    if not _use_online_cache:
+        return None
+    if _online_cache is None:
+        from .online_cache import OnlineCache
+        _online_cache = OnlineCache()
+    return _online_cache
+
+
+def _fetch_online_uncached(symbol: str, start_date: str,
+                           end_date: str) -> pd.DataFrame:
+    # yfinance and pandas_datareader are only imported on the first 
+    # online call, offline runs never load them
+    from .downloader import YahooSource
+    try:
+        return YahooSource().fetch(symbol, start_date, end_date)
+    except Exception as e:
+        raise FetchError(f'Could not fetch {symbol}: {e!r}') from e
+
+
+# (store, version) -> TradingCalendar
+_calendar_cache = {}
+# the weekdays calendar, built once
+_weekdays_calendar = []
+# range of the weekdays calendar
+WEEKDAYS_CALENDAR_RANGE = ('1970-01-01', '2099-12-31')
+CALENDAR_FALLBACKS = [None, 'weekdays']
+
+
+def _get_weekdays_calendar():
+    from .trading_calendar import TradingCalendar
+    if not _weekdays_calendar:
+        days = np.arange(to_day_ordinal(WEEKDAYS_CALENDAR_RANGE[0]),
+                         to_day_ordinal(WEEKDAYS_CALENDAR_RANGE[1]) + 1)
+        # same rule as is_weekday
+        _weekdays_calendar.append(TradingCalendar(days[(days + 3) % 7 < 5]))
+    return _weekdays_calendar[0]
+
+
+def get_trading_calendar(fallback: str = None):
+    """
+    returns the TradingCalendar of the days in the offline store.
+    It is built once, and again only when the data changes.
+    If the backend has no calendar, fallback='weekdays' returns a
+    calendar of all the weekdays, otherwise this raises a ValueError
+    """
+    from .trading_calendar import TradingCalendar
+    if fallback not in CALENDAR_FALLBACKS:
+        raise ValueError(
+            f'fallback should be one of {CALENDAR_FALLBACKS}, got {fallback}')
+    offline_store = get_offline_store()
+    if not hasattr(offline_store, 'get_trading_days'):
+        if fallback == 'weekdays':
+            return _get_weekdays_calendar()
+        raise ValueError(
+            f"the {_data_source['backend']} backend has no trading calendar")
+
+    if hasattr(offline_store, 'load'):
+        offline_store.load()
+    offline_store_key = (id(offline_store), getattr(offline_store, 'version', 0))
+    if offline_store_key not in _calendar_cache:
+        _calendar_cache.clear()
+        _calendar_cache[offline_store_key] = TradingCalendar(
+            offline_store.get_trading_days())
+    return _calendar_cache[offline_store_key]
+
+
+if os.environ.get('TRADING_IDEAS_BACKEND'):
+    set_data_source(os.environ['TRADING_IDEAS_BACKEND'],
+                    os.environ.get('TRADING_IDEAS_DATA_PATH'),
+                    os.environ.get('TRADING_IDEAS_PROFILE', 'standard'))
 
-yf.pdr_override() 
 
 class ReadData(object):
     """
@@ -17,23 +171,63 @@ class ReadData(object):
     def __init__(self, stock_symbol: str):
         self.stock_symbol = stock_symbol
 
-    def get_data(self, start_date: str, end_date: str,
-                 online: bool=False) -> pd.DataFrame:
+    def get_data(self, start_date: DateLike, end_date: DateLike,
+                 online: bool=False, columns: List[str] = None) -> pd.DataFrame:
+        """
+        returns the data between start_date and end_date, both inclusive.
+        columns restricts the price columns read from an offline store,
+        the symbol and date columns are always returned
+        """
         if online:
             panel_data = self._get_data_online(start_date, end_date)
         else:
-            panel_data = self._get_data_offline(start_date, end_date)
+            panel_data = self._get_data_offline(start_date, end_date, columns)
 
         return panel_data 
+
+    def get_price_array(self, start_date: DateLike, end_date: DateLike,
+                        field: str = 'Open') -> np.ndarray:
+        """
+        returns one price field between start_date and end_date, both 
+        inclusive, as an array with one value per day that has data.
+        With the cube backend this is a view into the memory map
+        """
+        offline_store = get_offline_store()
+        if hasattr(offline_store, 'get_array'):
+            prices = offline_store.get_array(
+                self.stock_symbol, start_date, end_date, field=field)
+            missing = np.isnan(prices)
+            if missing.any():
+                prices = prices[~missing]
+            return prices
+
+        panel_data = self._get_data_offline(
+            start_date, end_date, columns=[field])
+        return panel_data[field].values
     
-    def _get_data_online(self, start_date: str, end_date:str) -> pd.DataFrame:
+    def get_price_asof(self, date: DateLike, field: str = 'Open',
+                       max_staleness: int = None) -> float:
+        """
+        returns the last price on or before date, see get_price_asof
+        """
+        return get_price_asof(self.stock_symbol, date, field=field,
+                              max_staleness=max_staleness)
+
+    def _get_data_online(self, start_date: DateLike,
+                         end_date: DateLike) -> pd.DataFrame:
+        start_date = to_date_str(start_date)
+        end_date = to_date_str(end_date)
         try:
             #panel_data = pdr.DataReader(self.stock_symbol, 'yahoo', 
             #                             start_date, end_date)
-            end_date = date_n_day_from(end_date, 1)
-            
-            panel_data = pdr.get_data_yahoo(self.stock_symbol, start_date, end_date)
-        except:
+            online_cache = get_online_cache()
+            if online_cache is not None:
+                panel_data = online_cache.get_data(
+                    self.stock_symbol, start_date, end_date)
+            else:
+                panel_data = _fetch_online_uncached(
+                    self.stock_symbol, start_date, end_date)
+        except FetchError:
             print(f"""
             Could not find symbol for {self.stock_symbol} for dates {start_date}
             and {end_date}
@@ -45,19 +239,14 @@ class ReadData(object):
         
         return panel_data
 
-    def _get_data_offline(self, start_date: str, end_date:str) -> pd.DataFrame:
-        offline_filename = '/home/souravc83/trading_ideas/src/data/offline_price_data.csv'
-        all_df = pd.read_csv(offline_filename)
-        all_df['date'] = pd.to_datetime(all_df['date'])
-        filt_df = all_df.query(f"symbol=='{self.stock_symbol}'")
-        
-        start_date_dt =  datetime.strptime(start_date, '%Y-%m-%d')
-        end_date_dt =  datetime.strptime(end_date, '%Y-%m-%d')
-        
-        panel_data = filt_df[
-            (filt_df['date']>= start_date_dt) & (filt_df['date']<= end_date_dt)
-        ]
-        
+    def _get_data_offline(self, start_date: DateLike, end_date: DateLike,
+                          columns: List[str] = None) -> pd.DataFrame:
+        # with the csv backend all the instances share one in-memory
+        # copy of the data, the csv is only read on the first call
+        offline_store = get_offline_store()
+        panel_data = offline_store.get_data(
+            self.stock_symbol, start_date, end_date, columns=columns)
+
         return panel_data
 
     
@@ -67,9 +256,299 @@ class WriteData(object):
     each stock. Ideally, we want to save the data locally, so that we 
     don't have to make a network call every time we want the data.
     We want to update the saving every time we run this to pull in fresh data
+
+    The update is incremental: a manifest next to the csv keeps the last
+    date stored for every symbol, and only the days after that are fetched.
+    The new rows are appended to a copy of the csv, which then replaces
+    the original in one rename, so readers never see a half written file.
+    The manifest also keeps the size of the csv it describes. If the csv
+    was changed without it, e.g. by a crash between the two writes, the
+    manifest is rebuilt from the csv instead of being trusted
+
+    fetch_data(symbol, start_date, end_date) returns the prices of a symbol 
+    in the format of pdr.get_data_yahoo, indexed by date. It defaults to 
+    the online source, tests can pass a local stand-in
     """
-    def __init__(self):
-        pass
+    def __init__(self, filename: str = OFFLINE_FILENAME,
+                 manifest_filename: str = None,
+                 fetch_data: Callable[[str, str, str], pd.DataFrame] = None):
+        self.filename = filename
+        if manifest_filename is None:
+            manifest_filename = filename + '.manifest.json'
+        self.manifest_filename = manifest_filename
+        if fetch_data is None:
+            fetch_data = _fetch_online_uncached
+        self.fetch_data = fetch_data
+
+    def _csv_size(self) -> int:
+        if not os.path.exists(self.filename):
+            return None
+        return os.path.getsize(self.filename)
+
+    def read_manifest(self) -> Dict[str, Any]:
+        """
+        returns the manifest. If there is none yet, or it does not match
+        the csv, it is rebuilt from the csv, which is read once
+        """
+        if os.path.exists(self.manifest_filename):
+            with open(self.manifest_filename, 'r') as readfile:
+                manifest = json.load(readfile)
+            if manifest.get('csv_size') == self._csv_size():
+                return manifest
+
+        manifest = {'last_dates': {}, 'num_rows': 0, 'updated_at': None,
+                    'last_update': None, 'csv_size': self._csv_size()}
+        if os.path.exists(self.filename):
+            all_df = pd.read_csv(self.filename, usecols=['symbol', 'date'])
+            last_dates = pd.to_datetime(all_df.groupby('symbol')['date'].max())
+            manifest['last_dates'] = last_dates.dt.strftime('%Y-%m-%d').to_dict()
+            manifest['num_rows'] = int(all_df.shape[0])
+        return manifest
+
+    def write_manifest(self, manifest: Dict[str, Any]):
+        manifest['csv_size'] = self._csv_size()
+        _atomic_write_text(self.manifest_filename, json.dumps(manifest, indent=1))
+
+    def rebuild_manifest(self) -> Dict[str, Any]:
+        """
+        rebuilds the manifest from the csv, after the csv was rewritten
+        """
+        if os.path.exists(self.manifest_filename):
+            os.remove(self.manifest_filename)
+        manifest = self.read_manifest()
+        self.write_manifest(manifest)
+        return manifest
+
+    def get_last_dates(self) -> Dict[str, str]:
+        return self.read_manifest()['last_dates']
+
+    def update(self, symbol_list: List[str], end_date: str,
+               start_date: str = '2015-01-02') -> Dict[str, Any]:
+        """
+        fetches the missing days up to end_date for every symbol and appends
+        them to the csv. Symbols not stored yet are fetched from start_date.
+        Returns a summary of the update, which is also saved in the manifest
+        """
+        manifest = self.read_manifest()
+        last_dates = manifest['last_dates']
+
+        df_list = []
+        failed = []
+        for symbol in symbol_list:
+            if symbol in last_dates:
+                fetch_start = date_n_day_from(last_dates[symbol], 1)
+            else:
+                fetch_start = start_date
+            if fetch_start > end_date:
+                continue
+
+            try:
+                df = self.fetch_data(symbol, fetch_start, end_date)
+            except Exception as e:
+                failed.append({'symbol': symbol, 'error': repr(e)})
+                continue
+            if df.shape[0] == 0:
+                continue
+
+            df = prep_df_join(df.copy(), symbol)
+            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+            # the source may send back days we already have
+            df = df[(df['date'] >= fetch_start) & (df['date'] <= end_date)]
+            if df.shape[0] > 0:
+                df_list.append(df)
+                last_dates[symbol] = df['date'].max()
+
+        num_new_rows = sum(x.shape[0] for x in df_list)
+        if num_new_rows > 0:
+            self._append_rows(pd.concat(df_list, ignore_index=True))
+
+        summary = {
+            'end_date': end_date,
+            'symbols_updated': len(df_list),
+            'rows_added': num_new_rows,
+            'failed': failed
+        }
+        manifest['last_dates'] = last_dates
+        manifest['num_rows'] = manifest['num_rows'] + num_new_rows
+        manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        manifest['last_update'] = summary
+        self.write_manifest(manifest)
+
+        if num_new_rows > 0:
+            price_store = PriceStore.instance()
+            if price_store.filename == self.filename:
+                price_store.invalidate()
+
+        return summary
+
+    def _append_rows(self, new_df: pd.DataFrame):
+        """
+        appends the rows to a copy of the csv and swaps it in
+        """
+        tmp_filename = self.filename + '.tmp'
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as readfile:
+                header = readfile.readline().strip().split(',')
+            shutil.copyfile(self.filename, tmp_filename)
+            with open(tmp_filename, 'a') as outfile:
+                new_df[header].to_csv(outfile, index=False, header=False)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+        else:
+            new_df.to_csv(tmp_filename, index=False, header=True)
+        os.replace(tmp_filename, self.filename)
+
+
+def _atomic_write_text(filename: str, text: str):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as outfile:
+        outfile.write(text)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def _atomic_write_csv(filename: str, df: pd.DataFrame):
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as outfile:
+        df.to_csv(outfile, index=False, header=True)
+        outfile.flush()
+        os.fsync(outfile.fileno())
+    os.replace(tmp_filename, filename)
+
+def get_panel(symbols: List[str], start_date: DateLike, end_date: DateLike,
+              fields: Union[str, List[str]] = 'Open',
+              as_array: bool = False) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    returns a date x symbol matrix of prices for many symbols, read in one 
+    pass over the offline store. See PriceStore.get_panel for the format.
+    symbols can be any iterable of symbols, e.g. an Universe
+    """
+    symbols = list(symbols)
+    offline_store = get_offline_store()
+    if hasattr(offline_store, 'get_panel'):
+        return offline_store.get_panel(
+            symbols, start_date, end_date, fields=fields, as_array=as_array)
+
+    # stores without a panel query are read one symbol at a time
+    field_list = [fields] if isinstance(fields, str) else list(fields)
+    df_list = [
+        offline_store.get_data(x, start_date, end_date, columns=field_list)
+        for x in symbols
+    ]
+    day_list = [
+        df['date'].values.astype('datetime64[D]').astype(np.int64)
+        for df in df_list
+    ]
+    panel_days = np.unique(np.concatenate(day_list + [np.empty(0, np.int64)]))
+    values = np.full((len(field_list), len(panel_days), len(symbols)), np.nan)
+    for j, (df, days) in enumerate(zip(df_list, day_list)):
+        date_pos = np.searchsorted(panel_days, days)
+        for k, field in enumerate(field_list):
+            values[k, date_pos, j] = df[field].values
+
+    return make_panel(values, panel_days, symbols, fields, as_array)
+
+
+def get_price_asof(symbol: str, date: DateLike, field: str = 'Open',
+                   max_staleness: int = None) -> float:
+    """
+    returns the last price of a symbol on or before date, never one from 
+    a later day. NaN if there is none, or if it is more than max_staleness
+    calendar days old. max_staleness=0 asks for the price on date itself
+    """
+    day = to_day_ordinal(date)
+    offline_store = get_offline_store()
+    if hasattr(offline_store, 'get_asof_series'):
+        return offline_store.get_asof_series(symbol, field).lookup(
+            day, max_staleness)
+
+    # other backends read the window that could hold the price
+    start_day = 0 if max_staleness is None else day - max_staleness
+    panel_data = offline_store.get_data(symbol, start_day, day, columns=[field])
+    prices = panel_data[field].values
+    prices = prices[~np.isnan(prices.astype(np.float64))]
+    if len(prices) == 0:
+        return np.nan
+    return float(prices[-1])
+
+
+def get_prices(symbols: List[str], date: DateLike, field: str = 'Open',
+               max_staleness: int = None) -> np.ndarray:
+    """
+    returns the price of every symbol on one day, NaN where there is none.
+    With max_staleness, these are the as of prices of get_price_asof
+    """
+    if max_staleness is not None:
+        # the last price of every column of one panel read
+        day = to_day_ordinal(date)
+        prices = get_panel(symbols, day - max_staleness, day, fields=field,
+                           as_array=True)
+        asof_prices = np.full(len(symbols), np.nan)
+        if prices.shape[0] == 0:
+            return asof_prices
+        valid = ~np.isnan(prices)
+        has_price = valid.any(axis=0)
+        last_row = prices.shape[0] - 1 - valid[::-1].argmax(axis=0)
+        asof_prices[has_price] = prices[last_row, np.arange(len(symbols))][has_price]
+        return asof_prices
+
+    prices = get_panel(symbols, date, date, fields=field, as_array=True)
+    if prices.shape[0] == 0:
+        return np.full(len(symbols), np.nan)
+    return prices[0]
+
+
+def coverage_table(start_date: str = '2019-12-02', end_date: str = '2019-12-06',
+                   symbols: List[str] = None) -> pd.DataFrame:
+    """
+    returns the data coverage of every symbol between start_date and 
+    end_date in one pass: first_date, last_date, num_rows and missing_days.
+    See PriceStore.coverage_table. Symbols without data have 0 rows
+    """
+    offline_store = get_offline_store()
+    if hasattr(offline_store, 'coverage_table'):
+        return offline_store.coverage_table(start_date, end_date, symbols)
+
+    # other backends go through one panel read. The trading days are then
+    # the days on which any of the symbols has data
+    if symbols is None:
+        if not hasattr(offline_store, 'symbols'):
+            raise ValueError(
+                f"symbols are needed for the {_data_source['backend']} backend")
+        symbols = offline_store.symbols
+    panel = get_panel(symbols, start_date, end_date)
+    panel_days = panel.index.values.astype('datetime64[D]').astype(np.int64)
+    rows, cols = np.nonzero(~np.isnan(panel.values))
+    window_df = pd.DataFrame({
+        'symbol': np.asarray(symbols, dtype=object)[cols],
+        'day': panel_days[rows]
+    })
+    return _make_coverage(window_df, len(panel_days), symbols)
+
+
+def valid_symbols(symbols: List[str] = None, start_date: str = '2019-12-02',
+                  end_date: str = '2019-12-06', min_rows: int = 1) -> List[str]:
+    """
+    returns the symbols with at least min_rows days of data in the window.
+    The defaults match check_valid_symbol, but all symbols are checked at once.
+    On a PriceStore, given symbols are checked with a binary search each
+    instead of a pass over the whole table
+    """
+    offline_store = get_offline_store()
+    if symbols is not None and isinstance(offline_store, PriceStore):
+        start_day = to_day_ordinal(start_date)
+        end_day = to_day_ordinal(end_date)
+        valid = []
+        for symbol in symbols:
+            first, last = offline_store.get_row_range(symbol, start_day, end_day)
+            if last - first >= min_rows:
+                valid.append(symbol)
+        return valid
+
+    coverage = coverage_table(start_date, end_date, symbols)
+    return list(coverage.index[coverage['num_rows'] >= min_rows])
+
 
 def check_valid_symbol(symbol: str) -> bool:
     """
@@ -86,11 +565,12 @@ def check_valid_symbol(symbol: str) -> bool:
     
 # one time scripts we ran
 def collect_valid_sp500():
-    sp_500_filename = '/home/souravc83/trading_ideas/src/data/sp500.csv'
-    valid_sp_500_filename = '/home/souravc83/trading_ideas/src/data/sp500_valid.csv'
+    sp_500_filename = os.path.join(DATA_FOLDER, 'sp500.csv')
+    valid_sp_500_filename = os.path.join(DATA_FOLDER, 'sp500_valid.csv')
     df = pd.read_csv(sp_500_filename)
     
-    df['is_valid'] = df.Symbol.apply(check_valid_symbol)
+    valid = set(valid_symbols(list(df.Symbol.values)))
+    df['is_valid'] = df.Symbol.isin(valid)
     df_filtered = df.query('is_valid == True')
     df_filtered.columns = ['symbol', 'name', 'sector', 'is_valid']
     df_filtered = df_filtered[['symbol', 'name', 'sector']]
@@ -102,28 +582,53 @@ def prep_df_join(df: pd.DataFrame, symbol: str) -> pd.DataFrame:
     df['date'] = df.index
     return df
 
-def make_big_dataframe(symbol_list, start_date='2019-12-02', end_date='2019-12-06'):
-    df_list = []
-    for symbol in symbol_list:
-        try:
-            A = ReadData(symbol)
-            df = A.get_data(start_date=start_date, end_date=end_date)
-            df = prep_df_join(df, symbol)
-            #print(df)
-            df_list.append(df)
-        except:
-            pass
-    #print(df_list)
-    big_df = pd.concat(df_list, ignore_index=True)
+def make_big_dataframe(symbol_list, start_date='2019-12-02', end_date='2019-12-06',
+                       downloader=None, return_report: bool = False):
+    """
+    downloads the prices of all the symbols into one dataframe.
+    The symbols are fetched concurrently with retries, see BulkDownloader.
+    Symbols that could not be fetched are listed in the report, which is
+    returned as well if return_report is True
+    """
+    from .downloader import BulkDownloader
+    if downloader is None:
+        downloader = BulkDownloader()
+
+    results, report = downloader.download(symbol_list, start_date, end_date)
+    df_list = [
+        prep_df_join(results[symbol].copy(), symbol)
+        for symbol in symbol_list if symbol in results
+    ]
+    if len(df_list) > 0:
+        big_df = pd.concat(df_list, ignore_index=True)
+    else:
+        big_df = pd.DataFrame(
+            columns=['High','Low','Open','Close', 'Volume', 'Adj Close',
+                     'symbol', 'date'])
+
+    if return_report:
+        return big_df, report
     return big_df
 
-def store_all_data(start_date: str = '2015-01-02' , end_date: str = '2020-06-21'):
-    valid_sp_500_filename = '/home/souravc83/trading_ideas/src/data/sp500_valid.csv'
-    offline_filename = '/home/souravc83/trading_ideas/src/data/offline_price_data.csv'
+def store_all_data(start_date: str = '2015-01-02' , end_date: str = '2020-06-21',
+                   incremental: bool = True):
+    """
+    stores the data of all the valid sp500 stocks in the offline csv.
+    If the csv exists and incremental is True, only the days after the
+    last stored date are fetched, see WriteData
+    """
+    valid_sp_500_filename = os.path.join(DATA_FOLDER, 'sp500_valid.csv')
     df = pd.read_csv(valid_sp_500_filename)
     symbol_list = list(df['symbol'].values)
+
+    if incremental and os.path.exists(OFFLINE_FILENAME):
+        return WriteData().update(symbol_list, end_date, start_date)
     
-    big_df = make_big_dataframe(symbol_list, start_date, end_date)
-    big_df.to_csv(path_or_buf=offline_filename, index=False, header=True)
-    
-    
\ No newline at end of file
+    big_df, report = make_big_dataframe(
+        symbol_list, start_date, end_date, return_report=True)
+    if len(report.failed) > 0:
+        print(f"Could not download: {', '.join(report.failed.keys())}")
+    _atomic_write_csv(OFFLINE_FILENAME, big_df)
+    # the manifest and the data in memory are stale now
+    WriteData(OFFLINE_FILENAME).rebuild_manifest()
+    PriceStore.instance().invalidate()
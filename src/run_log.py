@@ -0,0 +1,114 @@
+"""
+Structured, non blocking logging of a run.
+Nothing is configured at import. start_logging() attaches a QueueHandler
+to the 'trading_ideas' logger, and a background thread writes one JSON
+line per event to the file. The records are only formatted in that
+thread, and log_event() returns straight away when logging is off, so
+sweep runs that never start logging pay one level check per event.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import numpy as np
+from typing import Any
+
+RUN_LOGGER = 'trading_ideas'
+LOG_FILENAME = 'log.txt'
+
+_lock = threading.Lock()
+# the running QueueListener, its QueueHandler and FileHandler
+_pipeline = {}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    returns the logger of a module, under the run logger
+    """
+    return logging.getLogger(f'{RUN_LOGGER}.{name}')
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    one JSON object per record: time, level, logger, event and the
+    fields passed to log_event
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=_json_default)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler formats the record before queueing it, in the thread
+    that logs. Here the record is queued as it is, and formatted by the
+    writer thread
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO,
+              **fields):
+    """
+    logs one structured event. The fields should be plain values,
+    they are serialized later in the writer thread
+    """
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, event, extra={'fields': fields})
+
+
+def is_logging() -> bool:
+    return len(_pipeline) > 0
+
+
+def start_logging(filename: str = LOG_FILENAME, level: int = logging.INFO,
+                  mode: str = 'w'):
+    """
+    starts writing the events of the run to filename, as JSON lines.
+    A run that was already logging is stopped first
+    """
+    stop_logging()
+    file_handler = logging.FileHandler(filename, mode=mode)
+    file_handler.setFormatter(JsonLinesFormatter())
+    record_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(record_queue, file_handler)
+    queue_handler = _LazyQueueHandler(record_queue)
+
+    run_logger = logging.getLogger(RUN_LOGGER)
+    with _lock:
+        run_logger.addHandler(queue_handler)
+        run_logger.setLevel(level)
+        run_logger.propagate = False
+        listener.start()
+        _pipeline.update(listener=listener, queue_handler=queue_handler,
+                         file_handler=file_handler)
+
+
+def stop_logging():
+    """
+    writes out the events still queued, and turns logging off
+    """
+    run_logger = logging.getLogger(RUN_LOGGER)
+    with _lock:
+        if not _pipeline:
+            return
+        run_logger.removeHandler(_pipeline['queue_handler'])
+        run_logger.setLevel(logging.WARNING)
+        _pipeline['listener'].stop()
+        _pipeline['file_handler'].close()
+        _pipeline.clear()
@@ -0,0 +1,149 @@
+"""
+SQLite copy of the offline price data.
+Prices live in one table with a (symbol, date) primary key, so point and
+range lookups use the index and nothing has to be held in memory.
+The database is opened in WAL mode, readers in other threads and
+processes are not blocked while new data is written.
+"""
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+from .price_store import DATA_FOLDER, OFFLINE_FILENAME
+from .utils import DateLike, to_date_str
+
+SQLITE_FILENAME = os.path.join(DATA_FOLDER, 'offline_price_data.sqlite')
+
+SQL_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    "Open" REAL,
+    "High" REAL,
+    "Low" REAL,
+    "Close" REAL,
+    "Adj Close" REAL,
+    "Volume" REAL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID
+"""
+
+
+def _quote(columns: List[str]) -> str:
+    return ', '.join(f'"{x}"' for x in columns)
+
+
+class SqliteStore(object):
+    """
+    Reads and writes the price table.
+    Has the same get_data() interface as PriceStore. Each thread gets its
+    own connection, since sqlite connections can not be shared across threads
+    """
+    def __init__(self, filename: str = SQLITE_FILENAME):
+        self.filename = filename
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.filename)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_CREATE_TABLE)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def insert_data(self, df: pd.DataFrame):
+        """
+        inserts the rows of a dataframe in the offline csv format.
+        Rows that already exist for a (symbol, date) are replaced, so this
+        can be used for incremental updates
+        """
+        dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        values = df[SQL_COLUMNS].astype(float)
+        rows = zip(df['symbol'].astype(str), dates,
+                   *[values[x].tolist() for x in SQL_COLUMNS])
+
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                f"""INSERT OR REPLACE INTO prices (symbol, date, {_quote(SQL_COLUMNS)})
+                VALUES ({', '.join(['?'] * (len(SQL_COLUMNS) + 2))})""",
+                rows
+            )
+
+    def load_csv(self, csv_filename: str = OFFLINE_FILENAME,
+                 chunksize: int = 100000):
+        """
+        copies the offline csv into the database, in chunks
+        """
+        for df in pd.read_csv(csv_filename, chunksize=chunksize):
+            self.insert_data(df)
+
+    def get_data(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                 columns: List[str] = None) -> pd.DataFrame:
+        """
+        returns the rows of a symbol between start_date and end_date,
+        both inclusive. If columns is given, only those price columns
+        are read
+        """
+        if columns is None:
+            columns = SQL_COLUMNS
+        columns = [x for x in columns if x not in ('symbol', 'date')]
+        # sqlite reads an unknown quoted name as a string literal
+        unknown = [x for x in columns if x not in SQL_COLUMNS]
+        if len(unknown) > 0:
+            raise ValueError(f'columns should be in {SQL_COLUMNS}, got {unknown}')
+
+        cursor = self._connection().execute(
+            f"""SELECT {_quote(columns)}, symbol, date FROM prices
+            WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date""",
+            (symbol, to_date_str(start_date), to_date_str(end_date))
+        )
+        panel_data = pd.DataFrame(
+            cursor.fetchall(), columns=columns + ['symbol', 'date'])
+        panel_data['date'] = pd.to_datetime(panel_data['date'])
+
+        return panel_data
+
+    def get_array(self, symbol: str, start_date: DateLike, end_date: DateLike,
+                  field: str = 'Open') -> np.ndarray:
+        """
+        returns one column of a symbol between start_date and end_date,
+        both inclusive
+        """
+        if field not in SQL_COLUMNS:
+            raise ValueError(f'field should be one of {SQL_COLUMNS}, got {field}')
+        cursor = self._connection().execute(
+            f"""SELECT "{field}" FROM prices
+            WHERE symbol = ? AND date BETWEEN ? AND ? ORDER BY date""",
+            (symbol, to_date_str(start_date), to_date_str(end_date))
+        )
+        return np.array([x[0] for x in cursor.fetchall()], dtype=np.float64)
+
+    def get_trading_days(self) -> np.ndarray:
+        """
+        returns the sorted day ordinals on which any symbol has data
+        """
+        cursor = self._connection().execute(
+            'SELECT DISTINCT date FROM prices ORDER BY date')
+        dates = np.array([x[0] for x in cursor.fetchall()], dtype='datetime64[D]')
+        return dates.astype(np.int64)
+
+    def get_last_dates(self) -> Dict[str, str]:
+        """
+        returns the last date stored for every symbol
+        """
+        cursor = self._connection().execute(
+            'SELECT symbol, MAX(date) FROM prices GROUP BY symbol')
+        return dict(cursor.fetchall())
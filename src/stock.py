@@ -3,35 +3,42 @@ import pandas as pd
 from typing import List, Dict, Any, Tuple 
 import logging
 
-from .read_write import ReadData, check_valid_symbol
-from .utils import date_n_day_from
-
-#save logging
-logging.basicConfig(filename='log.txt', filemode='w', level=logging.INFO)
-log = logging.getLogger(__name__)
-
-
-class Transaction(object):
-    def __init__(self, num: int, price: float, date : str, buy_or_sell: str):
-        self.num = num
-        self.price = price
-        self.date= date
-        self.buy_or_sell = buy_or_sell
-        if self.buy_or_sell not in ['buy', 'sell']:
-            raise ValueError(f'buy_or_sell is {self.buy_or_sell}') 
-    
+from .read_write import ReadData, get_prices
+from .utils import DateLike, to_date_str, to_day_ordinal
+from .ledger import PositionLedger
+from .transaction_log import Transaction, TransactionLog
+from .tax_lots import TaxLotEngine
+from .run_log import get_logger, log_event
+from .market_snapshot import MarketSnapshot, MAX_STALENESS_DAYS
+# the Universe lives in its own module, and is still imported from here
+from .universe import Universe
+
+log = get_logger('stock')
+
+# 'eager' revalues every held stock on every update. 'daily' marks the
+# book once per day against a cached price vector, and after that only
+# revalues the positions that changed
+VALUATION_MODES = ['eager', 'daily']
+
 
 class Stock(object):
     """
     Defines an individual stock.
     This object contains the state of the stock
     """
-    def __init__(self, stock_symbol: str, verbose: bool = True):
-        # TODO define a queue for FIFO 
-        # keep track of realized and unrealized profits
-        
+    def __init__(self, stock_symbol: str, verbose: bool = True,
+                 transaction_log: TransactionLog = None,
+                 tax_lots: TaxLotEngine = None):
         self.stock_symbol = stock_symbol
-        self.transaction_list = []
+        # the log and the FIFO lots can be shared by all the stocks 
+        # of an account
+        if transaction_log is None:
+            transaction_log = TransactionLog(capacity=16)
+        self.transaction_log = transaction_log
+        if tax_lots is None:
+            tax_lots = TaxLotEngine()
+        self.tax_lots = tax_lots
+        self.last_transaction = None
         self.total_num = 0
     
         self.current_hold = False
@@ -47,6 +54,26 @@ class Stock(object):
     
     def get_symbol(self):
         return self.stock_symbol
+
+    def get_realized_profit(self) -> float:
+        """
+        profit of the shares sold, matched to the buys first in first out
+        """
+        return self.tax_lots.realized_pnl(self.stock_symbol)
+
+    def get_unrealized_profit(self) -> float:
+        """
+        profit of the shares still held, at the current valuation
+        """
+        return self.current_valuation - self.tax_lots.get_open_cost(
+            self.stock_symbol)
+
+    @property
+    def transaction_list(self) -> List[Transaction]:
+        """
+        the transactions of this stock, read back from the log
+        """
+        return self.transaction_log.get_transactions(symbol=self.stock_symbol)
     
     def get_total_buy_cost(self):
         """
@@ -60,7 +87,8 @@ class Stock(object):
         """
         return self.total_sales
 
-    def get_price(self, date: str, is_strict: bool = False) -> float:
+    def get_price(self, date: DateLike, is_strict: bool = False,
+                  max_staleness: int = MAX_STALENESS_DAYS) -> float:
         # We take the price to the be the opening price.
         # Should we change it?
         # Sometimes some stock might miss price data for a day
@@ -69,67 +97,66 @@ class Stock(object):
         # we will give you a best possible price, just so not to raise 
         # an error
 
+        # the best possible price is the last one on or before the day,
+        # at most max_staleness days old. Never a price from the future.
+        # Both lookups are one index into the forward filled prices
+        price = self.read_data.get_price_asof(
+            date, max_staleness=0 if is_strict else max_staleness)
 
-        
-        read_df = self.read_data.get_data(
-            start_date=date, end_date=date)
-        #counter = 0
-        #if read_df.shape[0] == 0:
-        #    while(read_df.shape[0] == 0 and counter < 5):
-        #        read_df = self.read_data.get_data(
-        #            start_date=date, end_date=date)
-        #        counter += 1
-
-        if read_df.shape[0] != 1:
+        if np.isnan(price):
             if is_strict:
                 raise ValueError(f"""
-                    We expected 1 row, but got {read_df.shape[0]}
                     Cannot retrieve price for {self.stock_symbol} for 
-                    {date}. If you can live with non-exactness, call 
-                    the get_price() function with non_strict=False
+                    {to_date_str(date)}. If you can live with non-exactness, call 
+                    the get_price() function with is_strict=False
                 """)
             else:
-                start_date = date_n_day_from(date=date, delta=-7)
-                end_date = date_n_day_from(date=date, delta=7)
-                read_df = self.read_data.get_data(
-                    start_date=start_date, end_date=end_date)
-                if read_df.shape[0] == 0:
-                    raise ValueError(f"""
-                        Stock price does not exist for 14 days for 
-                        {self.stock_symbol} from {start_date} to {end_date},
-                        Hence, get_price() fails even in non-strict mode)
-                        """
-                    )
-
-
-        return read_df['Open'].values[0]
+                raise ValueError(f"""
+                    Stock price does not exist for {max_staleness} days for 
+                    {self.stock_symbol} up to {to_date_str(date)},
+                    Hence, get_price() fails even in non-strict mode)
+                    """
+                )
+
+        return price
     
-    def get_price_history(self, start_date: str, end_date: str) -> pd.DataFrame:
+    def get_price_history(self, start_date: DateLike, end_date: DateLike,
+                          as_array: bool = False) -> pd.DataFrame:
         """
-        returns the history of the price from the start day to the end day
+        returns the history of the price from the start day to the end day.
+        With as_array, returns just the opening prices as an array, 
+        which avoids building a DataFrame
         """
+        if as_array:
+            return self.read_data.get_price_array(
+                start_date=start_date, end_date=end_date)
+
         read_df = self.read_data.get_data(
-                    start_date=start_date, end_date=end_date)
+                    start_date=start_date, end_date=end_date,
+                    columns=['Open'])
     
         read_df_select = read_df[['Open']]
 
         return read_df_select
 
-    def buy(self, date: str, num: int):
+    def buy(self, date: DateLike, num: int, price: float = None):
+        """
+        price is looked up if it is not given
+        """
         this_transaction = Transaction(
             num=num,
-            price=self.get_price(date),
+            price=self.get_price(date) if price is None else price,
             date=date,
             buy_or_sell='buy'
         )
 
         self._record_transaction(this_transaction)
     
-    def sell(self, date: str, num: int):
+    def sell(self, date: DateLike, num: int, price: float = None):
         # todo prevent from selling if we don't have enough
         this_transaction = Transaction(
             num=num,
-            price=self.get_price(date),
+            price=self.get_price(date) if price is None else price,
             date=date,
             buy_or_sell='sell'
         )
@@ -161,8 +188,12 @@ class Stock(object):
         else:
             raise ValueError(f'Should be buy or sell, it is {t.buy_or_sell}')
 
-        self.transaction_list.append(t)
-        self._update_current_valuation(t.date)
+        self.transaction_log.append(self.stock_symbol, t)
+        self.tax_lots.fill(self.stock_symbol, t.date, t.num, t.price,
+                           t.buy_or_sell)
+        self.last_transaction = t
+        # the price of the day is the one just traded at
+        self.set_valuation_price(t.price)
         #if self.verbose:
         self._log_info(t)
 
@@ -173,17 +204,14 @@ class Stock(object):
         """
         Logs info on a transaction
         """
-        # for now use print, can move to logger later
-        log.info(f"Date: {t.date}")
-        log.info(f"Stock symbol: {self.stock_symbol}")
-        log.info(f"Action: {t.buy_or_sell}")
-        log.info(f"Price: {t.price}")
-        log.info(f"Number of Stocks: {t.num}")
-
-        log.info(f"Number of stocks held: {self.total_num}")
-        log.info(f"Value of stocks held: {self.current_valuation}")
+        if not log.isEnabledFor(logging.INFO):
+            return
+        log_event(log, 'transaction', date=to_date_str(t.date),
+                  symbol=self.stock_symbol, action=t.buy_or_sell,
+                  price=t.price, num=t.num, num_held=self.total_num,
+                  value_held=self.current_valuation)
     
-    def get_valuation(self, date: str, is_strict: bool = True) -> float:
+    def get_valuation(self, date: DateLike, is_strict: bool = True) -> float:
         if is_strict:
             self._update_current_valuation(date)
         else:
@@ -193,80 +221,276 @@ class Stock(object):
                 pass
         return self.current_valuation
     
-    def _update_current_valuation(self, date: str):
+    def _update_current_valuation(self, date: DateLike):
         self.current_valuation = self.total_num * self.get_price(date)
+
+    def set_valuation_price(self, price: float):
+        """
+        values the holding at a price that was already looked up
+        """
+        self.current_valuation = self.total_num * price
         
 
+class ValuationStats(object):
+    """
+    Counts the prices looked up to value an account, and the ones
+    served from the prices already looked up that day
+    """
+    def __init__(self):
+        self.price_lookups = 0
+        self.lookups_saved = 0
+        self.marks = 0
+        # day ordinal -> lookups saved on that day
+        self.saved_by_day = {}
+
+    def add_saved(self, day: int, num: int):
+        self.lookups_saved += num
+        self.saved_by_day[day] = self.saved_by_day.get(day, 0) + num
+
+    def __str__(self):
+        return ','.join([
+            'price_lookups: ', str(self.price_lookups),
+            'lookups_saved: ', str(self.lookups_saved),
+            'marks: ', str(self.marks)
+        ])
+
+
 class Account(object):
     """
-    Contains all the accounting for a holding
+    Contains all the accounting for a holding.
+    valuation_mode is one of VALUATION_MODES
     """
     def __init__(self, 
                  amount_invested: float = 0., 
                  current_valuation: float = 0.,
                  total_profit: float = 0.,
                  cash_in_hand: float= 0.,
-                 stocks_held: List[Stock]= []):
-        #TODO need to add realized profit in addition to total profit
-        # realized profit needs to be added to the stock class as well
-        
+                 stocks_held: List[Stock]= [],
+                 valuation_mode: str = 'daily'):
         self.amount_invested = amount_invested
         self.current_valuation = current_valuation
         self.total_profit = total_profit
         self.cash_in_hand = cash_in_hand
         self.stocks_held = stocks_held
 
+        # the positions as arrays, the valuation is computed from these.
+        # The Stock objects keep the transactions of each symbol
+        self.ledger = PositionLedger()
+        self.transaction_log = TransactionLog()
+        # FIFO lots of all the stocks, for the realized profit
+        self.tax_lots = TaxLotEngine()
+        self.realized_profit = 0.
+        self.unrealized_profit = 0.
+        self._stock_index = {}
+        for stock in stocks_held:
+            self._stock_index[stock.stock_symbol] = stock
+            self.ledger.set_position(
+                stock.stock_symbol, stock.total_num, stock.total_buy_cost,
+                stock.total_sales)
+            self.tax_lots.adopt(stock.stock_symbol, stock.tax_lots)
+            stock.tax_lots = self.tax_lots
+
+        if valuation_mode not in VALUATION_MODES:
+            raise ValueError(
+                f'valuation_mode should be one of {VALUATION_MODES}, got {valuation_mode}')
+        self.valuation_mode = valuation_mode
+        self.valuation_stats = ValuationStats()
+        # day the cached prices are for, and symbol -> price on that day
+        self._price_day = None
+        self._day_prices = {}
+        # day the whole book was last marked on, and the symbols
+        # traded since then
+        self._marked_day = None
+        self._dirty = set()
+        # prices of the day shared by the strategies, read before the store
+        self._snapshot = None
+
     def __str__(self):
         class_str = ','.join([
             'amount_invested: ', str(self.amount_invested),
             'current_valuation: ', str(self.current_valuation),
             'total_profit: ', str(self.total_profit),
+            'realized_profit: ', str(self.realized_profit),
             'cash_in_hand: ', str(self.cash_in_hand),
             'stocks_held: ', ','.join([x.get_symbol() for x in self.stocks_held])
         ])
         
         return class_str
     
-    def update_account(self, this_stock: Stock, date: str, num: int,
-                       record_type: str):
+    def update_account(self, this_stock: Stock, date: DateLike, num: int,
+                       record_type: str, price: float = None):
         if record_type not in ['buy', 'sell']:
             raise ValueError(
                 f"record type should be buy or sell, it is {record_type}"
             )
+        if price is None:
+            price = this_stock.last_transaction.price
             
-        self.update_cash(this_stock=this_stock, date=date, num=num,
-                    record_type=record_type)
+        self.book_fill(this_stock=this_stock, date=date, num=num,
+                       record_type=record_type, price=price)
     
         self.update_holding_info(date)
-        
+
+    def book_fill(self, this_stock: Stock, date: DateLike, num: int,
+                  record_type: str, price: float):
+        """
+        books the cash and the position of a fill the stock already
+        recorded, without revaluing the account
+        """
+        self.update_cash(this_stock=this_stock, date=date, num=num,
+                    record_type=record_type, price=price)
+        self.ledger.record(this_stock.stock_symbol, num, price, record_type)
+        self._dirty.add(this_stock.stock_symbol)
+
+    def set_snapshot(self, snapshot: MarketSnapshot):
+        """
+        prices are taken from the snapshot on its day, and only the
+        symbols it does not have are read from the store
+        """
+        self._snapshot = snapshot
+
+    def _snapshot_for(self, date: DateLike) -> MarketSnapshot:
+        if self._snapshot is not None and self._snapshot.is_for(date):
+            return self._snapshot
+        return None
+
+    def get_price(self, this_stock: Stock, date: DateLike) -> float:
+        """
+        the price of a stock on a day. In the daily valuation mode, each
+        symbol is looked up once per day
+        """
+        snapshot = self._snapshot_for(date)
+        if snapshot is not None and snapshot.has_price(this_stock.stock_symbol):
+            return snapshot.get_price(this_stock.stock_symbol)
+
+        if self.valuation_mode == 'eager':
+            self.valuation_stats.price_lookups += 1
+            return this_stock.get_price(date)
+
+        day = self._start_day(date)
+        symbol = this_stock.stock_symbol
+        price = self._day_prices.get(symbol, np.nan)
+        if np.isnan(price):
+            self.valuation_stats.price_lookups += 1
+            price = this_stock.get_price(date)
+            self._day_prices[symbol] = price
+        else:
+            self.valuation_stats.add_saved(day, 1)
+        return price
+
+    def _start_day(self, date: DateLike) -> int:
+        """
+        drops the cached prices when the day changes
+        """
+        day = to_day_ordinal(date)
+        if day != self._price_day:
+            self._price_day = day
+            self._day_prices = {}
+        return day
     
-    def update_holding_info(self, date: str,is_strict: bool = True):
+    def update_holding_info(self, date: DateLike,is_strict: bool = True):
         
         self.update_stocks()
-        
-        self.current_valuation = sum(
-            [x.get_valuation(date,is_strict) for x in self.stocks_held]
-        ) + self.cash_in_hand
+
+        held_ids = self.ledger.held_ids()
+        if self.valuation_mode == 'daily':
+            ids, prices = self._daily_prices(date, held_ids)
+        else:
+            ids = held_ids
+            prices = self._lookup_prices(
+                [self.ledger.symbols[x] for x in ids], date)
+
+        for symbol_id, price in zip(ids, prices):
+            stock = self._stock_index[self.ledger.symbols[symbol_id]]
+            if np.isnan(price):
+                # no recent price, fall back to the rules of the stock
+                stock.get_valuation(date, is_strict)
+            else:
+                stock.set_valuation_price(price)
+
+        # one dot product over the book, NaN prices keep the last mark
+        market_value = self.ledger.mark_to_market(prices, ids)
+        self.current_valuation = market_value + self.cash_in_hand
 
         self.total_profit = (self.current_valuation - self.amount_invested)
-        
+        # both are running totals of the lots, nothing is replayed
+        self.realized_profit = self.tax_lots.realized_total
+        self.unrealized_profit = market_value - self.tax_lots.open_cost_total
+
+    def get_prices(self, symbols: List[str], date: DateLike) -> np.ndarray:
+        """
+        the as of prices of many symbols on a day, in one bulk read.
+        In the daily valuation mode, prices already looked up that day
+        are reused
+        """
+        if self.valuation_mode == 'eager':
+            return self._lookup_prices(symbols, date)
+
+        day = self._start_day(date)
+        missing = [x for x in dict.fromkeys(symbols) if x not in self._day_prices]
+        if len(missing) > 0:
+            self._day_prices.update(
+                zip(missing, self._lookup_prices(missing, date)))
+        self.valuation_stats.add_saved(day, len(symbols) - len(missing))
+        return np.array([self._day_prices[x] for x in symbols], dtype=np.float64)
+
+    def _lookup_prices(self, symbols: List[str], date: DateLike) -> np.ndarray:
+        """
+        the as of prices of the symbols, so holidays and delisted stocks
+        are valued at their last price
+        """
+        self.valuation_stats.marks += 1
+        snapshot = self._snapshot_for(date)
+        if snapshot is None:
+            self.valuation_stats.price_lookups += len(symbols)
+            return get_prices(symbols, date, max_staleness=MAX_STALENESS_DAYS)
+
+        prices = snapshot.get_prices(symbols)
+        missing = [i for i, x in enumerate(symbols) if x not in snapshot]
+        if len(missing) > 0:
+            self.valuation_stats.price_lookups += len(missing)
+            prices[missing] = get_prices([symbols[i] for i in missing], date,
+                                         max_staleness=MAX_STALENESS_DAYS)
+        return prices
+
+    def _daily_prices(self, date: DateLike, held_ids: np.ndarray):
+        """
+        the ids to revalue and their prices: the whole book on the first
+        update of a day, then only the positions traded since
+        """
+        day = self._start_day(date)
+        if day != self._marked_day:
+            ids = held_ids
+            self._marked_day = day
+        else:
+            dirty_ids = [self.ledger.symbol_index[x] for x in self._dirty]
+            ids = held_ids[np.isin(held_ids, dirty_ids)]
+        self._dirty = set()
+
+        symbols = [self.ledger.symbols[x] for x in ids]
+        missing = [x for x in symbols if x not in self._day_prices]
+        if len(missing) > 0:
+            self._day_prices.update(
+                zip(missing, self._lookup_prices(missing, date)))
+        self.valuation_stats.add_saved(day, len(held_ids) - len(missing))
+
+        return ids, np.array([self._day_prices[x] for x in symbols],
+                             dtype=np.float64)
 
         
     def update_stocks(self):
         """
         Updates which stocks are currently held.
         """
-        self.stocks_held = [x for x in self.stocks_held if x.is_held()]
+        if any(not x.is_held() for x in self.stocks_held):
+            self.stocks_held = [x for x in self.stocks_held if x.is_held()]
+            self._stock_index = {x.stock_symbol: x for x in self.stocks_held}
     
     def get_stock(self, symbol: str):
         """
         returns a stock if its available, else returns none
         """
-        for stock in self.stocks_held:
-            if stock.stock_symbol == symbol:
-                return stock
-        
-        return None 
+        return self._stock_index.get(symbol)
     
     def add_and_get_stock(self, symbol: str, verbose: bool):
         """
@@ -274,8 +498,11 @@ class Account(object):
         returns the added stock
         """
         if self.get_stock(symbol) is None:
-            new_stock = Stock(stock_symbol = symbol,verbose=verbose)
+            new_stock = Stock(stock_symbol = symbol,verbose=verbose,
+                              transaction_log=self.transaction_log,
+                              tax_lots=self.tax_lots)
             self.stocks_held.append(new_stock)
+            self._stock_index[symbol] = new_stock
             return new_stock
         else:
             return self.get_stock(symbol)
@@ -290,8 +517,8 @@ class Account(object):
     
         
     
-    def update_cash(self, this_stock: Stock, date: str, num: int,
-                    record_type: str):
+    def update_cash(self, this_stock: Stock, date: DateLike, num: int,
+                    record_type: str, price: float = None):
         """
         Updates the books, after each transaction
         """ 
@@ -300,7 +527,9 @@ class Account(object):
             raise ValueError(
                 f"record type should be buy or sell, it is {record_type}")
             
-        amount = this_stock.get_price(date) * num 
+        if price is None:
+            price = self.get_price(this_stock, date)
+        amount = price * num 
 
         if record_type == 'buy':
             if (self.cash_in_hand - amount) < 0.:
@@ -308,18 +537,21 @@ class Account(object):
                     f"""
                     You are trying to buy {amount} but you only have {self.cash_in_hand}.
                     Your order is for {num} of {this_stock.stock_symbol}, 
-                    which costs {num} X {this_stock.get_price(date)} = {amount}
+                    which costs {num} X {price} = {amount}
                     """
                 )
             self.cash_in_hand -= amount
         else:
             self.cash_in_hand += amount
     
-    def has_cash(self, this_stock: Stock, date: str, num: int):
+    def has_cash(self, this_stock: Stock, date: DateLike, num: int,
+                 price: float = None):
         """
         queries if there is enough cash to buy this stock
         """
-        amount = this_stock.get_price(date) * num 
+        if price is None:
+            price = self.get_price(this_stock, date)
+        amount = price * num 
         if (self.cash_in_hand - amount) < 0.:
             return False
         else:
@@ -330,6 +562,49 @@ class Account(object):
 
 
         
+class FillReport(object):
+    """
+    What happened to each order of a basket, in the order of the basket.
+    order is the position of the order in the basket. status is 'filled',
+    'rejected' or 'hold', with the reason if rejected
+    """
+    def __init__(self):
+        self.rows = []
+
+    def add(self, order: int, symbol: str, reco: str, num: int, price: float,
+            status: str, reason: str = None):
+        filled = status == 'filled'
+        self.rows.append({
+            'order': order, 'symbol': symbol, 'reco': reco, 'num_requested': num,
+            'num_filled': num if filled else 0, 'price': price,
+            'amount': num * price if filled else 0.,
+            'status': status, 'reason': reason
+        })
+
+    @property
+    def filled(self) -> List[str]:
+        return [x['symbol'] for x in self.rows if x['status'] == 'filled']
+
+    @property
+    def rejected(self) -> List[Tuple[int, str, str]]:
+        """
+        (order, symbol, reason) of every rejected order
+        """
+        return [(x['order'], x['symbol'], x['reason']) for x in self.rows
+                if x['status'] == 'rejected']
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.rows, columns=[
+            'order', 'symbol', 'reco', 'num_requested', 'num_filled', 'price',
+            'amount', 'status', 'reason'])
+
+    def __str__(self):
+        return ','.join([
+            'filled: ', ','.join(self.filled),
+            'rejected: ', ','.join(f'{s} ({r})' for _, s, r in self.rejected)
+        ])
+
+
 class Holding(object):
     """
     This class defines the current holdings, and also keeps track of 
@@ -338,7 +613,7 @@ class Holding(object):
     """
     #TODO add methods to add/substract cash
 
-    def __init__(self, cash: float):
+    def __init__(self, cash: float, valuation_mode: str = 'daily'):
         self.all_stocks = [] 
         self.cash = cash
         self.starting_cash = cash
@@ -347,11 +622,12 @@ class Holding(object):
             current_valuation = cash,
             total_profit = 0.,
             cash_in_hand = cash,
-            stocks_held = []
+            stocks_held = [],
+            valuation_mode = valuation_mode
         )
 
     
-    def record(self, date: str, symbol: str, num: int, record_type: str,
+    def record(self, date: DateLike, symbol: str, num: int, record_type: str,
                verbose: bool = True):
         """
         Updates the holding when a transaction happens.
@@ -364,30 +640,97 @@ class Holding(object):
 
         
         this_stock = self.account.add_and_get_stock(symbol, verbose)
+        # one price for the whole transaction
+        price = self.account.get_price(this_stock, date)
 
         
         if record_type == 'buy':
-            if self.account.has_cash(this_stock=this_stock, date=date, num=num):
-                this_stock.buy(date=date, num=num)
+            if self.account.has_cash(this_stock=this_stock, date=date, num=num,
+                                     price=price):
+                this_stock.buy(date=date, num=num, price=price)
                 
                 self.account.update_account(this_stock=this_stock, date=date, 
-                                            num=num, record_type=record_type)
+                                            num=num, record_type=record_type,
+                                            price=price)
             else:
                 print(f"""
-                Tried to buy {num} shares of {this_stock.symbol} but
+                Tried to buy {num} shares of {this_stock.stock_symbol} but
                 dont have enough cash
                 """)
         else:
-            this_stock.sell(date=date, num=num)
+            this_stock.sell(date=date, num=num, price=price)
 
             self.account.update_account(this_stock=this_stock, date=date, 
-                                        num=num, record_type=record_type)
+                                        num=num, record_type=record_type,
+                                        price=price)
                 
 
+    def execute_basket(self, date: DateLike, choices: List[Any],
+                       verbose: bool = True) -> FillReport:
+        """
+        executes a basket of orders (StockChoice) at once. The prices of
+        all the symbols are read in one go, the sells are filled before
+        the buys so their cash can be spent, and the account is revalued
+        once at the end. Orders that can not be filled are rejected in 
+        the report, the others still go through
+        """
+        report = FillReport()
+        symbols = [x.symbol for x in choices if x.reco in ('buy', 'sell')]
+        prices = dict(zip(symbols, self.account.get_prices(symbols, date)))
+        results = {}
+
+        cash = self.account.get_cash()
+        sells = [(i, x) for i, x in enumerate(choices) if x.reco == 'sell']
+        buys = [(i, x) for i, x in enumerate(choices) if x.reco == 'buy']
+        for i, order in sells + buys:
+            price = prices[order.symbol]
+            reason = None
+            if order.num <= 0:
+                reason = 'nothing to fill'
+            elif np.isnan(price):
+                reason = 'no price'
+            elif order.reco == 'sell':
+                if order.num > self.account.ledger.get_quantity(order.symbol):
+                    reason = 'not enough shares'
+            elif order.num * price > cash:
+                reason = 'not enough cash'
+            if reason is not None:
+                results[i] = (order, price, 'rejected', reason)
+                continue
+
+            this_stock = self.account.add_and_get_stock(order.symbol, verbose)
+            if order.reco == 'sell':
+                this_stock.sell(date=date, num=order.num, price=price)
+                cash += order.num * price
+            else:
+                this_stock.buy(date=date, num=order.num, price=price)
+                cash -= order.num * price
+            self.account.book_fill(this_stock=this_stock, date=date,
+                                   num=order.num, record_type=order.reco,
+                                   price=price)
+            results[i] = (order, price, 'filled', None)
+
+        self.account.update_holding_info(date)
+
+        for i, order in enumerate(choices):
+            if order.reco == 'hold':
+                report.add(i, order.symbol, order.reco, order.num, np.nan, 'hold')
+            else:
+                order, price, status, reason = results[i]
+                report.add(i, order.symbol, order.reco, order.num, price,
+                           status, reason)
+        return report
+
+    def set_snapshot(self, snapshot: MarketSnapshot):
+        """
+        prices the orders and the account from the snapshot on its day
+        """
+        self.account.set_snapshot(snapshot)
+
     def get_cash(self) -> float:
         return self.account.get_cash()
 
-    def get_holding_info(self, date: str, is_strict: bool = True):
+    def get_holding_info(self, date: DateLike, is_strict: bool = True):
         """
         What is the current state of the account?
         Refresh the valuation for the current date
@@ -405,24 +748,30 @@ class Holding(object):
         
         return self.account.get_stock_symbols()
 
+    def get_valuation_stats(self) -> ValuationStats:
+        return self.account.valuation_stats
 
-class Universe(object):
-    """
-    This defines an universe of stocks, from which one can choose stocks.
-    """
-    def __init__(self):
-        self.all_symbols = []
-    
-    def add(self, symbol: str):
-        if not check_valid_symbol(symbol):
-            raise ValueError(f'Cannot add {symbol}')
-        
-        if symbol not in self.all_symbols:
-            self.all_symbols.append(symbol)
-    
-    def get_universe(self) -> List[str]:
-        return self.all_symbols
-    
-    
+    def get_tax_lots(self) -> pd.DataFrame:
+        """
+        returns the realized and unrealized profit of every symbol,
+        at the prices of the last valuation
+        """
+        ledger = self.account.ledger
+        prices = dict(zip(ledger.symbols, ledger.price[:len(ledger)]))
+        return self.account.tax_lots.to_frame(prices)
+
+    def get_positions(self) -> pd.DataFrame:
+        """
+        returns the positions of the ledger, one row per symbol traded
+        """
+        return self.account.ledger.to_frame()
 
-    
\ No newline at end of file
+    def get_transactions(self, symbol: str = None, start_date: DateLike = None,
+                         end_date: DateLike = None) -> pd.DataFrame:
+        """
+        returns the transactions of the account, filtered like
+        TransactionLog.find
+        """
+        transaction_log = self.account.transaction_log
+        return transaction_log.to_frame(
+            transaction_log.find(symbol, start_date, end_date))
@@ -1,16 +1,15 @@
+import logging
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Tuple
 
 from .stock import Universe, Account, Holding, Stock
-from .utils import is_weekday
-
-import logging
-
+from .market_snapshot import MarketSnapshot
+from .utils import DateLike, is_weekday, to_date_str, to_day_ordinal
+from .read_write import get_trading_calendar
+from .run_log import get_logger, log_event
 
-#save logging
-logging.basicConfig(filename='log.txt', filemode='w', level=logging.INFO)
-log = logging.getLogger(__name__)
+log = get_logger('strategy')
 
 
 class StockChoice(object):
@@ -44,48 +43,71 @@ class Strategy(object):
         self.holding = Holding(cash=cash)
         self.init_cash = cash
         self.verbose = verbose
+        self.fill_report = None
+
+    def snapshot_symbols(self) -> List[str]:
+        """
+        the symbols the strategy prices: its universe and what it holds
+        """
+        return list(dict.fromkeys(
+            self.universe.get_universe() + self.holding.get_stocks_held()))
+
+    def get_snapshot(self, date: DateLike) -> MarketSnapshot:
+        return MarketSnapshot.build(self.snapshot_symbols(), date)
 
-    def play(self, date_today : str):
+    def play(self, date_today: DateLike, snapshot: MarketSnapshot = None):
         """
         Given a day, this is going to be a playing strategy.
-        Implemented by classes inheriting from here
+        Implemented by classes inheriting from here.
+        The day is a '%Y-%m-%d' string or a day ordinal. The prices of the 
+        day are read from snapshot, which is built here if not given
         """
         # day should be weekday
         if not is_weekday(date_today):
             raise ValueError(
                 f'Should be called only on weekdays, called on {date_today}')
+        if snapshot is None:
+            snapshot = self.get_snapshot(date_today)
+        elif not snapshot.is_for(date_today):
+            raise ValueError(
+                f'Snapshot is for {snapshot.date}, played on {to_date_str(date_today)}')
+        self.holding.set_snapshot(snapshot)
             
         # raise NotImplementedError("Subclasses should implement")
-        stocks_list = self._choose_stocks(date_today)
+        stocks_list = self._choose_stocks(date_today, snapshot)
         # reco can be 'buy', 'sell', 'hold'
-        # todo holding class should implement buy and sell
-        # not here
-        for stock_choice in stocks_list:
-            try:
-                self.holding.record(date=date_today, 
-                                    symbol=stock_choice.symbol, 
-                                    num=stock_choice.num, 
-                                    record_type=stock_choice.reco,
-                                    verbose=self.verbose)
-            except:
-                print(f"""
-                Could not execute order: {stock_choice.symbol},
-                {stock_choice.num}, {stock_choice.reco}
-                """)
-                continue
-        
+        self.fill_report = self.holding.execute_basket(
+            date_today, stocks_list, verbose=self.verbose)
+        if log.isEnabledFor(logging.INFO):
+            for row in self.fill_report.rows:
+                if row['status'] == 'rejected':
+                    log_event(log, 'order_rejected',
+                              date=to_date_str(date_today),
+                              symbol=row['symbol'], reco=row['reco'],
+                              num=row['num_requested'], reason=row['reason'])
+        if self.verbose and self.fill_report.rejected:
+            print('Could not execute orders: ' + ', '.join(
+                f'{symbol} ({reason})'
+                for _, symbol, reason in self.fill_report.rejected))
 
-        log.info(date_today)
         account = self.holding.get_holding_info(date_today)
-        log.info(account)
+        if log.isEnabledFor(logging.INFO):
+            log_event(log, 'valuation', date=to_date_str(date_today),
+                      strategy=type(self).__name__,
+                      current_valuation=account.current_valuation,
+                      cash_in_hand=account.cash_in_hand,
+                      total_profit=account.total_profit,
+                      realized_profit=account.realized_profit,
+                      num_stocks_held=len(account.stocks_held))
         
         if self.verbose:
-            print(date_today)
+            print(to_date_str(date_today))
             print(account)
 
         return account
     
-    def _choose_stocks(self, date: str) -> List[StockChoice]:
+    def _choose_stocks(self, date: DateLike,
+                       snapshot: MarketSnapshot) -> List[StockChoice]:
         raise NotImplementedError("Subclasses should implement")
         
         
@@ -98,7 +120,8 @@ class StupidStrategy(Strategy):
         Strategy.__init__(self,universe=universe, start_str=start_str, 
                           end_str=end_str, cash=cash, verbose=verbose)
         
-    def _choose_stocks(self, date: str) -> List[StockChoice]:
+    def _choose_stocks(self, date: DateLike,
+                       snapshot: MarketSnapshot) -> List[StockChoice]:
         all_stocks = self.universe.get_universe()
         random_val = np.random.randint(low=0, high=len(all_stocks),size=1)[0]
         stock_chosen = all_stocks[random_val]
@@ -117,14 +140,20 @@ class BenchMarkStrategy(Strategy):
         Strategy.__init__(self,universe=universe, start_str=start_str, 
                           end_str=end_str, cash=cash, verbose=verbose)
         self.buy_flag = False
+
+    def snapshot_symbols(self) -> List[str]:
+        return Strategy.snapshot_symbols(self) + ['VOO']
     
-    def _choose_stocks(self, date: str) -> List[StockChoice]:
+    def _choose_stocks(self, date: DateLike,
+                       snapshot: MarketSnapshot) -> List[StockChoice]:
         if self.buy_flag:
             return []
 
         this_account = self.holding.get_holding_info(date=date, is_strict=True)
-        etf_stock = Stock('VOO')
-        stock_price = etf_stock.get_price(date)
+        stock_price = snapshot.get_price('VOO')
+        if np.isnan(stock_price):
+            # try again on the next day
+            return []
         total_cash = self.holding.get_cash()
         num_etf_stock = int(np.floor(total_cash/stock_price))
         stock_chosen = StockChoice(symbol='VOO', num=num_etf_stock,
@@ -151,7 +180,8 @@ class RandomStrategy(Strategy):
         Strategy.__init__(self,universe=universe, start_str=start_str, 
                           end_str=end_str, cash=cash, verbose=verbose)
         
-    def _choose_stocks(self, date: str) -> List[StockChoice]:
+    def _choose_stocks(self, date: DateLike,
+                       snapshot: MarketSnapshot) -> List[StockChoice]:
         
         this_account = self.holding.get_holding_info(date=date, is_strict=True)
         all_stocks = self.universe.get_universe()
@@ -173,17 +203,13 @@ class RandomStrategy(Strategy):
 
             stock_chosen = all_stocks[rand_stock_num]
             # can we buy this.
-            try:
-                this_stock = Stock(stock_chosen)
-                stock_price = this_stock.get_price(date)
-                if self.account.cash_in_hand > 10. * stock_price:
-                    stock_choice = StockChoice(symbol=stock_chosen, num=10, 
+            stock_price = snapshot.get_price(stock_chosen)
+            if this_account.cash_in_hand > 10. * stock_price:
+                stock_choice = StockChoice(symbol=stock_chosen, num=10, 
                                            reco=record_type)
-                    return [stock_choice]
-            
-                else:
-                    return []
-            except:
+                return [stock_choice]
+            else:
+                # also when there is no price
                 return []
         else:
             stocks_held = self.holding.get_stocks_held()
@@ -200,4 +226,56 @@ class RandomStrategy(Strategy):
                                            reco=record_type)
 
                 return [stock_choice]
-            
\ No newline at end of file
+
+
+class TargetWeightStrategy(Strategy):
+    """
+    Holds the fraction of the valuation given by a date x symbol
+    DataFrame of target weights, rebalancing every rebalance_every
+    trading days from start_str. The number of shares is rounded down.
+    A date missing from the weights, or a row that is all NaN, does not
+    rebalance. This is the event driven counterpart of VectorBackTest
+    """
+    def __init__(self, universe: Universe, start_str: str, end_str: str,
+                 cash: float, weights: pd.DataFrame, rebalance_every: int = 1,
+                 verbose: bool = True):
+        Strategy.__init__(self,universe=universe, start_str=start_str, 
+                          end_str=end_str, cash=cash, verbose=verbose)
+        self.start_day = to_day_ordinal(start_str)
+        self.rebalance_every = rebalance_every
+        self.weight_symbols = list(weights.columns)
+        self.weight_values = weights.values.astype(np.float64)
+        weight_days = weights.index.values.astype('datetime64[D]').astype(np.int64)
+        self.weight_rows = {day: i for i, day in enumerate(weight_days)}
+
+    def snapshot_symbols(self) -> List[str]:
+        return list(dict.fromkeys(
+            Strategy.snapshot_symbols(self) + self.weight_symbols))
+
+    def _choose_stocks(self, date: DateLike,
+                       snapshot: MarketSnapshot) -> List[StockChoice]:
+        row = self.weight_rows.get(to_day_ordinal(date))
+        if row is None or np.isnan(self.weight_values[row]).all():
+            return []
+        day_diff = get_trading_calendar(fallback='weekdays').distance(
+            self.start_day, date)
+        if day_diff % self.rebalance_every != 0:
+            return []
+
+        account = self.holding.get_holding_info(date=date)
+        valuation = account.current_valuation
+        basket = []
+        prices = snapshot.get_prices(self.weight_symbols)
+        weights = np.nan_to_num(self.weight_values[row])
+        for symbol, weight, price in zip(self.weight_symbols, weights, prices):
+            if np.isnan(price):
+                continue
+            target = int(np.floor(weight * valuation / price))
+            held = account.ledger.get_quantity(symbol)
+            if target > held:
+                basket.append(StockChoice(symbol=symbol, num=target - held,
+                                          reco='buy'))
+            elif target < held:
+                basket.append(StockChoice(symbol=symbol, num=held - target,
+                                          reco='sell'))
+        return basket
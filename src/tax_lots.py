@@ -0,0 +1,172 @@
+"""
+FIFO tax lots.
+Every buy opens a lot, and every sell closes the oldest lots of the
+symbol first, splitting the last one if needed. The realized profit,
+the cost of the open lots and the holding periods are updated on each
+fill, so the profit and loss never needs the history to be replayed.
+Each lot is closed at most once, so matching is O(1) amortized per fill.
+"""
+from collections import deque
+import pandas as pd
+from typing import Dict, List
+
+from .utils import DateLike, to_day_ordinal
+
+
+class Lot(object):
+    """
+    num shares bought at price on day (a day ordinal)
+    """
+    __slots__ = ('num', 'price', 'day')
+
+    def __init__(self, num: int, price: float, day: int):
+        self.num = num
+        self.price = price
+        self.day = day
+
+
+class SymbolLots(object):
+    """
+    The open lots of one symbol, oldest first, and its running totals.
+    share_days is the sum over the closed shares of the days they were held
+    """
+    __slots__ = ('lots', 'open_num', 'open_cost', 'realized',
+                 'closed_num', 'share_days')
+
+    def __init__(self):
+        self.lots = deque()
+        self.open_num = 0
+        self.open_cost = 0.
+        self.realized = 0.
+        self.closed_num = 0
+        self.share_days = 0
+
+
+class TaxLotEngine(object):
+    """
+    Tracks the lots of any number of symbols
+    """
+    def __init__(self):
+        self.symbols = {}
+        self.realized_total = 0.
+        self.open_cost_total = 0.
+
+    def _get(self, symbol: str) -> SymbolLots:
+        symbol_lots = self.symbols.get(symbol)
+        if symbol_lots is None:
+            symbol_lots = SymbolLots()
+            self.symbols[symbol] = symbol_lots
+        return symbol_lots
+
+    def fill(self, symbol: str, date: DateLike, num: int, price: float,
+             buy_or_sell: str) -> float:
+        """
+        books a fill, returns the profit it realized
+        """
+        symbol_lots = self._get(symbol)
+        day = to_day_ordinal(date)
+        if buy_or_sell == 'buy':
+            symbol_lots.lots.append(Lot(num, price, day))
+            symbol_lots.open_num += num
+            symbol_lots.open_cost += num * price
+            self.open_cost_total += num * price
+            return 0.
+        if buy_or_sell != 'sell':
+            raise ValueError(f'Should be buy or sell, it is {buy_or_sell}')
+        if num > symbol_lots.open_num:
+            raise ValueError(
+                f'Cannot sell {num} of {symbol}, '
+                f'only {symbol_lots.open_num} are held')
+
+        lots = symbol_lots.lots
+        remaining = num
+        cost = 0.
+        share_days = 0
+        while remaining > 0:
+            lot = lots[0]
+            take = min(remaining, lot.num)
+            cost += take * lot.price
+            share_days += take * (day - lot.day)
+            remaining -= take
+            if take == lot.num:
+                lots.popleft()
+            else:
+                lot.num -= take
+
+        realized = num * price - cost
+        symbol_lots.open_num -= num
+        if symbol_lots.open_num == 0:
+            # no rounding left behind once the position is closed
+            cost = symbol_lots.open_cost
+        symbol_lots.open_cost -= cost
+        symbol_lots.realized += realized
+        symbol_lots.closed_num += num
+        symbol_lots.share_days += share_days
+        self.open_cost_total -= cost
+        self.realized_total += realized
+        return realized
+
+    def adopt(self, symbol: str, other: 'TaxLotEngine'):
+        """
+        takes over the lots and totals of a symbol from another engine
+        """
+        if symbol not in other.symbols:
+            return
+        symbol_lots = other.symbols[symbol]
+        self.symbols[symbol] = symbol_lots
+        self.open_cost_total += symbol_lots.open_cost
+        self.realized_total += symbol_lots.realized
+
+    def get_open_lots(self, symbol: str) -> List[Lot]:
+        return list(self._get(symbol).lots)
+
+    def get_open_num(self, symbol: str) -> int:
+        return self._get(symbol).open_num
+
+    def get_open_cost(self, symbol: str) -> float:
+        return self._get(symbol).open_cost
+
+    def realized_pnl(self, symbol: str = None) -> float:
+        if symbol is None:
+            return self.realized_total
+        return self._get(symbol).realized
+
+    def unrealized_pnl(self, symbol: str, price: float) -> float:
+        """
+        the profit of the open lots of a symbol, if sold at price
+        """
+        symbol_lots = self._get(symbol)
+        return symbol_lots.open_num * price - symbol_lots.open_cost
+
+    def average_holding_days(self, symbol: str = None) -> float:
+        """
+        the average number of days the sold shares were held
+        """
+        if symbol is None:
+            closed_num = sum(x.closed_num for x in self.symbols.values())
+            share_days = sum(x.share_days for x in self.symbols.values())
+        else:
+            closed_num = self._get(symbol).closed_num
+            share_days = self._get(symbol).share_days
+        if closed_num == 0:
+            return float('nan')
+        return share_days / closed_num
+
+    def to_frame(self, prices: Dict[str, float] = None) -> pd.DataFrame:
+        """
+        one row per symbol. With prices, also the unrealized profit
+        """
+        rows = []
+        for symbol, symbol_lots in self.symbols.items():
+            row = {
+                'symbol': symbol,
+                'open_num': symbol_lots.open_num,
+                'open_cost': symbol_lots.open_cost,
+                'num_lots': len(symbol_lots.lots),
+                'realized': symbol_lots.realized,
+                'average_holding_days': self.average_holding_days(symbol),
+            }
+            if prices is not None and symbol in prices:
+                row['unrealized'] = self.unrealized_pnl(symbol, prices[symbol])
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('symbol') if rows else pd.DataFrame()
@@ -0,0 +1,122 @@
+"""
+Trading calendar built from the days present in the price data.
+Days are day ordinals (days since 1970-01-01) or '%Y-%m-%d' strings,
+and the lookups return the same type they are given.
+Every lookup is O(1): the calendar keeps, for every calendar day in its
+range, the number of trading days before it.
+"""
+import numpy as np
+from typing import Iterator, List
+
+from .utils import DateLike, to_day_ordinal, from_day_ordinal
+
+
+def _like(day: int, date: DateLike) -> DateLike:
+    """
+    day as a string if date is one, else as a day ordinal
+    """
+    if isinstance(date, str):
+        return from_day_ordinal(day)
+    return day
+
+
+class TradingCalendar(object):
+    """
+    The trading days of the market, as a sorted array of day ordinals
+    """
+    def __init__(self, trading_days: np.ndarray):
+        self.days = np.unique(np.asarray(trading_days, dtype=np.int64))
+        if len(self.days) == 0:
+            raise ValueError('A trading calendar needs at least one day')
+        self.first_day = int(self.days[0])
+        self.last_day = int(self.days[-1])
+
+        # number of trading days strictly before each calendar day,
+        # from first_day to last_day + 1
+        is_trading = np.zeros(self.last_day - self.first_day + 2, dtype=np.int64)
+        is_trading[self.days - self.first_day] = 1
+        self._num_before = np.concatenate([[0], np.cumsum(is_trading)[:-1]])
+        self._is_trading = is_trading.astype(bool)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _position(self, day: int) -> int:
+        """
+        number of trading days strictly before day
+        """
+        if day <= self.first_day:
+            return 0
+        if day > self.last_day:
+            return len(self.days)
+        return int(self._num_before[day - self.first_day])
+
+    def _day_at(self, index: int, date: DateLike) -> int:
+        if index < 0 or index >= len(self.days):
+            raise ValueError(f'{date} is outside of the trading calendar')
+        return int(self.days[index])
+
+    def is_trading_day(self, date: DateLike) -> bool:
+        day = to_day_ordinal(date)
+        if day < self.first_day or day > self.last_day:
+            return False
+        return bool(self._is_trading[day - self.first_day])
+
+    def next_trading_day(self, date: DateLike) -> DateLike:
+        """
+        the first trading day after date
+        """
+        day = to_day_ordinal(date)
+        index = self._position(day) + (1 if self.is_trading_day(day) else 0)
+        return _like(self._day_at(index, date), date)
+
+    def previous_trading_day(self, date: DateLike) -> DateLike:
+        """
+        the last trading day before date
+        """
+        index = self._position(to_day_ordinal(date)) - 1
+        return _like(self._day_at(index, date), date)
+
+    def offset(self, date: DateLike, num_days: int) -> DateLike:
+        """
+        the trading day num_days trading days after date (before, if
+        negative). From a non trading day, one step forward is the next
+        trading day and one step back the previous one. An offset of 0 is
+        date itself, or the previous trading day
+        """
+        day = to_day_ordinal(date)
+        position = self._position(day)
+        if self.is_trading_day(day):
+            index = position + num_days
+        elif num_days > 0:
+            index = position + num_days - 1
+        else:
+            index = position + num_days - (1 if num_days == 0 else 0)
+        return _like(self._day_at(index, date), date)
+
+    def distance(self, start_date: DateLike, end_date: DateLike) -> int:
+        """
+        number of trading days in [start_date, end_date)
+        """
+        return (self._position(to_day_ordinal(end_date)) -
+                self._position(to_day_ordinal(start_date)))
+
+    def trading_days(self, start_date: DateLike, end_date: DateLike,
+                     include_end: bool = True) -> np.ndarray:
+        """
+        the trading days between start_date and end_date, as day ordinals
+        """
+        end_day = to_day_ordinal(end_date) + (1 if include_end else 0)
+        return self.days[self._position(to_day_ordinal(start_date)):self._position(end_day)]
+
+    def trading_dates(self, start_date: DateLike, end_date: DateLike,
+                      include_end: bool = True) -> List[str]:
+        """
+        the trading days between start_date and end_date, as strings
+        """
+        days = self.trading_days(start_date, end_date, include_end)
+        return list(days.astype('datetime64[D]').astype(str))
+
+    def iter_dates(self, start_date: DateLike, end_date: DateLike,
+                   include_end: bool = True) -> Iterator[str]:
+        return iter(self.trading_dates(start_date, end_date, include_end))
@@ -0,0 +1,135 @@
+"""
+Append only, columnar log of the transactions.
+The transactions are rows of a preallocated numpy structured array, which
+doubles in size when it is full, and symbols are stored as integer ids.
+A row takes 25 bytes instead of a Python object per transaction, and the
+log can be filtered and aggregated with numpy, or exported to
+parquet (needs pyarrow) and csv.
+"""
+import numpy as np
+import pandas as pd
+from typing import List
+
+from .utils import DateLike, to_day_ordinal, from_day_ordinal
+
+TRANSACTION_DTYPE = np.dtype([
+    ('day', np.int32),
+    ('symbol_id', np.int32),
+    ('side', np.int8),
+    ('num', np.int64),
+    ('price', np.float64),
+])
+
+# side is 1 for a buy and -1 for a sell
+SIDES = {'buy': 1, 'sell': -1}
+
+
+class Transaction(object):
+    """
+    One buy or sell. Slotted, so holding many of them is cheap
+    """
+    __slots__ = ('num', 'price', 'date', 'buy_or_sell')
+
+    def __init__(self, num: int, price: float, date: DateLike, buy_or_sell: str):
+        self.num = num
+        self.price = price
+        self.date = date
+        self.buy_or_sell = buy_or_sell
+        if self.buy_or_sell not in ['buy', 'sell']:
+            raise ValueError(f'buy_or_sell is {self.buy_or_sell}')
+
+
+class TransactionLog(object):
+    """
+    The rows are kept in the order they were appended
+    """
+    def __init__(self, capacity: int = 1024):
+        self._data = np.zeros(capacity, dtype=TRANSACTION_DTYPE)
+        self._size = 0
+        self.symbols = []
+        self.symbol_index = {}
+
+    def __len__(self):
+        return self._size
+
+    def _symbol_id(self, symbol: str) -> int:
+        symbol_id = self.symbol_index.get(symbol)
+        if symbol_id is None:
+            symbol_id = len(self.symbols)
+            self.symbols.append(symbol)
+            self.symbol_index[symbol] = symbol_id
+        return symbol_id
+
+    def append(self, symbol: str, t: Transaction) -> int:
+        """
+        adds a transaction, returns its row
+        """
+        if self._size == len(self._data):
+            data = np.zeros(2 * len(self._data), dtype=TRANSACTION_DTYPE)
+            data[:self._size] = self._data
+            self._data = data
+        row = self._size
+        self._data[row] = (to_day_ordinal(t.date), self._symbol_id(symbol),
+                           SIDES[t.buy_or_sell], t.num, t.price)
+        self._size += 1
+        return row
+
+    @property
+    def records(self) -> np.ndarray:
+        """
+        the rows appended so far, as a view
+        """
+        return self._data[:self._size]
+
+    def __getitem__(self, row: int) -> Transaction:
+        if row < 0:
+            row += self._size
+        if row < 0 or row >= self._size:
+            raise IndexError(f'row {row} is not in the log')
+        record = self._data[row]
+        return Transaction(
+            num=int(record['num']), price=float(record['price']),
+            date=from_day_ordinal(record['day']),
+            buy_or_sell='buy' if record['side'] > 0 else 'sell')
+
+    def find(self, symbol: str = None, start_date: DateLike = None,
+             end_date: DateLike = None) -> np.ndarray:
+        """
+        returns the rows of a symbol between start_date and end_date, both
+        inclusive. Every argument left as None matches all the rows
+        """
+        records = self.records
+        keep = np.ones(self._size, dtype=bool)
+        if symbol is not None:
+            if symbol not in self.symbol_index:
+                return np.empty(0, dtype=np.int64)
+            keep &= records['symbol_id'] == self.symbol_index[symbol]
+        if start_date is not None:
+            keep &= records['day'] >= to_day_ordinal(start_date)
+        if end_date is not None:
+            keep &= records['day'] <= to_day_ordinal(end_date)
+        return np.flatnonzero(keep)
+
+    def get_transactions(self, symbol: str = None, start_date: DateLike = None,
+                         end_date: DateLike = None) -> List[Transaction]:
+        return [self[x] for x in self.find(symbol, start_date, end_date)]
+
+    def to_frame(self, rows: np.ndarray = None) -> pd.DataFrame:
+        """
+        returns the log, or some rows of it, as a DataFrame
+        """
+        records = self.records if rows is None else self.records[rows]
+        return pd.DataFrame({
+            'date': pd.to_datetime(records['day'].astype('datetime64[D]')),
+            'symbol': np.asarray(self.symbols, dtype=object)[records['symbol_id']],
+            'buy_or_sell': np.where(records['side'] > 0, 'buy', 'sell'),
+            'num': records['num'],
+            'price': records['price'],
+            'amount': records['num'] * records['price'],
+        })
+
+    def to_parquet(self, filename: str):
+        self.to_frame().to_parquet(filename, engine='pyarrow', index=False)
+
+    def to_csv(self, filename: str):
+        self.to_frame().to_csv(filename, index=False)
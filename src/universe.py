@@ -0,0 +1,218 @@
+"""
+Universe of symbols, indexed.
+Every symbol of an universe has an integer id, its position, and the
+sector and ETF type of the symbols are arrays indexed by that id. A
+filter is a boolean mask over the ids, so filters combine with & and |,
+and select() turns a mask back into an universe. Membership is a
+dictionary lookup. The universe iterates over its symbols, so it can be
+passed as is to get_panel and to Factor.evaluate_panel.
+"""
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Iterator, List
+
+from .read_write import get_panel, get_prices, valid_symbols
+from .utils import DateLike
+
+# the company metadata shipped with the package
+METADATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+COMPANY_LIST_FILENAME = os.path.join(METADATA_FOLDER, 'all_company_list.csv')
+ETF_LIST_FILENAME = os.path.join(METADATA_FOLDER, 'vanguard_list_raw.csv')
+
+# sector of the ETFs, their category is in etf_type
+ETF_SECTOR = 'ETF'
+
+
+class Universe(object):
+    """
+    This defines an universe of stocks, from which one can choose stocks.
+    sector is the GICS sector of a stock, or ETF_SECTOR for an ETF.
+    etf_type is the category of an ETF, e.g. 'Bond - Long-term Government',
+    and '' for a stock. Both are '' when unknown
+    """
+    def __init__(self, symbols: Iterable[str] = None,
+                 sectors: Iterable[str] = None, etf_types: Iterable[str] = None):
+        self._set_symbols([] if symbols is None else symbols, sectors, etf_types)
+
+    def _set_symbols(self, symbols: Iterable[str], sectors: Iterable[str] = None,
+                     etf_types: Iterable[str] = None):
+        symbols = list(symbols)
+        num_symbols = len(symbols)
+        self.sector = np.array(
+            [''] * num_symbols if sectors is None else list(sectors), dtype=object)
+        self.etf_type = np.array(
+            [''] * num_symbols if etf_types is None else list(etf_types), dtype=object)
+        if len(self.sector) != num_symbols or len(self.etf_type) != num_symbols:
+            raise ValueError('Need one sector and one etf_type per symbol')
+
+        # the first occurrence of a symbol is kept
+        symbol_index = {}
+        for i, symbol in enumerate(symbols):
+            symbol_index.setdefault(symbol, i)
+        if len(symbol_index) < num_symbols:
+            keep = sorted(symbol_index.values())
+            symbols = [symbols[x] for x in keep]
+            self.sector = self.sector[keep]
+            self.etf_type = self.etf_type[keep]
+            symbol_index = {x: i for i, x in enumerate(symbols)}
+        self._symbols = symbols
+        self._index = symbol_index
+
+    @classmethod
+    def from_metadata(cls, company_filename: str = COMPANY_LIST_FILENAME,
+                      etf_filename: str = ETF_LIST_FILENAME) -> 'Universe':
+        """
+        builds the universe of all the companies of the metadata csvs,
+        with their sectors. The symbols of etf_filename are the ETFs
+        """
+        company_df = pd.read_csv(company_filename)
+        etf_df = pd.read_csv(etf_filename)
+        etf_types = dict(zip(etf_df['symbol'], etf_df['sector']))
+
+        symbols = list(company_df['symbol'])
+        is_etf = np.array([x in etf_types for x in symbols], dtype=bool)
+        sectors = np.where(is_etf, ETF_SECTOR, company_df['sector'].fillna(''))
+        return cls(symbols, sectors, [etf_types.get(x, '') for x in symbols])
+
+    @classmethod
+    def from_coverage(cls, coverage: pd.DataFrame, min_rows: int = 1,
+                      max_missing_days: int = None) -> 'Universe':
+        """
+        builds an universe from a table made by coverage_table, with the
+        symbols that have at least min_rows rows, and at most
+        max_missing_days missing days if given. No data is read per symbol
+        """
+        keep = coverage['num_rows'] >= min_rows
+        if max_missing_days is not None:
+            keep &= coverage['missing_days'] <= max_missing_days
+
+        return cls(coverage.index[keep])
+
+    @property
+    def all_symbols(self) -> List[str]:
+        return self._symbols
+
+    @all_symbols.setter
+    def all_symbols(self, symbols: Iterable[str]):
+        self._set_symbols(symbols)
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._index
+
+    def add(self, symbol: str, sector: str = '', etf_type: str = ''):
+        self.add_many([symbol], [sector], [etf_type])
+
+    def add_many(self, symbols: List[str], sectors: List[str] = None,
+                 etf_types: List[str] = None):
+        """
+        adds the symbols not in the universe yet. They are all checked
+        for data in one pass, and none is added if one has no data
+        """
+        sectors = [''] * len(symbols) if sectors is None else sectors
+        etf_types = [''] * len(symbols) if etf_types is None else etf_types
+        new = {}
+        for i, symbol in enumerate(symbols):
+            if symbol not in self._index:
+                new.setdefault(symbol, i)
+        invalid = set(new) - set(valid_symbols(list(new))) if new else set()
+        if len(invalid) > 0:
+            raise ValueError(f'Cannot add {sorted(invalid)}')
+
+        for symbol in new:
+            self._index[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        self.sector = np.concatenate([
+            self.sector, np.array([sectors[i] for i in new.values()], dtype=object)])
+        self.etf_type = np.concatenate([
+            self.etf_type, np.array([etf_types[i] for i in new.values()], dtype=object)])
+
+    def get_universe(self) -> List[str]:
+        return self._symbols
+
+    def get_id(self, symbol: str) -> int:
+        return self._index[symbol]
+
+    def get_ids(self, symbols: Iterable[str]) -> np.ndarray:
+        """
+        the ids of the symbols, -1 for the ones not in the universe
+        """
+        return np.array([self._index.get(x, -1) for x in symbols], dtype=np.int64)
+
+    def get_sector(self, symbol: str) -> str:
+        return self.sector[self._index[symbol]]
+
+    def get_sectors(self) -> Dict[str, List[str]]:
+        """
+        the symbols of every sector
+        """
+        sectors = {}
+        for symbol, sector in zip(self._symbols, self.sector):
+            sectors.setdefault(sector, []).append(symbol)
+        return sectors
+
+    # filters, as boolean masks over the ids
+
+    def mask_of(self, symbols: Iterable[str]) -> np.ndarray:
+        mask = np.zeros(len(self), dtype=bool)
+        ids = self.get_ids(symbols)
+        mask[ids[ids >= 0]] = True
+        return mask
+
+    def sector_mask(self, sectors: Iterable[str]) -> np.ndarray:
+        return np.isin(self.sector, list(sectors))
+
+    def etf_mask(self, etf_types: Iterable[str] = None) -> np.ndarray:
+        """
+        the ETFs, only of the etf_types if given
+        """
+        if etf_types is None:
+            return self.sector == ETF_SECTOR
+        return np.isin(self.etf_type, list(etf_types))
+
+    def data_mask(self, date: DateLike) -> np.ndarray:
+        """
+        the symbols with a price on date, in one bulk read
+        """
+        return ~np.isnan(get_prices(self._symbols, date))
+
+    def volume_mask(self, min_volume: float, start_date: DateLike,
+                    end_date: DateLike = None) -> np.ndarray:
+        """
+        the symbols whose average volume between start_date and end_date
+        (or on start_date alone) is above min_volume
+        """
+        end_date = start_date if end_date is None else end_date
+        volume = get_panel(self._symbols, start_date, end_date,
+                           fields='Volume', as_array=True).astype(np.float64)
+        mask = np.zeros(len(self), dtype=bool)
+        has_data = (~np.isnan(volume)).any(axis=0)
+        mask[has_data] = np.nanmean(volume[:, has_data], axis=0) > min_volume
+        return mask
+
+    def select(self, mask: np.ndarray) -> 'Universe':
+        """
+        the universe of the symbols where mask is True
+        """
+        ids = np.flatnonzero(mask)
+        return Universe([self._symbols[x] for x in ids],
+                        self.sector[ids], self.etf_type[ids])
+
+    # the panel and factor APIs, over the symbols of the universe
+
+    def get_panel(self, start_date: DateLike, end_date: DateLike,
+                  fields='Open', as_array: bool = False):
+        return get_panel(self._symbols, start_date, end_date, fields=fields,
+                         as_array=as_array)
+
+    def evaluate(self, factor, end_date: DateLike) -> Dict[str, float]:
+        """
+        the value of a factor for every symbol, e.g. LinRegFactor()
+        """
+        return factor.evaluate_panel(self._symbols, end_date)
@@ -1,4 +1,17 @@
+import os
+import subprocess
+import sys
 from datetime import timedelta, date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+# dates are '%Y-%m-%d' strings at the API boundary, and day ordinals
+# (days since 1970-01-01) inside the hot loops
+DateLike = Union[str, int]
 
 # a generator for the dates
 def daterange(start_date: str, end_date: str) -> str:
@@ -10,24 +23,95 @@ def daterange(start_date: str, end_date: str) -> str:
         yield datetime.strftime(this_date, '%Y-%m-%d')
 
 
-def is_weekday(date: str) -> bool:
+def is_weekday(date: DateLike) -> bool:
     """
     Is the market open on this day
     """
-    formatted_date = datetime.strptime(date, '%Y-%m-%d')
-    day = formatted_date.weekday()
-    #monday is zero, sunday is 6
+    # 1970-01-01 was a thursday, monday is zero, sunday is 6
+    day = (to_day_ordinal(date) + 3) % 7
     if (day == 5 or day == 6):
         return False
     else:
         return True
     
-def date_n_day_from(date: str, delta: int):
+def date_n_day_from(date: DateLike, delta: int) -> DateLike:
+    """
+    utility function to find the date n days from now.
+    Returns a day ordinal for a day ordinal, and a string for a string
+    """
+    if not isinstance(date, str):
+        return int(date) + delta
+    return from_day_ordinal(to_day_ordinal(date) + delta)
+
+
+@lru_cache(maxsize=65536)
+def _parse_day(date: str) -> int:
+    return (datetime.strptime(date, '%Y-%m-%d') - EPOCH).days
+
+
+def to_day_ordinal(date: DateLike) -> int:
+    """
+    converts a '%Y-%m-%d' date to the number of days since 1970-01-01.
+    Day ordinals are returned as they are
+    """
+    if isinstance(date, str):
+        return _parse_day(date)
+    return int(date)
+
+
+@lru_cache(maxsize=65536)
+def _format_day(day: int) -> str:
+    return datetime.strftime(EPOCH + timedelta(days=day), '%Y-%m-%d')
+
+
+def from_day_ordinal(day: int) -> str:
     """
-    utility function to find the date n days from now
+    converts a number of days since 1970-01-01 back to '%Y-%m-%d'
     """
-    formatted_date = datetime.strptime(date, '%Y-%m-%d')
-    new_date = formatted_date + timedelta(days=delta)
-    new_date_str = datetime.strftime(new_date, '%Y-%m-%d')
+    return _format_day(int(day))
+
+
+def to_date_str(date: DateLike) -> str:
+    """
+    converts a day ordinal to '%Y-%m-%d', strings are returned as they are
+    """
+    if isinstance(date, str):
+        return date
+    return from_day_ordinal(date)
+
+
+def to_datetime64(date: DateLike) -> np.datetime64:
+    return np.datetime64(to_day_ordinal(date), 'D')
+
+
+def measure_import_time(module_name: str,
+                        preload: Tuple[str, ...] = ('numpy', 'pandas')
+                        ) -> Dict[str, Any]:
+    """
+    imports a module in a fresh interpreter with python -X importtime.
+    The preload modules are imported first and are not counted.
+    Returns the cumulative import time of the module in microseconds,
+    and the names of all the modules its import loaded
+    """
+    repo_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ''.join(f'import {x}; ' for x in preload) + f'import {module_name}'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=repo_folder, capture_output=True, text=True, check=True)
+
+    # lines look like "import time:  self [us] | cumulative |   name",
+    # nested imports are indented and come before their parent
+    modules = []
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  ') and name.strip() in preload:
+            modules = []
+            continue
+        modules.append(name.strip())
+        if name.strip() == module_name:
+            cumulative_us = int(cumulative)
 
-    return new_date_str
\ No newline at end of file
+    return {'cumulative_us': cumulative_us, 'modules': modules}
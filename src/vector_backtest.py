@@ -0,0 +1,212 @@
+"""
+Vectorized backtest of target weights.
+Instead of stepping through Strategy.play, the strategy is a date x symbol
+matrix of target weights: the fraction of the equity to hold in each
+symbol. Positions, trades, cash, equity and turnover are computed with
+numpy, looping only over the rebalance days, one vector operation per
+day across all the symbols. With integer shares, the trades are the
+same as the ones TargetWeightStrategy makes through the event driven
+BackTest: each target is rounded down, sells and buys happen at the
+price of the day, and a symbol without a price is not traded.
+"""
+import numpy as np
+import pandas as pd
+from typing import Iterable, Union
+
+from .backtest import backtest_days
+from .market_snapshot import MAX_STALENESS_DAYS
+from .read_write import get_panel
+from .utils import DateLike
+
+
+def asof_matrix(values: np.ndarray, value_days: np.ndarray, days: np.ndarray,
+                max_staleness: int = None) -> np.ndarray:
+    """
+    the as of prices of every column of a date x symbol matrix on days:
+    the last non NaN value on or before each day, at most max_staleness
+    calendar days old, NaN if there is none
+    """
+    num_rows, num_cols = values.shape
+    valid = ~np.isnan(values)
+    # the last valid row of every column, up to each row
+    last_valid = np.where(valid, np.arange(num_rows)[:, None], -1)
+    last_valid = np.maximum.accumulate(last_valid, axis=0) if num_rows else last_valid
+
+    out = np.full((len(days), num_cols), np.nan)
+    pos = np.searchsorted(value_days, days, side='right') - 1
+    has_row = pos >= 0
+    rows = np.full((len(days), num_cols), -1)
+    rows[has_row] = last_valid[pos[has_row]]
+    found = rows >= 0
+    if max_staleness is not None:
+        found &= (days[:, None] - value_days[np.maximum(rows, 0)]) <= max_staleness
+    cols = np.broadcast_to(np.arange(num_cols), rows.shape)
+    out[found] = values[rows[found], cols[found]]
+    return out
+
+
+def signal_to_weights(signal: Union[np.ndarray, pd.DataFrame],
+                      top_n: int = None) -> Union[np.ndarray, pd.DataFrame]:
+    """
+    long only weights from a signal matrix: every row is invested in
+    the symbols with a positive signal (only the top_n largest if given),
+    in proportion to the signal. Rows that are all NaN stay NaN, so they
+    do not rebalance
+    """
+    values = np.asarray(signal, dtype=np.float64)
+    no_signal = np.isnan(values).all(axis=1)
+    positive = np.where(np.isnan(values), 0., np.maximum(values, 0.))
+    if top_n is not None:
+        rank = (-positive).argsort(axis=1, kind='stable').argsort(axis=1)
+        positive[rank >= top_n] = 0.
+    total = positive.sum(axis=1, keepdims=True)
+    weights = np.divide(positive, total, out=np.zeros_like(positive),
+                        where=total > 0)
+    weights[no_signal] = np.nan
+    if isinstance(signal, pd.DataFrame):
+        return pd.DataFrame(weights, index=signal.index, columns=signal.columns)
+    return weights
+
+
+class VectorBackTestResult(object):
+    """
+    positions and trades are date x symbol matrices of shares, cash,
+    equity and turnover have one value per day. The turnover is the
+    amount traded on a day over the equity
+    """
+    def __init__(self, dates: pd.DatetimeIndex, symbols: Iterable[str],
+                 positions: np.ndarray, cash: np.ndarray, equity: np.ndarray,
+                 traded: np.ndarray, init_cash: float):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.positions = positions
+        self.trades = np.diff(positions, axis=0, prepend=0)
+        self.cash = cash
+        self.equity = equity
+        self.turnover = np.divide(traded, equity, out=np.zeros_like(traded),
+                                  where=equity > 0)
+        self.total_profit = equity - init_cash
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'cash': self.cash,
+            'equity': self.equity,
+            'total_profit': self.total_profit,
+            'turnover': self.turnover,
+        }, index=self.dates)
+
+    def get_positions(self) -> pd.DataFrame:
+        return pd.DataFrame(self.positions, index=self.dates, columns=self.symbols)
+
+    def get_trades(self) -> pd.DataFrame:
+        return pd.DataFrame(self.trades, index=self.dates, columns=self.symbols)
+
+
+class VectorBackTest(object):
+    """
+    Backtests target weights against a date x symbol matrix of prices.
+    Trades use prices, the positions are valued at the last known price.
+    The weights are rebalanced every rebalance_every days, and each row
+    should sum to at most 1. With integer_shares the number of shares
+    is rounded down, otherwise fractional shares are held
+    """
+    def __init__(self, prices: pd.DataFrame, cash: float,
+                 rebalance_every: int = 1, integer_shares: bool = True):
+        if rebalance_every < 1:
+            raise ValueError(f'rebalance_every should be at least 1, got {rebalance_every}')
+        self.prices = prices
+        self.cash = cash
+        self.rebalance_every = rebalance_every
+        self.integer_shares = integer_shares
+
+        self._trade_prices = prices.values.astype(np.float64)
+        # positions without any price yet are worth nothing
+        self._mark_prices = np.nan_to_num(prices.ffill().values.astype(np.float64))
+
+    @classmethod
+    def from_store(cls, symbols: Iterable[str], start_date: DateLike,
+                   end_date: DateLike, cash: float, field: str = 'Open',
+                   max_staleness: int = MAX_STALENESS_DAYS,
+                   **kwargs) -> 'VectorBackTest':
+        """
+        reads the prices of the trading days from start_date to end_date,
+        end_date excluded, in one panel read. Like the event driven
+        backtest, a price is the last one at most max_staleness days old
+        """
+        symbols = list(symbols)
+        days = np.asarray(backtest_days(start_date, end_date), dtype=np.int64)
+        if len(days) == 0:
+            values = np.empty((0, len(symbols)))
+        else:
+            panel = get_panel(symbols, days[0] - max_staleness, days[-1],
+                              fields=field, as_array=False)
+            panel_days = panel.index.values.astype('datetime64[D]').astype(np.int64)
+            values = asof_matrix(panel.values.astype(np.float64), panel_days,
+                                 days, max_staleness)
+        dates = pd.DatetimeIndex(days.astype('datetime64[D]'), name='date')
+        return cls(pd.DataFrame(values, index=dates, columns=symbols), cash,
+                   **kwargs)
+
+    def _align(self, weights: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """
+        the weights as a matrix shaped like the prices. Dates missing
+        from a DataFrame do not rebalance, missing symbols get 0
+        """
+        if isinstance(weights, pd.DataFrame):
+            weights = weights.reindex(index=self.prices.index)
+            no_row = weights.isna().all(axis=1).values
+            weights = weights.reindex(columns=self.prices.columns).values
+            weights = np.where(np.isnan(weights), 0., weights)
+            weights[no_row] = np.nan
+            return weights.astype(np.float64)
+
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != self._trade_prices.shape:
+            raise ValueError(
+                f'weights are {weights.shape}, prices are {self._trade_prices.shape}')
+        return weights
+
+    def run(self, weights: Union[np.ndarray, pd.DataFrame]) -> VectorBackTestResult:
+        """
+        backtests a date x symbol matrix of target weights. A row that is
+        all NaN keeps the positions, in other rows NaN is a weight of 0
+        """
+        weights = self._align(weights)
+        num_days, num_symbols = weights.shape
+        trade_prices = self._trade_prices
+        mark_prices = self._mark_prices
+
+        is_rebalance = ~np.isnan(weights).all(axis=1)
+        is_rebalance &= np.arange(num_days) % self.rebalance_every == 0
+        rebalance_rows = np.flatnonzero(is_rebalance)
+
+        dtype = np.int64 if self.integer_shares else np.float64
+        # the positions and cash after each rebalance
+        rebalance_positions = np.zeros((len(rebalance_rows) + 1, num_symbols), dtype=dtype)
+        rebalance_cash = np.full(len(rebalance_rows) + 1, float(self.cash))
+        traded = np.zeros(num_days)
+
+        current = np.zeros(num_symbols, dtype=dtype)
+        cash = float(self.cash)
+        for k, t in enumerate(rebalance_rows):
+            price = trade_prices[t]
+            has_price = ~np.isnan(price)
+            equity = cash + np.dot(current, mark_prices[t])
+            target = current.copy()
+            shares = np.nan_to_num(weights[t][has_price]) * equity / price[has_price]
+            target[has_price] = np.floor(shares) if self.integer_shares else shares
+
+            trade_amount = (target - current)[has_price] * price[has_price]
+            cash -= trade_amount.sum()
+            traded[t] = np.abs(trade_amount).sum()
+            current = target
+            rebalance_positions[k + 1] = current
+            rebalance_cash[k + 1] = cash
+
+        # every day holds what the last rebalance, if any, bought
+        last_rebalance = np.cumsum(is_rebalance)
+        positions = rebalance_positions[last_rebalance]
+        cash = rebalance_cash[last_rebalance]
+        equity = cash + np.einsum('ij,ij->i', positions, mark_prices)
+        return VectorBackTestResult(self.prices.index, self.prices.columns,
+                                    positions, cash, equity, traded, self.cash)
@@ -1,13 +1,49 @@
 import unittest
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
 
 
-from src.read_write import ReadData
-from src.utils import daterange
+from src.read_write import (ReadData, WriteData, set_data_source,
+                            make_big_dataframe, set_online_cache, get_panel,
+                            coverage_table, valid_symbols,
+                            get_trading_calendar, get_price_asof)
+from src.downloader import BulkDownloader, HttpCsvSource
+from src.online_cache import FetchError, OnlineCache, merge_ranges, missing_ranges
+from src.utils import (daterange, measure_import_time, date_n_day_from,
+                       is_weekday, to_day_ordinal, from_day_ordinal)
 from src.stock import Stock, Holding, Universe
-from src.strategy import StupidStrategy, BenchMarkStrategy, RandomStrategy
-from src.backtest import BackTest
+from src.strategy import StockChoice, TargetWeightStrategy, StupidStrategy, BenchMarkStrategy, RandomStrategy
+from src.backtest import BackTest, MultiBackTest, backtest_days
+from src.vector_backtest import VectorBackTest, asof_matrix, signal_to_weights
 from src.linreg_strategy import LinRegStrategy
-from src.factor import Factor, LinRegFactor, MovingAverageFactor
+from src.factor import (Factor, LinRegFactor, MovingAverageFactor,
+                        PercReturnFactor, linreg_slopes)
+from src.price_store import PriceStore, COMPACT_RTOL
+from src.parquet_store import (ParquetStore, convert_csv_to_parquet,
+                               benchmark_price_formats)
+from src.price_cube import PriceCube, build_price_cube
+from src.sqlite_store import SqliteStore
+from src.trading_calendar import TradingCalendar
+from src.ledger import PositionLedger
+from src.transaction_log import Transaction, TransactionLog
+from src.tax_lots import TaxLotEngine
+from src.market_snapshot import MarketSnapshot
+from src.universe import ETF_SECTOR
+from src.run_log import start_logging, stop_logging, is_logging
+
+# importing the package, without numpy and pandas, should take less than this
+IMPORT_TIME_BUDGET_US = 150000
+# only loaded on the code paths that need them
+LAZY_MODULES = ['statsmodels', 'matplotlib', 'seaborn', 'yfinance',
+                'pandas_datareader', 'sqlite3', 'pyarrow']
 
 # to run all tests:
 # python3.8 -m unittest tests/test_framework.py
@@ -15,6 +51,107 @@ from src.factor import Factor, LinRegFactor, MovingAverageFactor
 # to run a particular test:
 # python3.8 -m unittest tests.test_framework.TestFrameWork.test_read_data
 
+def write_test_prices(filename: str, symbols=('AAA', 'BBB'),
+                      start_date='2019-12-02', end_date='2019-12-31'):
+    """
+    writes a small made up dataset in the same format as the offline csv.
+    Prices go up by 1 every business day, starting at 100 for the first
+    symbol, 200 for the second and so on.
+    """
+    dates = pd.bdate_range(start_date, end_date)
+    df_list = []
+    for i, symbol in enumerate(symbols):
+        price = 100. * (i + 1) + np.arange(len(dates))
+        df = pd.DataFrame({
+            'High': price + 1., 'Low': price - 1., 'Open': price,
+            'Close': price + 0.5, 'Volume': 1000 * (i + 1),
+            'Adj Close': price + 0.5, 'symbol': symbol,
+            'date': dates.strftime('%Y-%m-%d')
+        })
+        df_list.append(df)
+    pd.concat(df_list, ignore_index=True).to_csv(filename, index=False)
+
+
+class LocalPriceSource(object):
+    """
+    stands in for the yahoo source in tests. Serves the rows of a csv
+    written by write_test_prices, in the format of pdr.get_data_yahoo,
+    and remembers the calls made
+    """
+    def __init__(self, filename: str):
+        self.all_df = pd.read_csv(filename, parse_dates=['date'])
+        self.calls = []
+
+    def __call__(self, symbol: str, start_date: str, end_date: str):
+        self.calls.append((symbol, start_date, end_date))
+        df = self.all_df[
+            (self.all_df['symbol'] == symbol) &
+            (self.all_df['date'] >= start_date) &
+            (self.all_df['date'] <= end_date)
+        ]
+        return df.drop(columns=['symbol']).set_index('date')
+
+
+class StubPriceServer(object):
+    """
+    local http server that serves /SYMBOL.csv?start=..&end=.. from a csv
+    written by write_test_prices. latency (symbol -> seconds) delays the
+    answers, errors (symbol -> count) answers 500 to the first requests
+    """
+    def __init__(self, filename: str, latency=None, errors=None):
+        self.all_df = pd.read_csv(filename)
+        self.latency = latency if latency is not None else {}
+        self.errors = dict(errors) if errors is not None else {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                symbol = urllib.parse.unquote(url.path.strip('/'))[:-len('.csv')]
+                query = urllib.parse.parse_qs(url.query)
+                stub.requests.append(symbol)
+                time.sleep(stub.latency.get(symbol, 0.))
+                if stub.errors.get(symbol, 0) > 0:
+                    stub.errors[symbol] -= 1
+                    self.send_error(500)
+                    return
+                df = stub.all_df[
+                    (stub.all_df['symbol'] == symbol) &
+                    (stub.all_df['date'] >= query['start'][0]) &
+                    (stub.all_df['date'] <= query['end'][0])
+                ]
+                if df.shape[0] == 0:
+                    self.send_error(404)
+                    return
+                body = df.drop(columns=['symbol']).rename(
+                    columns={'date': 'Date'}).to_csv(index=False).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/csv')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up waiting
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
 # write all the tests
 class TestFrameWork(unittest.TestCase):
     def test_read_data(self):
@@ -274,5 +411,995 @@ class TestFrameWork(unittest.TestCase):
         test_stock = Stock('AAPL')
         ma_fac = MovingAverageFactor(short_term=20, long_term=100)
         ma_1 = ma_fac(stock=test_stock,end_date='2019-11-15')
-        
-        
\ No newline at end of file
+
+    def test_price_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            store = PriceStore(filename)
+            self.assertFalse(store.is_loaded())
+
+            read_df = store.get_data('BBB', '2019-12-02', '2019-12-06')
+            self.assertTrue(store.is_loaded())
+            self.assertEqual(read_df.shape[0], 5)
+            self.assertAlmostEqual(read_df['Open'].values[0], 200., places=2)
+            self.assertEqual(store.get_data('CCC', '2019-12-02',
+                                            '2019-12-06').shape[0], 0)
+            self.assertTrue(store.memory_usage()['total'] > 0)
+
+            # ranges are found by binary search on the sorted dates
+            weekend_df = store.get_data('AAA', '2019-12-07', '2019-12-08')
+            self.assertEqual(weekend_df.shape[0], 0)
+            np.testing.assert_allclose(
+                store.get_array('AAA', '2019-12-06', '2019-12-09'), [104., 105.])
+            np.testing.assert_allclose(
+                store.get_array('BBB', '2019-11-01', '2019-12-03'), [200., 201.])
+
+            store.invalidate()
+            self.assertFalse(store.is_loaded())
+            self.assertEqual(store.memory_usage()['total'], 0)
+            store.reload()
+            self.assertEqual(set(store.get_symbols()), {'AAA', 'BBB'})
+
+        self.assertIs(PriceStore.instance(), PriceStore.instance())
+
+    def test_parquet_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            parquet_folder = os.path.join(tmp_dir, 'prices')
+            write_test_prices(filename, end_date='2020-01-10')
+            convert_csv_to_parquet(filename, parquet_folder)
+
+            self.assertTrue(os.path.isdir(
+                os.path.join(parquet_folder, 'symbol=AAA', 'year=2020')))
+
+            parquet_store = ParquetStore(parquet_folder)
+            read_df = parquet_store.get_data(
+                'AAA', '2019-12-30', '2020-01-03', columns=['Open'])
+            csv_df = PriceStore(filename).get_data(
+                'AAA', '2019-12-30', '2020-01-03')
+
+            self.assertEqual(set(read_df.columns), {'Open', 'symbol', 'date'})
+            np.testing.assert_allclose(
+                read_df['Open'].values, csv_df['Open'].values)
+            self.assertEqual(parquet_store.get_data(
+                'CCC', '2019-12-30', '2020-01-03').shape[0], 0)
+
+            benchmark = benchmark_price_formats(
+                filename, parquet_folder, symbol='AAA', start_date='2019-12-30',
+                end_date='2020-01-03')
+            self.assertEqual(list(benchmark.index), ['csv', 'parquet'])
+            self.assertEqual(list(benchmark.columns), [
+                'disk_bytes', 'cold_read_seconds', 'symbol_query_seconds'])
+            self.assertTrue((benchmark.values > 0).all())
+
+    def test_price_cube(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            cube_folder = os.path.join(tmp_dir, 'cube')
+            write_test_prices(filename)
+            build_price_cube(cube_folder, price_store=PriceStore(filename))
+
+            price_cube = PriceCube(cube_folder)
+            history = price_cube.get_array('BBB', '2019-12-02', '2019-12-06')
+            self.assertIsInstance(history.base, np.memmap)
+            np.testing.assert_allclose(history, [200., 201., 202., 203., 204.])
+
+            set_data_source('cube', cube_folder)
+            try:
+                test_stock = Stock('AAA')
+                self.assertAlmostEqual(
+                    test_stock.get_price('2019-12-03'), 101., places=2)
+                self.assertEqual(test_stock.get_price_history(
+                    '2019-12-01', '2019-12-09').shape[0], 6)
+            finally:
+                set_data_source('csv')
+
+    def test_sqlite_store(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            db_filename = os.path.join(tmp_dir, 'prices.sqlite')
+            write_test_prices(filename)
+            sqlite_store = SqliteStore(db_filename)
+            sqlite_store.load_csv(filename)
+
+            read_df = sqlite_store.get_data('BBB', '2019-12-02', '2019-12-06')
+            self.assertEqual(read_df.shape[0], 5)
+            self.assertAlmostEqual(read_df['Open'].values[0], 200., places=2)
+            with self.assertRaises(ValueError):
+                sqlite_store.get_data('BBB', '2019-12-02', '2019-12-06',
+                                      columns=['Opne'])
+            self.assertEqual(
+                sqlite_store.get_last_dates(),
+                {'AAA': '2019-12-31', 'BBB': '2019-12-31'})
+
+            # loading again replaces rows instead of duplicating them
+            sqlite_store.load_csv(filename)
+            np.testing.assert_allclose(
+                sqlite_store.get_array('AAA', '2019-12-06', '2019-12-09'),
+                [104., 105.])
+
+            set_data_source('sqlite', db_filename)
+            try:
+                self.assertAlmostEqual(
+                    Stock('BBB').get_price('2019-12-03'), 201., places=2)
+            finally:
+                set_data_source('csv')
+            sqlite_store.close()
+
+    def test_write_data(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_filename = os.path.join(tmp_dir, 'source.csv')
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(source_filename, symbols=('AAA', 'BBB', 'CCC'))
+            source = LocalPriceSource(source_filename)
+
+            write_data = WriteData(filename, fetch_data=source)
+            summary = write_data.update(
+                ['AAA', 'BBB'], end_date='2019-12-13', start_date='2019-12-02')
+            self.assertEqual(summary['rows_added'], 20)
+
+            # only the missing tail is fetched, new symbols from the start
+            summary = write_data.update(
+                ['AAA', 'BBB', 'CCC'], end_date='2019-12-20',
+                start_date='2019-12-02')
+            self.assertIn(('AAA', '2019-12-14', '2019-12-20'), source.calls)
+            self.assertIn(('CCC', '2019-12-02', '2019-12-20'), source.calls)
+            self.assertEqual(summary['rows_added'], 5 + 5 + 15)
+            self.assertEqual(write_data.get_last_dates()['CCC'], '2019-12-20')
+
+            # nothing left to fetch
+            num_calls = len(source.calls)
+            summary = write_data.update(['AAA'], end_date='2019-12-20')
+            self.assertEqual(summary['rows_added'], 0)
+            self.assertEqual(len(source.calls), num_calls)
+
+            store = PriceStore(filename)
+            self.assertEqual(store.get_all_data().shape[0], 45)
+            np.testing.assert_allclose(
+                store.get_array('AAA', '2019-12-12', '2019-12-17'),
+                [108., 109., 110., 111.])
+
+            # the manifest can be rebuilt from the csv
+            os.remove(write_data.manifest_filename)
+            self.assertEqual(write_data.get_last_dates()['BBB'], '2019-12-20')
+
+            # a crash after the csv swap, before the manifest was written:
+            # the old manifest is not trusted, so nothing is appended twice
+            write_data.rebuild_manifest()
+            with open(write_data.manifest_filename, 'r') as readfile:
+                old_manifest = readfile.read()
+            write_data.update(['AAA'], end_date='2019-12-24')
+            with open(write_data.manifest_filename, 'w') as outfile:
+                outfile.write(old_manifest)
+            summary = write_data.update(['AAA'], end_date='2019-12-24')
+            self.assertEqual(summary['rows_added'], 0)
+            self.assertEqual(PriceStore(filename).get_all_data().shape[0], 47)
+
+            # the csv rewritten without the manifest, cut back to 12-17:
+            # the missing days are fetched again, leaving no gap
+            all_df = pd.read_csv(filename)
+            all_df[all_df['date'] <= '2019-12-17'].to_csv(filename, index=False)
+            write_data.update(['AAA'], end_date='2019-12-26')
+            self.assertIn(('AAA', '2019-12-18', '2019-12-26'), source.calls)
+            self.assertEqual(
+                len(PriceStore(filename).get_array('AAA', '2019-12-02', '2019-12-26')), 19)
+            self.assertEqual(write_data.rebuild_manifest()['last_dates']['AAA'],
+                             '2019-12-26')
+
+    def test_bulk_download(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'source.csv')
+            write_test_prices(filename, symbols=('AAA', 'BBB', 'CCC', 'DDD'))
+
+            stub = StubPriceServer(filename, latency={'CCC': 1.},
+                                   errors={'BBB': 2})
+            with stub:
+                downloader = BulkDownloader(
+                    source=HttpCsvSource(stub.url), max_workers=4,
+                    timeout=0.5, max_retries=2, backoff=0.01,
+                    rate_per_second=100.)
+                big_df, report = make_big_dataframe(
+                    ['AAA', 'BBB', 'CCC', 'EEE'], '2019-12-02', '2019-12-06',
+                    downloader=downloader, return_report=True)
+
+            # BBB succeeds on the third try, CCC always times out,
+            # EEE does not exist
+            self.assertEqual(set(report.succeeded), {'AAA', 'BBB'})
+            self.assertEqual(set(report.failed.keys()), {'CCC', 'EEE'})
+            self.assertEqual(report.attempts['BBB'], 3)
+            self.assertIn('TimeoutError', report.failed['CCC'])
+            self.assertEqual(report.to_frame().shape[0], 4)
+
+            self.assertEqual(big_df.shape[0], 10)
+            self.assertEqual(set(big_df['symbol']), {'AAA', 'BBB'})
+            self.assertAlmostEqual(
+                big_df.query("symbol == 'BBB'")['Open'].values[0], 200., places=2)
+
+    def test_online_cache(self):
+        self.assertEqual(merge_ranges([(5, 9), (1, 3), (4, 4), (12, 14)]),
+                         [(1, 9), (12, 14)])
+        self.assertEqual(missing_ranges([(3, 5), (8, 9)], 1, 12),
+                         [(1, 2), (6, 7), (10, 12)])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'source.csv')
+            cache_folder = os.path.join(tmp_dir, 'cache')
+            write_test_prices(filename, end_date='2020-03-31')
+            source = LocalPriceSource(filename)
+
+            online_cache = OnlineCache(cache_folder, fetch_data=source,
+                                       prefetch_days=31)
+            read_df = online_cache.get_data('AAA', '2019-12-02', '2019-12-02')
+            self.assertEqual(read_df.shape[0], 1)
+            # the first touch prefetches a block
+            self.assertEqual(source.calls, [('AAA', '2019-12-02', '2020-01-01')])
+
+            set_online_cache(online_cache)
+            try:
+                for d in daterange('2019-12-02', '2020-01-02'):
+                    ReadData('AAA').get_data(d, d, online=True)
+            finally:
+                set_online_cache()
+            self.assertEqual(len(source.calls), 1)
+
+            # only the gap is fetched, and the ranges are merged
+            online_cache.get_data('AAA', '2019-11-25', '2020-01-10')
+            self.assertEqual(source.calls[1:], [
+                ('AAA', '2019-11-25', '2019-12-01'),
+                ('AAA', '2020-01-02', '2020-02-01')])
+            self.assertEqual(online_cache.get_ranges('AAA'),
+                             [('2019-11-25', '2020-02-01')])
+
+            # a new cache on the same folder needs no fetch
+            online_cache = OnlineCache(cache_folder, fetch_data=source)
+            read_df = online_cache.get_data('AAA', '2019-12-20', '2020-01-20')
+            self.assertEqual(len(source.calls), 3)
+            self.assertEqual(read_df.shape[0], 22)
+            self.assertAlmostEqual(read_df['Open'].values[0], 114., places=2)
+
+            # a cache that can not be written still returns the prices
+            blocked_folder = os.path.join(tmp_dir, 'blocked')
+            open(blocked_folder, 'w').close()
+            online_cache = OnlineCache(blocked_folder, fetch_data=source)
+            with self.assertLogs('trading_ideas.online_cache', level='WARNING'):
+                read_df = online_cache.get_data('BBB', '2019-12-02', '2019-12-06')
+            self.assertEqual(read_df.shape[0], 5)
+
+            # only a failed fetch is a missing symbol
+            def failing_source(symbol, start_date, end_date):
+                raise KeyError(symbol)
+            online_cache = OnlineCache(cache_folder, fetch_data=failing_source)
+            with self.assertRaises(FetchError):
+                online_cache.get_data('ZZZ', '2019-12-02', '2019-12-06')
+            set_online_cache(online_cache)
+            try:
+                read_df = ReadData('ZZZ').get_data('2019-12-02', '2019-12-06',
+                                                   online=True)
+            finally:
+                set_online_cache()
+            self.assertEqual(read_df.shape[0], 0)
+
+    def test_panel(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            # CCC starts later than the others
+            write_test_prices(os.path.join(tmp_dir, 'ccc.csv'), symbols=('CCC',),
+                              start_date='2019-12-05')
+            all_df = pd.concat([pd.read_csv(filename),
+                                pd.read_csv(os.path.join(tmp_dir, 'ccc.csv'))])
+            all_df.to_csv(filename, index=False)
+
+            set_data_source('csv', filename)
+            try:
+                panel = get_panel(['AAA', 'CCC', 'ZZZ'], '2019-12-02', '2019-12-06')
+                self.assertEqual(panel.shape, (5, 3))
+                self.assertAlmostEqual(panel.loc['2019-12-03', 'AAA'], 101., places=2)
+                self.assertAlmostEqual(panel.loc['2019-12-06', 'CCC'], 101., places=2)
+                self.assertTrue(np.isnan(panel.loc['2019-12-02', 'CCC']))
+                self.assertTrue(np.all(np.isnan(panel['ZZZ'].values)))
+
+                both = get_panel(['AAA', 'BBB'], '2019-12-02', '2019-12-03',
+                                 fields=['Open', 'Close'], as_array=True)
+                self.assertEqual(both.shape, (2, 2, 2))
+                self.assertAlmostEqual(both[1, 1, 1], 201.5, places=2)
+
+                # no symbols, on a store that has not been loaded yet
+                empty = PriceStore(filename).get_panel([], '2019-12-02', '2019-12-06')
+                self.assertEqual(empty.shape, (0, 0))
+
+                # the panel factors agree with one stock at a time
+                for factor in [LinRegFactor(num_days=20),
+                               MovingAverageFactor(short_term=5, long_term=20),
+                               PercReturnFactor(n_day=7)]:
+                    panel_values = factor.evaluate_panel(
+                        ['AAA', 'BBB', 'CCC'], '2019-12-20')
+                    for symbol in ['BBB', 'CCC']:
+                        if isinstance(factor, LinRegFactor):
+                            prices = Stock(symbol).get_price_history(
+                                '2019-11-30', '2019-12-20', as_array=True)
+                            x = np.arange(len(prices))
+                            expected = np.polyfit(x, prices/prices[0], 1)[0]
+                        else:
+                            expected = factor(Stock(symbol), '2019-12-20')
+                        self.assertAlmostEqual(
+                            panel_values[symbol], expected, places=6)
+            finally:
+                set_data_source('csv')
+
+        self.assertEqual(linreg_slopes(np.array([[1.], [np.nan]]))[0], 0.)
+
+    def test_coverage(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            write_test_prices(os.path.join(tmp_dir, 'ccc.csv'), symbols=('CCC',),
+                              start_date='2019-12-05')
+            all_df = pd.concat([pd.read_csv(filename),
+                                pd.read_csv(os.path.join(tmp_dir, 'ccc.csv'))])
+            all_df.to_csv(filename, index=False)
+
+            set_data_source('csv', filename)
+            try:
+                coverage = coverage_table(
+                    '2019-12-02', '2019-12-06', ['AAA', 'CCC', 'ZZZ'])
+                self.assertEqual(list(coverage['num_rows']), [5, 2, 0])
+                self.assertEqual(list(coverage['missing_days']), [0, 3, 5])
+                self.assertEqual(coverage.loc['CCC', 'first_date'],
+                                 pd.Timestamp('2019-12-05'))
+
+                self.assertEqual(set(coverage_table().index), {'AAA', 'BBB', 'CCC'})
+                self.assertEqual(valid_symbols(['AAA', 'CCC', 'ZZZ']), ['AAA', 'CCC'])
+                self.assertEqual(valid_symbols(['AAA', 'CCC', 'ZZZ'], min_rows=3), ['AAA'])
+                universe = Universe(['AAA'])
+                universe.add_many(['CCC', 'AAA'])
+                self.assertEqual(universe.get_universe(), ['AAA', 'CCC'])
+                with self.assertRaises(ValueError):
+                    universe.add('ZZZ')
+
+                universe = Universe.from_coverage(coverage, max_missing_days=2)
+                self.assertEqual(universe.get_universe(), ['AAA'])
+            finally:
+                set_data_source('csv')
+
+    def test_compact_profile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename, symbols=('AAA', 'BBB', 'CCC'))
+            # prices that float32 can not hold exactly
+            all_df = pd.read_csv(filename)
+            all_df['Open'] = all_df['Open'] + 0.269989
+            all_df.to_csv(filename, index=False)
+
+            standard = PriceStore(filename)
+            compact = PriceStore(filename, profile='compact')
+            standard.load()
+            compact.load()
+            standard_usage = standard.memory_usage()
+            compact_usage = compact.memory_usage()
+            self.assertTrue(compact_usage['total'] < standard_usage['total'] / 2)
+            self.assertTrue(compact_usage['Open'] < standard_usage['Open'])
+            self.assertEqual(compact.get_all_data()['Volume'].dtype, np.int32)
+
+            compact_df = compact.get_data('BBB', '2019-12-02', '2019-12-06')
+            standard_df = standard.get_data('BBB', '2019-12-02', '2019-12-06')
+            self.assertEqual(list(compact_df['date']), list(standard_df['date']))
+            np.testing.assert_allclose(compact_df['Open'].values,
+                                       standard_df['Open'].values,
+                                       rtol=COMPACT_RTOL)
+
+            # a holding is valued the same within the tolerance
+            valuations = []
+            for profile in ['standard', 'compact']:
+                set_data_source('csv', filename, profile=profile)
+                test_holding = Holding(cash=1e5)
+                test_holding.record('2019-12-02', 'AAA', 17, 'buy')
+                test_holding.record('2019-12-03', 'CCC', 13, 'buy')
+                test_holding.record('2019-12-05', 'AAA', 5, 'sell')
+                account = test_holding.get_holding_info('2019-12-09')
+                valuations.append(account.current_valuation)
+            set_data_source('csv')
+            self.assertAlmostEqual(valuations[0] / valuations[1], 1.,
+                                   delta=COMPACT_RTOL)
+
+            # the csv is read with the compact dtypes
+            read_df = compact._read_csv()
+            self.assertEqual(read_df['Open'].dtype, np.float32)
+            self.assertEqual(read_df['Volume'].dtype, np.int64)
+            self.assertEqual(read_df['symbol'].dtype, 'category')
+            with self.assertRaises(MemoryError):
+                PriceStore(filename, profile='compact', memory_budget=1000).load()
+
+            # a missing volume is read as float
+            all_df.loc[0, 'Volume'] = np.nan
+            all_df.to_csv(filename, index=False)
+            compact = PriceStore(filename, profile='compact')
+            self.assertTrue(np.isnan(compact.get_all_data()['Volume'].values[0]))
+            self.assertEqual(compact.get_symbols(), ['AAA', 'BBB', 'CCC'])
+
+    def test_trading_calendar(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            # christmas is a weekday, but not a trading day
+            all_df = pd.read_csv(filename)
+            all_df[all_df['date'] != '2019-12-25'].to_csv(filename, index=False)
+
+            set_data_source('csv', filename)
+            try:
+                calendar = get_trading_calendar()
+                self.assertIs(calendar, get_trading_calendar())
+                self.assertFalse(calendar.is_trading_day('2019-12-25'))
+                self.assertFalse(calendar.is_trading_day('2019-12-07'))
+                self.assertTrue(calendar.is_trading_day('2019-12-24'))
+
+                self.assertEqual(calendar.next_trading_day('2019-12-24'), '2019-12-26')
+                self.assertEqual(calendar.previous_trading_day('2019-12-26'), '2019-12-24')
+                self.assertEqual(calendar.next_trading_day('2019-12-07'), '2019-12-09')
+                self.assertEqual(calendar.offset('2019-12-26', -2), '2019-12-23')
+                self.assertEqual(calendar.offset('2019-12-25', 1), '2019-12-26')
+                self.assertEqual(calendar.offset('2019-12-25', 0), '2019-12-24')
+                self.assertEqual(calendar.distance('2019-12-23', '2019-12-27'), 3)
+                self.assertEqual(
+                    calendar.trading_dates('2019-12-23', '2019-12-27', include_end=False),
+                    ['2019-12-23', '2019-12-24', '2019-12-26'])
+                with self.assertRaises(ValueError):
+                    calendar.next_trading_day('2019-12-31')
+
+                # a reload builds a new calendar
+                PriceStore.instance().reload()
+                self.assertIsNot(calendar, get_trading_calendar())
+
+                factor = PercReturnFactor(n_day=2, trading_days=True)
+                self.assertEqual(factor._window_start('2019-12-26', 2), '2019-12-23')
+            finally:
+                set_data_source('csv')
+
+        calendar = TradingCalendar(np.array([3, 1, 2, 1, 7]))
+        self.assertEqual(list(calendar.days), [1, 2, 3, 7])
+        self.assertEqual(list(calendar.trading_days(2, 7, include_end=False)), [2, 3])
+
+    def test_day_ordinals(self):
+        day = to_day_ordinal('2019-12-06')
+        self.assertEqual(from_day_ordinal(day), '2019-12-06')
+        self.assertEqual(date_n_day_from(day, 3), day + 3)
+        self.assertEqual(date_n_day_from('2019-12-06', 3), '2019-12-09')
+        self.assertTrue(is_weekday(day))
+        self.assertFalse(is_weekday(day + 1))
+        self.assertFalse(is_weekday('2019-12-08'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                # strings and day ordinals give the same answers
+                stock = Stock('AAA')
+                self.assertEqual(stock.get_price(day), stock.get_price('2019-12-06'))
+                self.assertEqual(stock.get_price(day + 1), stock.get_price('2019-12-07'))
+                np.testing.assert_allclose(
+                    get_panel(['AAA', 'BBB'], day - 4, day, as_array=True),
+                    get_panel(['AAA', 'BBB'], '2019-12-02', '2019-12-06',
+                              as_array=True))
+                self.assertEqual(
+                    get_trading_calendar().next_trading_day(day), day + 3)
+
+                holding = Holding(cash=1000.)
+                holding.record(date=day, symbol='AAA', num=2, record_type='buy',
+                               verbose=False)
+                account = holding.get_holding_info(day + 3)
+                self.assertAlmostEqual(account.cash_in_hand, 1000. - 2 * 104.)
+                self.assertAlmostEqual(account.current_valuation,
+                                       1000. - 2 * 104. + 2 * 105.)
+            finally:
+                set_data_source('csv')
+
+    def test_price_asof(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            cube_folder = os.path.join(tmp_dir, 'cube')
+            sqlite_filename = os.path.join(tmp_dir, 'prices.sqlite')
+            write_test_prices(filename)
+            build_price_cube(cube_folder, price_store=PriceStore(filename))
+            SqliteStore(sqlite_filename).load_csv(filename)
+
+            for backend, path in [('csv', filename), ('cube', cube_folder),
+                                  ('sqlite', sqlite_filename)]:
+                set_data_source(backend, path)
+                try:
+                    test_stock = Stock('AAA')
+                    # a saturday gets the price of friday, not of monday
+                    self.assertAlmostEqual(test_stock.get_price('2019-12-07'), 104.)
+                    self.assertAlmostEqual(
+                        test_stock.get_price('2019-12-06', is_strict=True), 104.)
+                    with self.assertRaises(ValueError):
+                        test_stock.get_price('2019-12-07', is_strict=True)
+                    # no price from the future before the first day
+                    with self.assertRaises(ValueError):
+                        test_stock.get_price('2019-11-29')
+
+                    # after the last day, as of the last price
+                    self.assertAlmostEqual(test_stock.get_price('2020-01-02'), 121.)
+                    with self.assertRaises(ValueError):
+                        test_stock.get_price('2020-01-10')
+                    self.assertAlmostEqual(get_price_asof('AAA', '2020-01-10'), 121.)
+                    self.assertTrue(np.isnan(get_price_asof('CCC', '2019-12-06')))
+                finally:
+                    set_data_source('csv')
+
+    def test_position_ledger(self):
+        ledger = PositionLedger(capacity=2)
+        for i in range(5):
+            ledger.record(f'S{i}', num=i + 1, price=10., buy_or_sell='buy')
+        ledger.record('S0', num=1, price=12., buy_or_sell='sell')
+        self.assertEqual(len(ledger), 5)
+        self.assertEqual(ledger.held_symbols(), ['S1', 'S2', 'S3', 'S4'])
+        with self.assertRaises(ValueError):
+            ledger.record('S1', num=3, price=10., buy_or_sell='sell')
+
+        value = ledger.mark_to_market(np.array([11., np.nan, 12., 13.]),
+                                      ledger.held_ids())
+        self.assertAlmostEqual(value, 2 * 11. + 3 * 10. + 4 * 12. + 5 * 13.)
+        positions = ledger.to_frame()
+        self.assertAlmostEqual(positions.loc['S0', 'proceeds'], 12.)
+        self.assertAlmostEqual(positions.loc['S4', 'cost_basis'], 50.)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holding = Holding(cash=10000.)
+                holding.record(date='2019-12-02', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                holding.record(date='2019-12-03', symbol='BBB', num=5,
+                               record_type='buy', verbose=False)
+                holding.record(date='2019-12-04', symbol='AAA', num=10,
+                               record_type='sell', verbose=False)
+                # valued on a saturday, at the prices of friday
+                account = holding.get_holding_info('2019-12-07')
+                cash = 10000. - 10 * 100. - 5 * 201. + 10 * 102.
+                self.assertAlmostEqual(account.cash_in_hand, cash)
+                self.assertAlmostEqual(account.current_valuation, cash + 5 * 204.)
+                self.assertEqual(holding.get_stocks_held(), ['BBB'])
+                self.assertEqual(list(holding.get_positions()['quantity']), [0, 5])
+            finally:
+                set_data_source('csv')
+
+    def test_transaction_log(self):
+        transaction_log = TransactionLog(capacity=2)
+        for i in range(10):
+            transaction_log.append(
+                'AAA' if i % 2 == 0 else 'BBB',
+                Transaction(num=i + 1, price=100. + i,
+                            date=f'2019-12-{i + 2:02d}', buy_or_sell='buy'))
+        self.assertEqual(len(transaction_log), 10)
+        self.assertEqual(transaction_log.records.itemsize, 25)
+        self.assertFalse(hasattr(transaction_log[0], '__dict__'))
+        self.assertEqual(transaction_log[-1].date, '2019-12-11')
+
+        rows = transaction_log.find(symbol='BBB', start_date='2019-12-04',
+                                    end_date='2019-12-08')
+        self.assertEqual(list(rows), [3, 5])
+        self.assertEqual(len(transaction_log.find(symbol='CCC')), 0)
+        self.assertEqual(
+            transaction_log.records['num'][transaction_log.find('AAA')].sum(), 25)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_filename = os.path.join(tmp_dir, 'transactions.csv')
+            transaction_log.to_csv(csv_filename)
+            transaction_log.to_parquet(os.path.join(tmp_dir, 'transactions.parquet'))
+            read_df = pd.read_parquet(os.path.join(tmp_dir, 'transactions.parquet'))
+            self.assertEqual(list(read_df['symbol'][:2]), ['AAA', 'BBB'])
+            self.assertEqual(pd.read_csv(csv_filename).shape[0], 10)
+
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holding = Holding(cash=10000.)
+                holding.record(date='2019-12-02', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                holding.record(date='2019-12-03', symbol='AAA', num=4,
+                               record_type='sell', verbose=False)
+                transactions = holding.get_transactions(symbol='AAA')
+                self.assertEqual(list(transactions['buy_or_sell']), ['buy', 'sell'])
+                self.assertEqual(list(transactions['amount']), [1000., 404.])
+                self.assertEqual(
+                    holding.account.get_stock('AAA').transaction_list[1].num, 4)
+            finally:
+                set_data_source('csv')
+
+    def test_daily_valuation(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holdings = [Holding(cash=10000., valuation_mode=x)
+                            for x in ['eager', 'daily']]
+                for holding in holdings:
+                    holding.record(date='2019-12-02', symbol='AAA', num=10,
+                                   record_type='buy', verbose=False)
+                    holding.record(date='2019-12-02', symbol='BBB', num=5,
+                                   record_type='buy', verbose=False)
+                    holding.get_holding_info('2019-12-02')
+                    holding.get_holding_info('2019-12-03')
+                    holding.record(date='2019-12-03', symbol='AAA', num=1,
+                                   record_type='sell', verbose=False)
+                    holding.get_holding_info('2019-12-03')
+
+                eager, daily = [x.account for x in holdings]
+                self.assertAlmostEqual(eager.current_valuation, daily.current_valuation)
+                self.assertAlmostEqual(daily.current_valuation,
+                                       10000. - 1000. - 5 * 200. + 101. +
+                                       9 * 101. + 5 * 201.)
+
+                # the daily mode looks up each symbol once a day
+                self.assertEqual(eager.valuation_stats.price_lookups, 14)
+                self.assertEqual(daily.valuation_stats.price_lookups, 4)
+                self.assertEqual(daily.valuation_stats.lookups_saved, 10)
+                self.assertEqual(
+                    daily.valuation_stats.saved_by_day[to_day_ordinal('2019-12-03')], 5)
+            finally:
+                set_data_source('csv')
+
+        with self.assertRaises(ValueError):
+            Holding(cash=1., valuation_mode='hourly')
+
+    def test_tax_lots(self):
+        engine = TaxLotEngine()
+        engine.fill('AAA', '2019-12-02', 10, 100., 'buy')
+        engine.fill('AAA', '2019-12-04', 10, 110., 'buy')
+        # closes the first lot and half of the second one
+        realized = engine.fill('AAA', '2019-12-12', 15, 120., 'sell')
+        self.assertAlmostEqual(realized, 15 * 120. - 10 * 100. - 5 * 110.)
+        self.assertEqual([x.num for x in engine.get_open_lots('AAA')], [5])
+        self.assertAlmostEqual(engine.get_open_cost('AAA'), 550.)
+        self.assertAlmostEqual(engine.unrealized_pnl('AAA', 100.), -50.)
+        self.assertAlmostEqual(engine.average_holding_days('AAA'),
+                               (10 * 10 + 5 * 8) / 15)
+        with self.assertRaises(ValueError):
+            engine.fill('AAA', '2019-12-13', 6, 120., 'sell')
+
+        # many small fills are matched one lot at a time
+        for i in range(1000):
+            engine.fill('BBB', 18000 + i, 1, 10., 'buy')
+        engine.fill('BBB', 19000, 999, 11., 'sell')
+        self.assertAlmostEqual(engine.realized_pnl('BBB'), 999.)
+        self.assertEqual(engine.get_open_num('BBB'), 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holding = Holding(cash=10000.)
+                holding.record(date='2019-12-02', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                holding.record(date='2019-12-03', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                holding.record(date='2019-12-05', symbol='AAA', num=15,
+                               record_type='sell', verbose=False)
+                account = holding.get_holding_info('2019-12-06')
+                self.assertAlmostEqual(account.realized_profit,
+                                       15 * 103. - 10 * 100. - 5 * 101.)
+                self.assertAlmostEqual(account.unrealized_profit, 5 * (104. - 101.))
+                self.assertAlmostEqual(
+                    account.realized_profit + account.unrealized_profit,
+                    account.total_profit)
+                self.assertAlmostEqual(
+                    holding.get_tax_lots().loc['AAA', 'unrealized'], 15.)
+                self.assertAlmostEqual(
+                    account.get_stock('AAA').get_unrealized_profit(), 15.)
+            finally:
+                set_data_source('csv')
+
+    def test_run_log(self):
+        # importing the modules does not configure logging. The root 
+        # logger is left alone, test runners add their own handlers to it
+        self.assertEqual(logging.getLogger('trading_ideas').handlers, [])
+        self.assertFalse(is_logging())
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            log_filename = os.path.join(tmp_dir, 'run.jsonl')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holding = Holding(cash=10000.)
+                holding.record(date='2019-12-02', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                start_logging(log_filename)
+                self.assertTrue(is_logging())
+                holding.record(date='2019-12-03', symbol='AAA', num=4,
+                               record_type='sell', verbose=False)
+                holding.record(date='2019-12-03', symbol='BBB', num=1,
+                               record_type='buy', verbose=False)
+            finally:
+                stop_logging()
+                set_data_source('csv')
+
+            self.assertFalse(is_logging())
+            with open(log_filename) as readfile:
+                events = [json.loads(x) for x in readfile]
+            # one record per transaction, only while logging was on
+            self.assertEqual([x['event'] for x in events], ['transaction'] * 2)
+            self.assertEqual(events[0]['date'], '2019-12-03')
+            self.assertEqual(events[0]['action'], 'sell')
+            self.assertEqual(events[0]['num_held'], 6)
+            self.assertEqual(events[1]['symbol'], 'BBB')
+
+    def test_execute_basket(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename)
+            set_data_source('csv', filename)
+            try:
+                holding = Holding(cash=2000.)
+                holding.record(date='2019-12-02', symbol='AAA', num=10,
+                               record_type='buy', verbose=False)
+                lookups = holding.get_valuation_stats().price_lookups
+                # BBB can only be paid for with the cash of the AAA sale
+                report = holding.execute_basket('2019-12-03', [
+                    StockChoice(symbol='BBB', num=5, reco='buy'),
+                    StockChoice(symbol='AAA', num=10, reco='sell'),
+                    StockChoice(symbol='AAA', num=100, reco='buy'),
+                    StockChoice(symbol='BBB', num=10, reco='sell'),
+                    StockChoice(symbol='CCC', num=1, reco='buy'),
+                    StockChoice(symbol='AAA', num=1, reco='hold'),
+                    StockChoice(symbol='BBB', num=50, reco='buy'),
+                ], verbose=False)
+
+                self.assertEqual(report.filled, ['BBB', 'AAA'])
+                # every rejected order is reported, even for the same symbol
+                self.assertEqual(report.rejected, [
+                    (2, 'AAA', 'not enough cash'), (3, 'BBB', 'not enough shares'),
+                    (4, 'CCC', 'no price'), (6, 'BBB', 'not enough cash')])
+                df = report.to_frame()
+                self.assertEqual(list(df['status']), [
+                    'filled', 'filled', 'rejected', 'rejected', 'rejected',
+                    'hold', 'rejected'])
+                self.assertEqual(list(df['price'][:2]), [201., 101.])
+
+                account = holding.account
+                self.assertAlmostEqual(account.cash_in_hand, 1000. + 1010. - 1005.)
+                self.assertAlmostEqual(account.current_valuation, 2010.)
+                self.assertEqual(holding.get_stocks_held(), ['BBB'])
+                # one bulk read for the basket, then the book is marked once
+                self.assertEqual(
+                    holding.get_valuation_stats().price_lookups - lookups, 3)
+            finally:
+                set_data_source('csv')
+
+    def test_market_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename, symbols=('VOO', 'AAA'))
+            set_data_source('csv', filename)
+            try:
+                # a saturday is priced at the friday before
+                snapshot = MarketSnapshot.build(['VOO', 'AAA', 'CCC'], '2019-12-07')
+                self.assertEqual(snapshot.date, '2019-12-07')
+                self.assertEqual(snapshot.get_price('VOO'), 104.)
+                self.assertEqual(snapshot.get_price('AAA'), 204.)
+                self.assertTrue(np.isnan(snapshot.get_price('CCC')))
+                self.assertTrue(np.isnan(snapshot.get_price('DDD')))
+                with self.assertRaises(AttributeError):
+                    snapshot.day = 0
+                with self.assertRaises(ValueError):
+                    snapshot.prices[0] = 1.
+
+                universe = Universe()
+                universe.all_symbols = ['AAA']
+                strategy = BenchMarkStrategy(
+                    universe=universe, start_str='2019-12-02',
+                    end_str='2019-12-06', cash=10000., verbose=False)
+                self.assertEqual(strategy.snapshot_symbols(), ['AAA', 'VOO'])
+                snapshot = MarketSnapshot.build(
+                    strategy.snapshot_symbols(), '2019-12-02')
+                account = strategy.play('2019-12-02', snapshot)
+                self.assertEqual(account.get_stock_symbols(), ['VOO'])
+                self.assertAlmostEqual(account.cash_in_hand, 0.)
+                # the strategy and the account only priced from the snapshot
+                self.assertEqual(account.valuation_stats.price_lookups, 0)
+
+                with self.assertRaises(ValueError):
+                    strategy.play('2019-12-03', snapshot)
+            finally:
+                set_data_source('csv')
+
+    def test_universe_filters(self):
+        universe = Universe.from_metadata()
+        self.assertEqual(universe.get_sector('MMM'), 'Industrials')
+        self.assertEqual(universe.get_sector('VNQ'), ETF_SECTOR)
+        self.assertEqual(universe.etf_type[universe.get_id('VNQ')], 'Stock - Sector')
+        self.assertEqual(len(universe.select(universe.etf_mask())), 74)
+        self.assertIn('VOO', universe)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename, symbols=('AAA', 'BBB', 'CCC'))
+            set_data_source('csv', filename)
+            try:
+                universe = Universe(
+                    ['AAA', 'BBB', 'CCC', 'ZZZ', 'AAA'],
+                    sectors=['Energy', 'Utilities', 'Energy', 'Energy', 'Energy'])
+                self.assertEqual(universe.get_universe(), ['AAA', 'BBB', 'CCC', 'ZZZ'])
+                self.assertEqual(list(universe.get_ids(['CCC', 'XXX'])), [2, -1])
+
+                # volumes are 1000, 2000 and 3000
+                mask = (universe.sector_mask(['Energy'])
+                        & universe.data_mask('2019-12-04')
+                        & universe.volume_mask(1500., '2019-12-02', '2019-12-06'))
+                selected = universe.select(mask)
+                self.assertEqual(selected.get_universe(), ['CCC'])
+                self.assertEqual(list(selected.sector), ['Energy'])
+
+                # the universe goes straight into the panel and factor APIs
+                panel = get_panel(universe, '2019-12-02', '2019-12-03')
+                self.assertEqual(list(panel.columns), ['AAA', 'BBB', 'CCC', 'ZZZ'])
+                returns = universe.evaluate(PercReturnFactor(n_day=3), '2019-12-05')
+                self.assertAlmostEqual(returns['AAA'], 103. / 100.)
+
+                universe.add_many(['BBB', 'AAA'])
+                self.assertEqual(len(universe), 4)
+                with self.assertRaises(ValueError):
+                    universe.add('XXX')
+            finally:
+                set_data_source('csv')
+
+    def test_vector_backtest(self):
+        values = np.array([[1., np.nan], [np.nan, np.nan], [3., 5.]])
+        asof = asof_matrix(values, np.array([0, 1, 10]), np.array([1, 9, 10]),
+                           max_staleness=7)
+        np.testing.assert_array_equal(
+            asof, np.array([[1., np.nan], [np.nan, np.nan], [3., 5.]]))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename, symbols=('VOO', 'AAA', 'BBB'))
+            # two days without a BBB price, it is carried for valuation
+            df = pd.read_csv(filename)
+            df = df[~((df['symbol'] == 'BBB') &
+                      df['date'].isin(['2019-12-10', '2019-12-11']))]
+            df.to_csv(filename, index=False)
+            set_data_source('csv', filename)
+            try:
+                days = backtest_days('2019-12-02', '2019-12-31')
+                dates = pd.DatetimeIndex(np.array(days).astype('datetime64[D]'))
+                signal = np.random.default_rng(0).random((len(days), 3))
+                weights = signal_to_weights(
+                    pd.DataFrame(signal, index=dates, columns=['VOO', 'AAA', 'BBB']))
+
+                # the same trades as the event driven strategy
+                for rebalance_every in [1, 3]:
+                    strategy = TargetWeightStrategy(
+                        Universe(['VOO', 'AAA', 'BBB']), '2019-12-02',
+                        '2019-12-31', 10000., weights,
+                        rebalance_every=rebalance_every, verbose=False)
+                    valuations = [strategy.play(d).current_valuation for d in days]
+                    result = VectorBackTest.from_store(
+                        ['VOO', 'AAA', 'BBB'], '2019-12-02', '2019-12-31', 10000.,
+                        rebalance_every=rebalance_every).run(weights)
+                    np.testing.assert_allclose(result.equity, valuations)
+                    self.assertEqual(
+                        result.get_positions().loc[dates[-1]].to_dict(),
+                        {x.stock_symbol: x.total_num
+                         for x in strategy.holding.account.stocks_held})
+                    self.assertTrue((result.cash >= 0.).all())
+
+                benchmark = BenchMarkStrategy(
+                    Universe(['AAA']), '2019-12-02', '2019-12-31', 10000.,
+                    verbose=False)
+                valuations = [benchmark.play(d).current_valuation for d in days]
+                result = VectorBackTest.from_store(
+                    ['VOO'], '2019-12-02', '2019-12-31', 10000.).run(
+                        pd.DataFrame({'VOO': [1.]}, index=dates[:1]))
+                np.testing.assert_allclose(result.equity, valuations)
+                self.assertEqual(list(result.trades[:, 0]), [100] + [0] * (len(days) - 1))
+                self.assertAlmostEqual(result.turnover[0], 1.)
+
+                # the parquet backend has no calendar, both engines
+                # count weekdays
+                parquet_folder = os.path.join(tmp_dir, 'prices')
+                convert_csv_to_parquet(filename, parquet_folder)
+                set_data_source('parquet', parquet_folder)
+                strategy = TargetWeightStrategy(
+                    Universe(['VOO', 'AAA', 'BBB']), '2019-12-02', '2019-12-31',
+                    10000., weights, rebalance_every=3, verbose=False)
+                valuations = [strategy.play(d).current_valuation for d in days]
+                result = VectorBackTest.from_store(
+                    ['VOO', 'AAA', 'BBB'], '2019-12-02', '2019-12-31', 10000.,
+                    rebalance_every=3).run(weights)
+                np.testing.assert_allclose(result.equity, valuations)
+            finally:
+                set_data_source('csv')
+
+    @unittest.skipUnless(os.environ.get('TRADING_IDEAS_BENCHMARK'),
+                         'timing, set TRADING_IDEAS_BENCHMARK=1 to run')
+    def test_vector_backtest_speed(self):
+        # ten years of 500 symbols, rebalanced every day
+        rng = np.random.default_rng(1)
+        prices = pd.DataFrame(
+            100. * np.exp(np.cumsum(rng.normal(0, 0.01, (2520, 500)), axis=0)),
+            index=pd.bdate_range('2010-01-01', periods=2520))
+        weights = signal_to_weights(rng.normal(size=(2520, 500)), top_n=50)
+        start = time.perf_counter()
+        VectorBackTest(prices, 1e6).run(weights)
+        self.assertLess(time.perf_counter() - start, 1.)
+
+    def test_multi_backtest(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            write_test_prices(filename, symbols=('VOO', 'AAA', 'BBB'))
+            set_data_source('csv', filename)
+            try:
+                days = backtest_days('2019-12-02', '2019-12-20')
+                dates = pd.DatetimeIndex(np.array(days).astype('datetime64[D]'))
+                signal = np.random.default_rng(0).random((len(days), 3))
+                weights = signal_to_weights(
+                    pd.DataFrame(signal, index=dates, columns=['VOO', 'AAA', 'BBB']))
+
+                def make_strategies():
+                    return [TargetWeightStrategy(
+                                Universe(['AAA', 'BBB']), '2019-12-02',
+                                '2019-12-20', 10000., weights,
+                                rebalance_every=x, verbose=False)
+                            for x in [1, 2, 5]]
+
+                multi_backtest = MultiBackTest(make_strategies(), '2019-12-02',
+                                               '2019-12-20', verbose=False)
+                results = multi_backtest.play_backtest()
+                self.assertEqual(results.shape[0], 4 * len(days))
+                valuations = multi_backtest.get_valuations()
+                self.assertEqual(list(valuations.columns), [
+                    'TargetWeightStrategy_0', 'TargetWeightStrategy_1',
+                    'TargetWeightStrategy_2', 'benchmark'])
+
+                # the same as running each strategy on its own, but every
+                # price came from the shared snapshot of the day
+                for name, strategy in zip(valuations.columns, make_strategies()):
+                    alone = [strategy.play(d).current_valuation for d in days]
+                    np.testing.assert_allclose(valuations[name].values, alone)
+                for strategy in multi_backtest.strategies.values():
+                    self.assertEqual(
+                        strategy.holding.get_valuation_stats().price_lookups, 0)
+            finally:
+                set_data_source('csv')
+
+        with self.assertRaises(ValueError):
+            MultiBackTest([], '2019-12-02', '2019-12-20')
+
+    def test_parquet_backtest(self):
+        # the parquet backend has no calendar, rebalancing counts weekdays
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'prices.csv')
+            parquet_folder = os.path.join(tmp_dir, 'prices')
+            write_test_prices(filename, symbols=('AAA', 'BBB', 'VOO'),
+                              start_date='2019-10-01')
+            convert_csv_to_parquet(filename, parquet_folder)
+
+            valuations = []
+            for backend, path in [('parquet', parquet_folder), ('csv', filename)]:
+                set_data_source(backend, path)
+                try:
+                    strategy = LinRegStrategy(
+                        universe=Universe(['AAA', 'BBB']), start_str='2019-12-02',
+                        end_str='2019-12-20', cash=10000., verbose=False)
+                    BackTest(strategy, '2019-12-02', '2019-12-20',
+                             verbose=False).play_backtest(visualize=False)
+                    valuations.append(strategy.holding.account.current_valuation)
+                finally:
+                    set_data_source('csv')
+            self.assertEqual(valuations[0], valuations[1])
+            self.assertNotEqual(valuations[0], 10000.)
+
+    def test_import_time(self):
+        for module_name in ['src.read_write', 'src.backtest', 'src.linreg_strategy']:
+            import_time = measure_import_time(module_name)
+            loaded = {x.split('.')[0] for x in import_time['modules']}
+            self.assertEqual(loaded & set(LAZY_MODULES), set(), module_name)
+            self.assertLess(import_time['cumulative_us'], IMPORT_TIME_BUDGET_US,
+                            module_name)